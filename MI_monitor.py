@@ -7,51 +7,119 @@ All modules in this app are cross platform,
 however, some commands are not 
 #TODO: and it requires improvement for MacOS adaptation
 
-The info file is used as a communication mailbox 
-between MIMonitor and MITracker.
+The status mailbox (status_mailbox.py, a memory-mapped file) is
+used for communication between MIMonitor and MITracker, once config.json
+turns it on ("status_mailbox": "auto" or a path).
 '''
+from startup_timer import STARTUP
+import asyncio
 import json
 import os
-from subprocess import Popen, check_output, call
+import queue
 import sys
 import time
-from threading import Thread, Lock
-import queue
-
-import sounddevice as sd
-from typing import Dict, List
-from vosk import Model, KaldiRecognizer, SetLogLevel
-
-from config import Config
-from icon_manager import IconManager
-SetLogLevel(-1)
+from threading import Event, Thread
+
+from typing import Callable, Dict, List, Mapping, Optional
+
+# Heavy imports are timed; vosk and sounddevice are only imported
+# on the model loading thread (see _load_voice)
+with STARTUP.timed("import icon_manager (pystray, PIL)"):
+    from icon_manager import TRAY_ICON_NAME, IconManager
+with STARTUP.timed("import audio modules (numpy)"):
+    from audio_source import AudioSource, MicrophoneSource
+    from vad import VoiceActivityDetector
+with STARTUP.timed("import app modules"):
+    from async_runtime import AsyncRuntime
+    from config import Config
+    from control_server import ControlServer
+    from metrics import REGISTRY, FileExporter, start_http_server
+    from mode_supervisor import RUNNING, CommandTicket, ModeSupervisor
+    from phrase_matcher import PhraseMatcher
+    from process_cache import ProcessSnapshotCache
+    from process_source import ProcessSource, make_process_source
+    from recognition_worker import CommandMerger, PhraseEvent, RecognitionWorker
+    from resampler import model_samplerate, resample_source
+    from resource_sampler import ResourcePolicy, ResourceSampler
+    from status_mailbox import StatusMailbox
+
+
+def _import_vosk():
+    """
+    vosk is slow to import, so it is imported when the model is loaded
+    """
+    with STARTUP.timed("import vosk"):
+        import vosk
+    vosk.SetLogLevel(-1)
+    return vosk
 
-lock = Lock()
 
 class MIMonitor:
     """ Class representing the core of MI_Monitor app """
 
-    def __init__(self):
+    def __init__(self, audio_source: Optional[AudioSource] = None,
+                 icon_manager: Optional[IconManager] = None,
+                 process_source: Optional[ProcessSource] = None,
+                 model=None, audio_sources: Optional[List[AudioSource]] = None,
+                 config: Optional[Config] = None):
+        """
+        All arguments are optional and default to the live setup
+        (data/config.json, its input devices, tray icon, configured
+        process backend and Vosk model).
+        Passing them lets MIMonitor run headless, e.g. from WAV files.
+        audio_sources - several inputs, each decoded by its own
+        RecognitionWorker (audio_source is a single one)
+        config - e.g. Config("/path/to/config.json") for tests
+        A passed icon_manager is shared by all watched modes, otherwise
+        every watched mode gets its own tray icon.
+        The tray icon and process tracking are ready when __init__ returns;
+        the Vosk model and audio input are set up by start() on a background
+        thread and voice control goes live once they are ready.
+        """
         self._is_running = False
-        self._config = Config()
-        self._icon_manager = IconManager()
-        # Vosk Speech Recognition
-        self._queue = queue.Queue()
-        self._device_info = sd.query_devices(kind='input')  # All available devices
-        self._samplerate = int(self._device_info['default_samplerate'])  # Selected device info
-        self._model = Model(self._config.get_vosk_path())
-        self._recogniser = KaldiRecognizer(self._model, self._samplerate)
-        self._current_phrase = ""  # Current transcribed text
-        # MI app
-        self._mi_exe = self._config.get_mi_exe()
-        self._mi_folder_path = self._config.get_mi_folder_path()
-        self._bat_exit = self._config.get_bat_path("exit") # /im
-        self._bat_forced_exit = self._config.get_bat_path("forced") # /f
-        self._bat_folder_path = self._config.get_bat_folder_path()
-        self._start_phrases = self._config.get_trigger_phrases("start")
-        self._stop_close_phrases = self._config.get_trigger_phrases("stop or close")
-        self._last_MI_check = False # Starts at False since the icon is initially set to red; True == green icon
-        #self._current_icon_status = False
+        with STARTUP.timed("init config"):
+            self._config = Config() if config is None else config
+        self._shared_icon_manager = icon_manager
+        with STARTUP.timed("init process source"):
+            if process_source is None:
+                process_source = make_process_source(self._config.get_process_backend())
+            self._process_source = process_source
+            self._process_source.start()
+            self._process_cache = ProcessSnapshotCache(self._process_source,
+                                                       self._config.get_process_cache_ttl(),
+                                                       self._config.get_process_resync_interval())
+        # Vosk Speech Recognition (set up by _load_voice)
+        if audio_sources is None and audio_source is not None:
+            audio_sources = [audio_source]
+        self._audio_sources = audio_sources
+        self._workers = [] # one RecognitionWorker per input device
+        self._phrases = queue.Queue() # PhraseEvents of all workers
+        self._audio_listener = None # set: workers are decoded by its caller (asyncio runtime)
+        self._command_merger = CommandMerger(self._config.get_device_dedupe_window())
+        self._model = model # one model shared by all workers
+        self._vosk = None
+        self._voice_ready = Event()
+        self._voice_thread = Thread(target=self._load_voice, daemon=True,
+                                    name="MIMonitor Voice Loader")
+        self.current_phrase = None # PhraseEvent being handled by run()
+        # MI apps, one supervisor per watched mode
+        self._supervisors = {} # mode -> ModeSupervisor
+        self._status_mailbox = self._open_status_mailbox()
+        with STARTUP.timed("init tray icon"):
+            for mode in self._config.get_watched_modes():
+                self._add_supervisor(mode)
+            self._set_status("voice loading")
+        self._process_source.add_listener(self._on_process_event)
+        self._phrase_matcher = self._build_phrase_matcher()
+        self._config.add_listener(self._on_config_change)
+        self._metrics_server = None
+        self._metrics_file = None
+        self._control_server = None
+        self._resource_sampler = None
+        self._activity_listeners = []
+        self._register_metrics()
+        self._tracker_stopped = Event()
+        self._tracker_interval = self._config.get_process_cache_ttl() # no point scanning faster
         self.thread_instances_tracker = Thread(target=self.MI_instances_tracker, 
                                 daemon = True,
                                 name="MIMonitor Instances Tracker")
@@ -60,50 +128,153 @@ class MIMonitor:
                                 name="MIMonitor Icon Status Tracker")
 
 
-    def start(self) -> None:
+    def start(self, track_processes: bool = True) -> None:
         """
         Start MIMonitor
+        track_processes=False leaves the tracker threads off (e.g. benchmarks)
         """
         if self.is_active():
             return
         self._is_running = True
-        self.start_audio_recording()
+        self._voice_thread.start()
+        self._config.watch() # hot reload of config.json
+        self._start_metrics_export()
+        self._start_control_server()
+        self._start_resource_sampler()
+        if not track_processes:
+            return
         # start background thread
         self.thread_instances_tracker.start()
         self.thread_icon_status_tracker.start()
+        STARTUP.mark("process trackers started")
+
+
+    def _load_voice(self) -> None:
+        """
+        Loads the Vosk model, builds a recogniser per input device
+        and starts the audio input, then voice control goes live
+        """
+        try:
+            self._vosk = _import_vosk()
+            if self._model is None:
+                with STARTUP.timed("load vosk model"):
+                    self._model = self._vosk.Model(self._config.get_vosk_path())
+            with STARTUP.timed("init audio input"):
+                input_settings = self._config.get_audio_input_settings()
+                if self._audio_sources is None:
+                    self._audio_sources = [MicrophoneSource(device, block_ms=input_settings["block_ms"])
+                                           for device in self._config.get_input_devices() or [None]]
+                if input_settings["resample"]:
+                    # decode at the model's rate, not the device's
+                    rate = model_samplerate(self._config.get_vosk_path())
+                    self._audio_sources = [resample_source(source, rate) for source in self._audio_sources]
+                names = []
+                for source in self._audio_sources:
+                    name = getattr(source, "name", "audio")
+                    if name in names:
+                        name += f" #{len(names) + 1}" # two devices with the same name
+                    names.append(name)
+                    worker = RecognitionWorker(
+                        name, source, self._config.get_audio_buffer_settings(),
+                        lambda: self._phrase_matcher, self._phrases.put,
+                        self._config.get_fast_partials(), input_settings["max_batch_ms"])
+                    worker.on_audio = self._audio_listener
+                    self._workers.append(worker)
+            with STARTUP.timed("build recogniser"):
+                for worker in self._workers:
+                    worker.replace(self._build_recogniser(worker.samplerate),
+                                   self._build_vad(worker.samplerate))
+            if not self.is_active():
+                return
+            self.start_audio_recording()
+        except Exception as e:
+            print(f"MIMonitor: voice control could not be started: {e}", file=sys.stderr)
+            self._set_status("voice unavailable")
+            raise
+        self._voice_ready.set()
+        self._set_status("")
+        self._publish_status()
+        STARTUP.mark("voice control live")
+        print(STARTUP.report())
+
+
+    def is_voice_ready(self) -> bool:
+        """
+        True once the model is loaded and audio is flowing
+        """
+        return self._voice_ready.is_set()
+
+
+    def startup_report(self) -> str:
+        """
+        Startup timing per import and init stage
+        """
+        return STARTUP.report()
 
 
     def MI_instances_tracker(self) -> None:
         """
         If more than one processess start with UCL or MI
         we are currently assuming that there are multiple instances of the 
-        same application. The names os each application can be defined
-        at the top of this file.
+        same application. Each watched mode handles its duplicates
+        with its own duplicate_policy, on its own supervisor thread.
         """
         while self.is_active():
-            with lock:
-                MI_instances = self._MI_process_info()
-            if len(MI_instances) > 1: 
-                with lock:
-                    self.do_on_stop_phrase() # close all
-                    self.do_on_start_phrase() # open one
+            self._check_duplicates(self._all_MI_process_info())
+            self._tracker_stopped.wait(self._tracker_interval)
 
 
     def icon_status_tracker(self) -> None:
         """
-        Keeps the icon up to date
+        Keeps the icons up to date
         Helps improve MIMonitor speed
         """
         while self.is_active():
-            # Check if MI status has changed
-            with lock:
-                MI_instances = self._MI_process_info()
-            if len(MI_instances) == 0:
-                self.set_icon(False) # update icon red
-            elif len(MI_instances) == 1:
-                self.set_icon(True) # update icon green
-            elif len(MI_instances) > 1:
-                self.do_on_restart_phrase()
+            # Check if MI status has changed, one scan for all modes
+            self._update_icons(self._all_MI_process_info())
+            self._publish_status() # also refreshes updated_at, a heartbeat for readers
+            self._tracker_stopped.wait(self._tracker_interval)
+
+
+    def track_processes_once(self) -> bool:
+        """
+        One cycle of both trackers from one scan (asyncio runtime),
+        True if MI instances changed or a command is still running
+        """
+        MI_instances = self._all_MI_process_info()
+        supervisors = list(self._supervisors.values())
+        pids_before = [supervisor.pids for supervisor in supervisors]
+        duplicates = self._check_duplicates(MI_instances)
+        self._update_icons(MI_instances)
+        self._publish_status()
+        return (duplicates or any(not supervisor.is_idle() for supervisor in supervisors)
+                or pids_before != [supervisor.pids for supervisor in supervisors])
+
+
+    def _check_duplicates(self, MI_instances: Dict[str, List[Dict]]) -> bool:
+        """
+        Asks the supervisors with more than one MI running to deduplicate
+        """
+        STARTUP.mark_once("first duplicate check")
+        found = False
+        for supervisor in list(self._supervisors.values()):
+            if len(MI_instances.get(supervisor.mi_exe, [])) > 1:
+                supervisor.submit("deduplicate") # coalesced while one is queued/running
+                found = True
+        return found
+
+
+    def _update_icons(self, MI_instances: Dict[str, List[Dict]]) -> None:
+        """
+        Supervisor state and tray icons follow the process table
+        """
+        running = {} # icon -> any of its modes running (a passed icon is shared)
+        for supervisor in list(self._supervisors.values()):
+            key = id(supervisor.icon_manager)
+            running[key] = running.get(key, False) or bool(MI_instances.get(supervisor.mi_exe))
+        for supervisor in list(self._supervisors.values()):
+            supervisor.observe(MI_instances.get(supervisor.mi_exe, []),
+                               running[id(supervisor.icon_manager)])
 
 
     def start_audio_recording(self) -> None:
@@ -111,18 +282,16 @@ class MIMonitor:
         Provides access to setting up the 
         recorder from methods in the class.
         Used for control - start 
-        speaker recognition audio stream
+        speaker recognition audio streams
         """
         try: 
-            self.ris =  sd.RawInputStream(samplerate=self._samplerate, blocksize=8000,
-                                        device=None, dtype='int16', 
-                                        channels=1, callback=self._callback)
+            for worker in self._workers:
+                worker.start(decode_thread=self._audio_listener is None)
         except Exception as e:
             print(e)
             raise
         else:
-            self.ris.start()
-            print("KITA Audio Stream Started")
+            print("KITA Audio Stream Started: " + ", ".join(worker.name for worker in self._workers))
 
 
     def stop_audio_recording(self) -> None:
@@ -130,8 +299,8 @@ class MIMonitor:
         Stop/Pause audio stream
         """
         try:
-            self.ris.stop()
-            self.ris.close()
+            for worker in self._workers:
+                worker.stop()
         except Exception as e:
             print(f"<KITA> Audio Stream could not be stopped: {e}")
             raise
@@ -143,69 +312,283 @@ class MIMonitor:
         """
         The main loop method
         """
-        # Obtain recognised speaker's phrases
-        json_data = self._get_current_phrase_dict()
-        for key, value in json_data.items(): 
-            if key in ('partial', 'text'): 
-                self._current_phrase = value
-        # If the speaker said nothing return
-        if self._current_phrase == "":
+        if not self._voice_ready.wait(0.5):
+            return # model still loading
+        # Obtain recognised speaker's phrases, from any input device
+        phrase = self.next_phrase(0.5)
+        if phrase is not None:
+            self.handle_phrase(phrase)
+
+
+    def next_phrase(self, timeout: Optional[float] = None) -> Optional[PhraseEvent]:
+        """
+        The next recognised phrase, None if none arrived within timeout
+        """
+        try:
+            return self._phrases.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+    def handle_phrase(self, phrase: PhraseEvent) -> None:
+        """
+        Queues the commands in a recognised phrase (never waits for MI)
+        """
+        self.current_phrase = phrase
+        print(f"PHRASE ({phrase.device}): ", phrase.text)
+        # Queue every start/stop/close phrase in the order they were said,
+        # the mode's supervisor runs them while we keep listening
+        for match in self._phrase_matcher.find_all(phrase.text):
+            if not self._command_merger.accept(match.action, phrase.device, phrase.heard_at):
+                continue # the same phrase heard by another microphone
+            STARTUP.mark_once("first command")
+            action, mode = match.action
+            if mode not in self._supervisors:
+                continue # mode dropped by a config reload
+            if action == "start":
+                self.do_on_start_phrase(mode, wait=False)
+            else:
+                self.do_on_stop_phrase(mode, wait=False)
+        self.current_phrase = None # reset
+
+
+    def _build_recogniser(self, samplerate: int):
+        """
+        Creates a Vosk recogniser (on the shared model) for one device.
+        In "grammar" mode the decoder only searches the trigger phrases
+        of the watched modes (plus "[unk]" for everything else), which is
+        cheaper per audio block and avoids matches inside free speech.
+        "open" keeps the open vocabulary recogniser for comparison.
+        """
+        if self._config.get_recognition_mode() == "open":
+            recogniser = self._vosk.KaldiRecognizer(self._model, samplerate)
+        else:
+            grammar = json.dumps(self._config.get_grammar(list(self._supervisors)))
+            recogniser = self._vosk.KaldiRecognizer(self._model, samplerate, grammar)
+        endpoint = self._config.get_endpoint_settings()
+        if endpoint and hasattr(recogniser, "SetEndpointerDelays"):
+            # Overrides the model.conf trailing silence rules (vosk >= 0.3.45)
+            recogniser.SetEndpointerDelays(endpoint["start_max"], endpoint["end"], endpoint["max"])
+        return recogniser
+
+
+    def _add_supervisor(self, mode: str) -> ModeSupervisor:
+        """
+        Creates the supervisor (and, unless one was passed in,
+        the tray icon) of a watched mode
+        """
+        icon_manager = self._shared_icon_manager
+        if icon_manager is None:
+            watched = self._config.get_watched_modes()
+            name = TRAY_ICON_NAME if len(watched) == 1 else f"{TRAY_ICON_NAME} {mode}"
+            icon_manager = IconManager(name, on_quit=self._quit, **self._config.get_tray_settings())
+        supervisor = ModeSupervisor(mode, self._config, self._process_cache, icon_manager)
+        supervisor.on_change = self._publish_status
+        self._supervisors[mode] = supervisor
+        return supervisor
+
+
+    def _release_icon(self, icon_manager: IconManager) -> None:
+        """
+        Removes the tray icon of a mode no longer supervised,
+        unless it was passed in or another mode still shows it
+        """
+        if icon_manager is self._shared_icon_manager:
+            return
+        if any(supervisor.icon_manager is icon_manager for supervisor in self._supervisors.values()):
+            return
+        icon_manager.stop_icon()
+
+
+    def _open_status_mailbox(self) -> Optional[StatusMailbox]:
+        """
+        The status file external tools read, None if it is off
+        """
+        path = self._config.get_status_mailbox_path()
+        if not path:
+            return None
+        try:
+            return StatusMailbox(path)
+        except OSError as e:
+            print(f"[MI_Monitor] status mailbox {path} could not be opened: {e}")
+            return None
+
+
+    def _publish_status(self) -> None:
+        """
+        Writes the status of all supervised modes to the mailbox
+        (called on every change and every icon tracker cycle)
+        """
+        if self._status_mailbox is None:
             return
-        print("PHRASE: ", self._current_phrase)
-        # If they said a stop/close phrase
-        for phrase in self._stop_close_phrases:
-            if phrase in self._current_phrase: 
-                with lock:
-                    self.do_on_stop_phrase()
-        # If they said a start phrase
-        for phrase in self._start_phrases:
-            if phrase in self._current_phrase:
-                with lock:
-                    self.do_on_start_phrase()
-        self._current_phrase = "" # reset
+        status = self.status()
+        self._status_mailbox.publish(status["current_mode"], status["modes"], status["voice_ready"])
+
+
+    def _build_phrase_matcher(self) -> PhraseMatcher:
+        """
+        Compiles the start/stop/close phrases of all watched modes,
+        actions are (action, mode). A phrase shared by several modes
+        (e.g. "start motion") goes to the current mode.
+        """
+        modes = [mode for mode in self._supervisors if mode != self._config.current_mode]
+        phrases = {}
+        for mode in modes + [self._config.current_mode]:
+            phrases.update({phrase: ("stop", mode)
+                            for phrase in self._config.get_trigger_phrases("stop or close", mode)})
+            phrases.update({phrase: ("start", mode)
+                            for phrase in self._config.get_trigger_phrases("start", mode)})
+        return PhraseMatcher(phrases)
+
+
+    def _build_vad(self, samplerate: int) -> Optional[VoiceActivityDetector]:
+        """
+        Creates the voice activity gate of one device, None if it is disabled
+        """
+        settings = dict(self._config.get_vad_settings())
+        if not settings.pop("enabled", True):
+            return None
+        return VoiceActivityDetector(samplerate, **settings)
+
+
+    def _rebuild_recognisers(self, vad: bool = False) -> None:
+        """
+        New recognisers (e.g. new grammar or model) for all devices,
+        new voice activity gates too if vad
+        """
+        for worker in self._workers:
+            worker.replace(self._build_recogniser(worker.samplerate),
+                           self._build_vad(worker.samplerate) if vad else worker.vad)
+
+
+    def set_mode(self, mode: str) -> None:
+        """
+        Switches the current MI mode (starting to watch it if it was
+        not watched yet) and rebuilds everything derived from it
+        """
+        self._config.set_mode(mode)
+        if mode not in self._supervisors:
+            self._add_supervisor(mode)
+        self._phrase_matcher = self._build_phrase_matcher()
+        if self._voice_ready.is_set():
+            self._rebuild_recognisers()
+        self._publish_status()
+
+
+    def _on_config_change(self, old, new) -> None:
+        """
+        Applies a reloaded config.json (config watcher thread): supervisors,
+        phrase matcher, recogniser grammar and VAD are rebuilt, the Vosk
+        model is only reloaded if "model" changed
+        """
+        started = time.perf_counter()
+        watched = self._config.get_watched_modes()
+        for mode in list(self._supervisors):
+            if mode not in watched:
+                supervisor = self._supervisors.pop(mode) # no longer supervised
+                supervisor.close()
+                supervisor.set_icon(False)
+                self._release_icon(supervisor.icon_manager)
+        for mode in watched:
+            if mode not in self._supervisors:
+                self._add_supervisor(mode)
+            else:
+                self._supervisors[mode].submit("reconfigure") # between commands
+        self._phrase_matcher = self._build_phrase_matcher()
+        self._command_merger.window = self._config.get_device_dedupe_window()
+        for worker in self._workers:
+            worker.fast_partials = self._config.get_fast_partials()
+        if self._voice_ready.is_set():
+            if new.model != old.model:
+                Thread(target=self._reload_model, daemon=True, name="MIMonitor Model Reloader").start()
+            else:
+                self._rebuild_recognisers(vad=new.vad_settings != old.vad_settings)
+        self._publish_status()
+        print(f"Config reloaded in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+    def _reload_model(self) -> None:
+        """
+        Loads the new Vosk model, the old recogniser keeps
+        listening until the new one is ready
+        """
+        self._set_status("voice loading")
+        try:
+            started = time.perf_counter()
+            self._model = self._vosk.Model(self._config.get_vosk_path())
+            self._rebuild_recognisers()
+            print(f"Vosk model reloaded in {time.perf_counter() - started:.2f} s")
+        except Exception as e:
+            print(f"MIMonitor: new Vosk model could not be loaded, keeping the old one: {e}", file=sys.stderr)
+        self._set_status("")
+
+
+    def set_icon(self, value, mode: Optional[str] = None) -> None:
+        """
+        Sets the icon of mode (the current one if None) to the correct colour
+        """
+        self._supervisor(mode).set_icon(value)
+
+
+    def _set_status(self, text: str) -> None:
+        """
+        Shows text (e.g. "voice loading") on every tray icon
+        """
+        for icon_manager in {id(s.icon_manager): s.icon_manager for s in self._supervisors.values()}.values():
+            icon_manager.set_status(text)
+
+
+    def audio_position(self) -> float:
+        """
+        Seconds of audio decoded when the phrase being handled was heard,
+        else the most any device has decoded so far
+        """
+        if self.current_phrase is not None:
+            return self.current_phrase.position
+        return max((worker.position() for worker in self._workers), default=0.0)
+
+
+    def is_listening(self) -> bool:
+        """
+        True while any device is still being decoded
+        """
+        return any(worker.is_alive() for worker in self._workers)
+
+
+    def pending_phrases(self) -> int:
+        """
+        Recognised phrases run() has not handled yet
+        """
+        return self._phrases.qsize()
 
 
-    def set_icon(self, value) -> None:
+    def device_stats(self) -> Dict[str, Dict]:
         """
-        Sets the icon to the correct colour
+        Audio buffer, VAD and phrase counters per input device
         """
-        if self._last_MI_check and not value:
-            self._icon_manager.red_icon_set() # set icon red
-            self._last_MI_check = False
-        elif not self._last_MI_check and value:
-            self._icon_manager.green_icon_set() # set icon green
-            self._last_MI_check = True
+        return {worker.name: worker.stats() for worker in self._workers}
 
 
-    def _get_current_phrase_dict(self) -> Dict[str, str]:
+    def audio_buffer_stats(self) -> Dict[str, int]:
         """
-        Get current phrase from vosk
+        Audio ring buffer depth, high water mark and overruns (all devices)
         """
-        json_data = {}
-        audio = self._queue.get()
-        # Processes the wav (user speech) audio data; convert to text
-        if self._recogniser.AcceptWaveform(audio): 
-            # Get complete result
-            # Vosk returns a json object by default {"Text", "user speech goes here"} 
-            json_data = json.loads(self._recogniser.Result()) 
-        # Partials can be enabled for faster responses, however, only single words
-        # speech commands are accurate. In addition
-        #else:
-        #    # Get partial result
-        #    json_data = json.loads(self._recogniser.PartialResult())
-        return json_data
+        total = {}
+        for worker in self._workers:
+            for key, value in worker.buffer.stats().items():
+                total[key] = max(total.get(key, 0), value) if key == "high_water" else total.get(key, 0) + value
+        return total
 
 
-    def _callback(self, indata, frames: int, time, status) -> None:
+    def vad_stats(self) -> Dict[str, int]:
         """
-        This is called (from a separate thread) for each audio block.
-        It returns the microphone audio data
+        Blocks forwarded to / kept away from the recogniser (all devices)
         """
-        if status:
-            print(status, file=sys.stderr)
-            sys.stdout.flush()
-        if self._is_running:
-            self._queue.put(bytes(indata))
+        total = {}
+        for worker in self._workers:
+            for key, value in worker.vad_stats().items():
+                total[key] = total.get(key, 0) + value
+        return total
 
 
     def stop(self) -> None:
@@ -213,110 +596,290 @@ class MIMonitor:
         STOP 
         """
         self._is_running = False
+        self._tracker_stopped.set()
+        self._config.stop_watching()
+        self._stop_metrics_export()
+        if self._control_server is not None:
+            self._control_server.stop()
+            self._control_server = None
+        if self._resource_sampler is not None:
+            self._resource_sampler.stop()
+        for supervisor in list(self._supervisors.values()):
+            supervisor.close()
+        mailbox, self._status_mailbox = self._status_mailbox, None
+        if mailbox is not None:
+            mailbox.close(self._config.current_mode,
+                          [supervisor.status() for supervisor in self._supervisors.values()])
+        if self._workers:
+            try:
+                self.stop_audio_recording()
+            except:
+                print("<_stop()> There was a problem stopping audio recording.")
+        self._process_source.close()
+        print("Process cache: ", self._process_cache.stats())
+        print("Voice activity gate: ", self.vad_stats())
+        print("Audio buffer: ", self.audio_buffer_stats())
+        if len(self._workers) > 1:
+            print("Input devices: ", self.device_stats())
+
+
+    def _register_metrics(self) -> None:
+        """
+        Hot path metrics; values kept elsewhere are read at render time
+        (audio and recogniser metrics are per device, see recognition_worker.py)
+        """
+        self._lookup_seconds = REGISTRY.histogram("mimonitor_process_lookup_seconds",
+                                                  "MI instance lookups (cached or scanning)")
+        for key in ("hits", "misses", "coalesced"):
+            REGISTRY.counter("mimonitor_process_cache_total", "Process snapshot cache lookups",
+                             {"result": key}).set_function(lambda key=key: getattr(self._process_cache, key))
+
+
+    def _start_metrics_export(self) -> None:
+        """
+        Starts the metrics HTTP endpoint and/or file (config "metrics")
+        """
+        settings = self._config.get_metrics_settings()
+        port = int(settings.get("port", 0))
+        if port:
+            try:
+                self._metrics_server = start_http_server(port)
+                print(f"Metrics on http://127.0.0.1:{port}/metrics")
+            except OSError as e:
+                print(f"[MI_Monitor] metrics port {port} could not be opened: {e}")
+        if settings.get("file"):
+            self._metrics_file = FileExporter(settings["file"], float(settings.get("interval", 10.0)))
+            self._metrics_file.start()
+
+
+    def _stop_metrics_export(self) -> None:
+        if self._metrics_server is not None:
+            self._metrics_server.shutdown()
+            self._metrics_server.server_close()
+            self._metrics_server = None
+        if self._metrics_file is not None:
+            self._metrics_file.stop()
+            self._metrics_file = None
+
+
+    def _start_control_server(self) -> None:
+        """
+        Starts the local control API (config "control")
+        """
+        settings = self._config.get_control_settings()
+        if not settings["enabled"]:
+            return
+        server = ControlServer(self, settings["address"])
         try:
-            self.stop_audio_recording()
-        except:
-            print("<_stop()> There was a problem stopping audio recording.")
+            server.start()
+        except (OSError, RuntimeError) as e:
+            print(f"[MI_Monitor] control API could not be started: {e}")
+            return
+        self._control_server = server
+
+
+    def _start_resource_sampler(self) -> None:
+        """
+        Starts sampling the supervised MI instances (config "resources")
+        """
+        settings = self._config.get_resource_settings()
+        if not settings["enabled"]:
+            return
+        self._resource_sampler = ResourceSampler(self._supervised_pids, self._on_resource_violation,
+                                                 ResourcePolicy.from_settings(settings),
+                                                 settings["interval"], int(settings["capacity"]))
+        self._resource_sampler.start()
+
+
+    def _supervised_pids(self) -> Dict[str, List[int]]:
+        """
+        {mode: MI PIDs} of the modes running with no command in progress
+        (MI starting or closing is not judged by the resource policy)
+        """
+        return {mode: list(supervisor.pids) for mode, supervisor in list(self._supervisors.items())
+                if supervisor.state == RUNNING and supervisor.is_idle()}
+
+
+    def _on_resource_violation(self, mode: str, pid: int, reason: str, action: str) -> None:
+        """
+        Resource sampler thread: MI of mode is hung or out of bounds
+        """
+        print(f"[MI_Monitor] {mode} MI PID {pid} {reason} check failed" +
+              (", restarting it" if action == "restart" else ""))
+        if action == "restart" and mode in self._supervisors:
+            self._command("restart", mode, wait=False)
+
+
+    def resource_stats(self) -> Dict[str, Dict]:
+        """
+        Latest CPU %, memory, threads and I/O per sampled MI PID
+        """
+        return {} if self._resource_sampler is None else self._resource_sampler.stats()
+
+
+    def _quit(self) -> None:
+        """
+        Quit from the tray menu, the main loop ends and calls stop()
+        """
+        self._is_running = False
+        self._notify_activity("quit")
+
+
+    def set_audio_listener(self, callback: Optional[Callable[[RecognitionWorker], None]]) -> None:
+        """
+        callback(worker) is called on the audio thread after every block a
+        device buffered, and the caller decodes it (worker.decode_available)
+        instead of the worker's own thread. Must be set before start().
+        """
+        self._audio_listener = callback
+
+
+    def add_activity_listener(self, callback: Callable[[str], None]) -> None:
+        """
+        callback(reason) on "command" (submitted), "process" (a watched
+        exe started or exited, event driven backends) and "quit",
+        from whichever thread it happened on
+        """
+        self._activity_listeners.append(callback)
+
+
+    def _notify_activity(self, reason: str) -> None:
+        for callback in list(self._activity_listeners):
+            try:
+                callback(reason)
+            except Exception as e:
+                print(f"[MI_Monitor] activity listener error: {e}")
+
+
+    def runtime_settings(self) -> Mapping:
+        """
+        Main loop settings (config "runtime")
+        """
+        return self._config.get_runtime_settings()
 
 
     def is_active(self) -> bool:
         return self._is_running
 
 
+    def process_cache_stats(self) -> Dict[str, float]:
+        """
+        Process snapshot cache hit/miss/coalesce counters
+        """
+        return self._process_cache.stats()
+
+
     #######################################################################
 
 
-    def do_on_start_phrase(self) -> None:
+    def _supervisor(self, mode: Optional[str] = None) -> ModeSupervisor:
+        return self._supervisors[mode or self._config.current_mode]
+
+
+    def do_on_start_phrase(self, mode: Optional[str] = None, wait: bool = True) -> CommandTicket:
         """
-        Method to start MI
+        Method to start MI of mode (the current one if None).
+        wait=False only queues the command.
         """
-        MI_instances = self._MI_process_info()
-        if len(MI_instances) == 1:
-            return
-        elif len(MI_instances) > 1:
-            self.do_on_stop_phrase()
-        ## Windows
-        #if sys.platform == "win32":
-        #    print("Starting MI now...")
-        try: 
-            Popen("start cmd /C" + self._mi_exe, cwd=self._mi_folder_path, shell=True)
-            #p = Popen("start cmd /C" + self._mi_exe, cwd = self._mi_folder_path, shell=True)
-            #stdout, stderr = p.communicate()
-        except Exception as e:
-            print("MIMonitor.do_on_start_phrase(): start subprocess issue", e)
-            raise
-        ## MacOS
-        #elif sys.platform == "darwin":
-        #    Popen("./" + MI_EXE, cwd = MI_FOLDER, shell=True)
-        time.sleep(0.5) # wait for process to get added to os processes
-        MI_instances = self._MI_process_info()
-        if len(MI_instances) == 1:
-            print(f"{self._mi_exe} app detected in process list") # MI app is confirmed running
-            self.set_icon(True)
-        else: # second check
-            time.sleep(0.5) # wait for process to get added to os processes
-            MI_instances = self._MI_process_info()
-            if len(MI_instances) == 1:
-                print(f"{self._mi_exe} app detected in process list") # MI app is confirmed running
-                self.set_icon(True)
-            else:
-                raise RuntimeError(f"{self._mi_exe} app NOT detected in process list. There was a problem with starting the app. Please make sure the path is correct.")
+        return self._command("start", mode, wait)
 
 
-    def do_on_stop_phrase(self) -> None:
+    def do_on_stop_phrase(self, mode: Optional[str] = None, wait: bool = True) -> CommandTicket:
         """
-        Kills MI instance(s)
+        Kills MI instance(s) of mode (the current one if None)
         """
-        MI_instances = self._MI_process_info()
-        if len(MI_instances) == 0:
-            return
-        print("bat_exit: ", self._bat_exit, "bat_folder: ", self._bat_folder_path)
-        Popen("start cmd /C" + self._bat_exit, cwd=self._bat_folder_path, shell=True) # attempt image process kill
-        time.sleep(0.5) # wait for process to get removed from os processes
-        MI_instances = self._MI_process_info()
-        if len(MI_instances) == 0:
-            self.set_icon(False)
-            print("MI closed")
-        else:
-            Popen("start cmd /C" + self._bat_forced_exit, cwd=self._bat_folder_path, shell=True) # forced process kill
-            print("MI forced closed")
+        return self._command("stop", mode, wait)
+
+
+    def do_on_restart_phrase(self, mode: Optional[str] = None, wait: bool = True) -> CommandTicket:
+        """
+        On Start works as a restart as well
+        so thing might not be needed
+        """
+        return self._command("restart", mode, wait)
+
+
+    def _command(self, command: str, mode: Optional[str], wait: bool) -> CommandTicket:
+        ticket = self._supervisor(mode).submit(command)
+        self._notify_activity("command")
+        if wait:
+            ticket.result() # raises what the command raised
+        return ticket
+
+
+    def exit_history(self, mode: Optional[str] = None) -> List:
+        """
+        Recent (pid, exit code, time, uptime, expected) of mode's MI
+        """
+        return self._supervisor(mode).exit_history()
+
+
+    def state(self, mode: Optional[str] = None) -> str:
+        """
+        stopped/starting/running/stopping/deduplicating, never blocks
+        """
+        return self._supervisor(mode).state
+
+
+    def current_mode(self) -> str:
+        return self._config.current_mode
+
+
+    def supervised_modes(self) -> List[str]:
+        return list(self._supervisors)
+
+
+    def status(self) -> Dict:
+        """
+        Current mode, voice readiness and the status of every supervised mode
+        """
+        return {"current_mode": self._config.current_mode,
+                "voice_ready": self._voice_ready.is_set(),
+                "modes": [supervisor.status() for supervisor in list(self._supervisors.values())]}
 
 
-    def _MI_process_info(self) -> List[str]:
+    def _MI_process_info(self, mode: Optional[str] = None) -> List[Dict]:
         """
         Returns MI instance
         or instances
         """
-        MI_instances = []
+        # Option to search for ANY instance of MI, not just the one we are dealing with
+        #return [p for p in self._process_cache.snapshot()
+        #        if p['Name'].startswith(('UCL-MI3', 'MI3'))]
+        return self._supervisor(mode).MI_process_info()
+
+
+    def _all_MI_process_info(self) -> Dict[str, List[Dict]]:
+        """
+        {exe: instances} for every watched mode, from one scan
+        """
+        exes = list({supervisor.mi_exe for supervisor in self._supervisors.values()})
         try:
-            output = check_output(["wmic", "process", "list", "full", "/format:list"])
-            output = output.decode("utf-8") # binary
+            with self._lookup_seconds.time():
+                return self._process_cache.find_all(exes)
         except Exception as e:
-            print("ERROR <MI_process_info> subprocess.check_output: ", e)
+            print("ERROR <MI_process_info> process source: ", e)
             raise
-        output_list = []
-        for task in output.strip().split("\r\r\n\r\r\n"):
-            output_list.append(dict(e.split("=", 1) for e in task.strip().split("\r\r\n")))
-        for process in output_list:
-            if process['Name'] == self._mi_exe:
-                MI_instances.append(process)
-            # Option to search for ANY instance of MI, not just the one we are dealing with
-            #for sname in ['UCL-MI3', 'MI3']:
-            #    if process['Name'].startswith(sname):
-            #        MI_instances.append(process)
-            #        self._process_name = process['Name']
-                    #print(process)
-        return MI_instances
-
-
-    def do_on_restart_phrase(self) -> None:
+
+
+    def _on_process_event(self, event: str, record: Dict) -> None:
         """
-        On Start works as a restart as well
-        so thing might not be needed
+        Process source listener (event driven backends only),
+        wakes up anything waiting for that MI to appear or go away
+        """
+        watched = False
+        for supervisor in list(self._supervisors.values()):
+            supervisor.on_process_event(event, record)
+            watched = watched or record["Name"] == supervisor.mi_exe
+        if watched:
+            self._notify_activity("process")
+
+
+    def command_timings(self, mode: Optional[str] = None) -> List:
+        """
+        Recent (action, seconds, confirmed) for every launch and kill of mode
         """
-        self.do_on_stop_phrase()
-        time.sleep(0.5)
-        self.do_on_start_phrase()
+        return self._supervisor(mode).command_timings()
 
     #######################################################################
 
@@ -326,13 +889,18 @@ if __name__ == "__main__":
     try:
         # Start MI
         m = MIMonitor()
-        m.start()
         print("[MIM Started]")
         print("Say 'start motion/hands/face' to run MI\n or 'stop/close motion/hands/face' to close MI")
-        while m.is_active():
-            m.run()
-        # Stop MI
-        m.stop()
+        print("or use the control API: python control_server.py start|stop|restart|mode|status")
+        if m.runtime_settings()["loop"] == "asyncio":
+            # one event loop instead of the tracker and decoding threads, stops MIMonitor itself
+            asyncio.run(AsyncRuntime(m).run())
+        else:
+            m.start()
+            while m.is_active():
+                m.run()
+            # Stop MI
+            m.stop()
         print("[MIM Stopped]")
     except Exception:
         raise
@@ -0,0 +1,233 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Optional asyncio main loop for MIMonitor (config "runtime": {"loop": "asyncio"}).
+
+The threaded runtime has a decoding thread per input device, two
+process tracker threads scanning every process_cache_ttl seconds and
+the main thread waiting for phrases. Here one event loop drives it all:
+- the audio callback only tells the loop that a device buffered a block
+  (call_soon_threadsafe), the block itself stays in the device's ring
+  buffer and is decoded by worker.decode_available() on an executor
+  thread, so nothing runs while the microphones are quiet
+- recognised phrases are handled on the loop right after the decode
+  that produced them (commands are queued, MI is never waited for)
+- one tracker task does both trackers' work from one scan, on an
+  adaptive cadence: tracker_min seconds after a command, a process
+  event or any change, then backing off (x backoff) up to tracker_max
+  while MI is stable, so a duplicate is noticed within tracker_max
+  seconds at worst (at once with an event driven process backend)
+
+Shutdown (tray quit, SIGTERM, Ctrl+C or stop()) cancels the tracker,
+stops the monitor, lets every device finish decoding what it had
+buffered and joins the executor.
+'''
+import asyncio
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Mapping, Optional
+
+from recognition_worker import RecognitionWorker
+
+
+class AdaptiveInterval:
+    """ Tracker cadence: fast after activity, backing off while nothing changes """
+
+    def __init__(self, minimum: float = 0.25, maximum: float = 5.0, backoff: float = 2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.current = minimum
+
+
+    def reset(self) -> float:
+        """
+        Back to the fastest cadence (something happened)
+        """
+        self.current = self.minimum
+        return self.current
+
+
+    def next(self, changed: bool) -> float:
+        """
+        Seconds until the next check, after a check that found changed
+        """
+        if changed:
+            return self.reset()
+        self.current = min(self.current * self.backoff, self.maximum)
+        return self.current
+
+
+class AsyncRuntime:
+    """ Runs a MIMonitor on one asyncio event loop """
+
+    def __init__(self, monitor, settings: Optional[Mapping] = None,
+                 track_processes: bool = True, decode_timeout: float = 2.0):
+        """
+        monitor - the MIMonitor to run (not started yet)
+        settings - config "runtime" (tracker_min, tracker_max, backoff),
+        the monitor's own by default
+        track_processes=False leaves the tracker task off (e.g. benchmarks)
+        decode_timeout - seconds shutdown waits for the devices to finish decoding
+        """
+        settings = monitor.runtime_settings() if settings is None else settings
+        self._monitor = monitor
+        self._track = track_processes
+        self._decode_timeout = decode_timeout
+        self.cadence = AdaptiveInterval(settings.get("tracker_min", 0.25), settings.get("tracker_max", 5.0),
+                                        settings.get("backoff", 2.0))
+        self._loop = None
+        self._executor = None
+        self._stopping = None # asyncio.Event, set once to shut down
+        self._hurry = None # asyncio.Event, wakes the tracker early
+        self._decoders = {} # worker -> (asyncio.Event, Task)
+        self.tracker_checks = 0
+        self.decode_calls = 0
+
+
+    async def run(self) -> None:
+        """
+        Starts the monitor and runs it until it is stopped
+        """
+        self._loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(thread_name_prefix="MIMonitor Async")
+        self._stopping = asyncio.Event()
+        self._hurry = asyncio.Event()
+        self._install_signal_handlers()
+        monitor = self._monitor
+        monitor.set_audio_listener(self._on_audio)
+        monitor.add_activity_listener(self._on_activity)
+        tracker = None
+        try:
+            monitor.start(track_processes=False)
+            if self._track:
+                tracker = asyncio.create_task(self._run_tracker(), name="MIMonitor Tracker")
+            if monitor.is_active():
+                await self._stopping.wait()
+        finally:
+            await self._shutdown(tracker)
+
+
+    def stop(self) -> None:
+        """
+        Asks the loop to shut down (from any thread)
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+
+    def _install_signal_handlers(self) -> None:
+        # Ctrl+C already cancels asyncio.run(); SIGTERM only where the loop supports it
+        try:
+            self._loop.add_signal_handler(signal.SIGTERM, self._stopping.set)
+        except (NotImplementedError, AttributeError, RuntimeError):
+            pass # Windows, or not the main thread
+
+
+    async def _shutdown(self, tracker: Optional[asyncio.Task]) -> None:
+        """
+        Tracker first, then the monitor (audio input closed), then the
+        devices drain their buffers, then the executor
+        """
+        self._stopping.set()
+        if tracker is not None:
+            tracker.cancel()
+            await asyncio.gather(tracker, return_exceptions=True)
+        await self._loop.run_in_executor(self._executor, self._monitor.stop)
+        decoders = [task for event, task in self._decoders.values()]
+        for event, task in self._decoders.values():
+            event.set() # the closed buffers are drained by the last decode
+        if decoders:
+            done, pending = await asyncio.wait(decoders, timeout=self._decode_timeout)
+            for task in pending:
+                task.cancel()
+        self._executor.shutdown(wait=True)
+
+
+    def _on_audio(self, worker: RecognitionWorker) -> None:
+        """
+        Audio thread: a device buffered a block
+        """
+        try:
+            self._loop.call_soon_threadsafe(self._wake_decoder, worker)
+        except RuntimeError:
+            pass # the loop has closed
+
+
+    def _on_activity(self, reason: str) -> None:
+        """
+        Monitor activity (any thread): a command or process event speeds
+        the tracker up, quit from the tray stops the loop
+        """
+        event = self._stopping if reason == "quit" else self._hurry
+        try:
+            self._loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass
+
+
+    def _wake_decoder(self, worker: RecognitionWorker) -> None:
+        entry = self._decoders.get(worker)
+        if entry is None:
+            if self._stopping.is_set():
+                return
+            event = asyncio.Event()
+            task = asyncio.create_task(self._run_decoder(worker, event), name=f"MIMonitor Decoder {worker.name}")
+            entry = self._decoders[worker] = (event, task)
+        entry[0].set()
+
+
+    async def _run_decoder(self, worker: RecognitionWorker, wake: asyncio.Event) -> None:
+        """
+        Decodes a device's buffered blocks each time it reports new ones
+        """
+        while True:
+            await wake.wait()
+            wake.clear()
+            alive = await self._loop.run_in_executor(self._executor, worker.decode_available)
+            self.decode_calls += 1
+            self._handle_phrases()
+            if not alive:
+                return
+
+
+    def _handle_phrases(self) -> None:
+        monitor = self._monitor
+        while True:
+            phrase = monitor.next_phrase(0)
+            if phrase is None:
+                return
+            if self._stopping.is_set():
+                continue # the supervisors are closing
+            try:
+                monitor.handle_phrase(phrase)
+            except RuntimeError as e:
+                print(e)
+
+
+    async def _run_tracker(self) -> None:
+        """
+        Duplicate check, state and icons on the adaptive cadence
+        """
+        while True:
+            try:
+                changed = await self._loop.run_in_executor(self._executor, self._monitor.track_processes_once)
+            except Exception as e:
+                print(f"[MI_Monitor] process tracking failed: {e}")
+                changed = False
+            self.tracker_checks += 1
+            delay = self.cadence.next(changed)
+            try:
+                await asyncio.wait_for(self._hurry.wait(), delay)
+            except asyncio.TimeoutError:
+                continue
+            self._hurry.clear()
+            self.cadence.reset()
+
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Tracker checks, decoder calls and the current tracker interval
+        """
+        return {"tracker_checks": self.tracker_checks, "decode_calls": self.decode_calls,
+                "tracker_interval": self.cadence.current}
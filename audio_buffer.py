@@ -0,0 +1,148 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Bounded audio ring buffer between the sounddevice callback
+and the recognition loop.
+
+The buffer is a preallocated ((capacity + 1) x block_frames) int16 array,
+so the audio callback only copies the device block into a free slot
+and never allocates. get() hands the recognition side a memoryview of
+the slot (no copy) and swaps it out of the ring for the spare slot,
+so the writer cannot overwrite it until the next get() call.
+
+When recognition falls behind the buffer does not grow:
+- "drop_oldest" overwrites the oldest queued block (the default,
+  keeps latency bounded)
+- "block" makes the writer wait up to block_timeout for a free slot
+  and drops the new block after that (block_timeout None waits until
+  there is room, for sources faster than real time like WAV replay)
+depth, high water mark and overrun counters help sizing the buffer.
+'''
+import time
+from threading import Condition
+from typing import Dict, Optional
+
+import numpy as np
+
+POLICIES = ("drop_oldest", "block")
+
+
+class AudioRingBuffer:
+    """ Fixed capacity ring of int16 audio blocks """
+
+    def __init__(self, capacity: int = 32, block_frames: int = 8000, channels: int = 1,
+                 policy: str = "drop_oldest", block_timeout: Optional[float] = 0.1):
+        if policy not in POLICIES:
+            raise ValueError(f"[MI_Monitor] Unknown overflow policy '{policy}', use one of {POLICIES}")
+        if capacity < 2:
+            raise ValueError("[MI_Monitor] Audio ring buffer needs at least 2 slots")
+        self._data = np.zeros((capacity + 1, block_frames * channels), dtype=np.int16)
+        self._lengths = [0] * (capacity + 1)
+        self._slots = list(range(capacity)) # ring position -> row of _data
+        self._spare = capacity # row not in the ring (free or being read)
+        self._capacity = capacity
+        self._policy = policy
+        self._block_timeout = block_timeout
+        self._cond = Condition()
+        self._head = 0 # oldest queued slot
+        self._count = 0 # queued slots
+        self._closed = False
+        self.high_water = 0
+        self.overruns = 0
+        self.writes = 0
+
+
+    def put(self, indata) -> bool:
+        """
+        Copies one block (any buffer of int16 samples) into the ring.
+        Returns False if the block had to be dropped.
+        """
+        samples = np.frombuffer(indata, dtype=np.int16)
+        with self._cond:
+            if self._is_full():
+                if self._policy == "block":
+                    if self._block_timeout is None:
+                        self._cond.wait_for(lambda: not self._is_full() or self._closed)
+                    deadline = time.monotonic() + (self._block_timeout or 0.0)
+                    while self._is_full() and not self._closed:
+                        left = deadline - time.monotonic()
+                        if left <= 0 or not self._cond.wait(left):
+                            break
+                    if self._is_full():
+                        self.overruns += 1
+                        return False
+                elif self._count > 0:
+                    # drop the oldest queued block
+                    self._head = (self._head + 1) % self._capacity
+                    self._count -= 1
+                    self.overruns += 1
+                else:
+                    self.overruns += 1
+                    return False
+            row = self._slots[(self._head + self._count) % self._capacity]
+            n = min(len(samples), self._data.shape[1])
+            self._data[row, :n] = samples[:n]
+            self._lengths[row] = n
+            self._count += 1
+            self.writes += 1
+            if self._count > self.high_water:
+                self.high_water = self._count
+            self._cond.notify_all()
+        return True
+
+
+    def _is_full(self) -> bool:
+        return self._count >= self._capacity
+
+
+    def get(self, timeout: Optional[float] = None) -> Optional[memoryview]:
+        """
+        Returns the oldest block as a byte memoryview into the ring
+        (valid until the next get() call), None on timeout or close
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._count > 0 or self._closed, timeout):
+                return None
+            if self._count == 0:
+                return None
+            # The spare row (last block read) replaces the row handed out
+            row = self._slots[self._head]
+            self._slots[self._head] = self._spare
+            self._spare = row
+            self._head = (self._head + 1) % self._capacity
+            self._count -= 1
+            n = self._lengths[row]
+            self._cond.notify_all()
+        return memoryview(self._data[row, :n]).cast("B")
+
+
+    def close(self) -> None:
+        """
+        Wakes up all waiting readers and writers
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+
+    def depth(self) -> int:
+        """
+        Number of blocks waiting to be read
+        """
+        return self._count
+
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Depth, high water mark and overrun counters
+        """
+        with self._cond:
+            return {"depth": self._count,
+                    "capacity": self._capacity,
+                    "high_water": self.high_water,
+                    "overruns": self.overruns,
+                    "writes": self.writes}
@@ -0,0 +1,160 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Audio sources feeding MIMonitor.
+
+A source calls callback(indata, frames, time, status) for every block
+of int16 mono audio, the same way sounddevice calls MIMonitor._callback,
+so MIMonitor does not care where the audio comes from.
+
+- MicrophoneSource - live input device (sounddevice RawInputStream)
+- WavFileSource    - replays a WAV file, at real time or as fast as
+                     the recogniser can take it (used for benchmarks)
+'''
+import os
+import sys
+import time
+import wave
+from threading import Event, Thread, current_thread
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+
+class AudioSource:
+    """ Base class for everything MIMonitor can listen to """
+
+    realtime = True # False if blocks can arrive faster than real time
+    name = "audio" # shown in logs and per device metrics
+
+    def __init__(self, samplerate: int, blocksize: int):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+
+
+    def start(self, callback: Callable) -> None:
+        """
+        Starts calling callback(indata, frames, time, status) per block
+        """
+        raise NotImplementedError
+
+
+    def stop(self) -> None:
+        """
+        Stops the audio
+        """
+        raise NotImplementedError
+
+
+class MicrophoneSource(AudioSource):
+    """ Live audio input device """
+
+    def __init__(self, device=None, blocksize: Optional[int] = None, block_ms: float = 500.0):
+        """
+        device - sounddevice number or name (None = default input)
+        blocksize - frames per block, else block_ms of audio at the device rate
+        """
+        import sounddevice as sd
+        self._sd = sd
+        self._device = device
+        device_info = sd.query_devices(device, kind='input')
+        samplerate = int(device_info['default_samplerate'])
+        if blocksize is None:
+            blocksize = max(1, int(samplerate * block_ms / 1000))
+        super().__init__(samplerate, blocksize)
+        self.name = device_info['name']
+        self.ris = None
+
+
+    def start(self, callback: Callable) -> None:
+        try:
+            self.ris = self._sd.RawInputStream(samplerate=self.samplerate, blocksize=self.blocksize,
+                                               device=self._device, dtype='int16',
+                                               channels=1, callback=callback)
+        except Exception as e:
+            print(e)
+            raise
+        self.ris.start()
+
+
+    def stop(self) -> None:
+        if self.ris is None:
+            return
+        self.ris.stop()
+        self.ris.close()
+        self.ris = None
+
+
+def read_wav(path: str) -> Tuple[np.ndarray, int]:
+    """
+    Reads a 16 bit PCM WAV file as int16 mono samples
+    """
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"[MI_Monitor] {path} - only 16 bit PCM WAV files are supported")
+        samplerate = f.getframerate()
+        channels = f.getnchannels()
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, samplerate
+
+
+class WavFileSource(AudioSource):
+    """ Replays a WAV file block by block from its own thread """
+
+    def __init__(self, path: str, blocksize: int = 8000, realtime: bool = True,
+                 pad_silence: float = 1.0, on_finished: Optional[Callable[[], None]] = None):
+        """
+        path - 16 bit PCM WAV file
+        realtime - False feeds blocks as fast as the callback returns
+        pad_silence - seconds of silence appended, so the last phrase can end
+        on_finished - called after the last block
+        """
+        self._samples, samplerate = read_wav(path)
+        super().__init__(samplerate, blocksize)
+        self.path = path
+        self.name = os.path.basename(path)
+        self.realtime = realtime
+        self.duration = len(self._samples) / samplerate
+        self._pad = np.zeros(int(pad_silence * samplerate), dtype=np.int16)
+        self._on_finished = on_finished
+        self._thread = None
+        self._stopped = Event()
+        self.finished = Event()
+
+
+    def start(self, callback: Callable) -> None:
+        self._stopped.clear()
+        self.finished.clear()
+        self._thread = Thread(target=self._play, args=(callback,), daemon=True,
+                              name="MIMonitor WAV Replay")
+        self._thread.start()
+
+
+    def _play(self, callback: Callable) -> None:
+        audio = np.concatenate((self._samples, self._pad))
+        started = time.perf_counter()
+        for offset in range(0, len(audio), self.blocksize):
+            if self._stopped.is_set():
+                break
+            block = audio[offset:offset + self.blocksize]
+            if self.realtime:
+                # wait until the block would have been recorded
+                delay = started + (offset + len(block)) / self.samplerate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            try:
+                callback(block, len(block), None, None)
+            except Exception as e:
+                print(f"[MI_Monitor] WAV replay callback error: {e}", file=sys.stderr)
+                break
+        self.finished.set()
+        if self._on_finished is not None:
+            self._on_finished()
+
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None and self._thread is not current_thread():
+            self._thread.join()
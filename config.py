@@ -3,12 +3,23 @@ Author: Anelia Gaydardzhieva
 Comments:
 A class to get information from the config.json
 Adapted from MotionInput
-#TODO: Could optimise and introduce improved data validations 
-with @dataclass-es or, even better, pydantic library.
+
+config.json is validated and compiled once into an immutable
+ConfigSnapshot (phrase tables, paths and per-mode settings are
+precomputed), so the getters only read attributes.
+Config.watch() polls the file's mtime and swaps a new snapshot in
+(one attribute assignment) when the file changes; listeners get
+(old, new) snapshots and rebuild only what changed. An invalid file
+is reported and the running snapshot is kept.
 '''
 import os
 import json
-from typing import Dict, List
+from threading import Event, Lock, Thread
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from process_source import BACKENDS
+from restart_policy import RESTART_ON
 
 
 def check_paths(*paths):
@@ -21,55 +32,423 @@ def check_paths(*paths):
 
 DATA_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "data"))
 
+RECOGNITION_MODES = ("grammar", "open")
+PROCESS_CONTROLS = ("direct", "bat")
+DUPLICATE_POLICIES = ("restart", "keep_oldest", "ignore")
+RUNTIMES = ("threads", "asyncio")
+RESOURCE_DEFAULTS = {"enabled": False, "interval": 1.0, "capacity": 600, "hang_seconds": 30.0, "hang_cpu": 0.5,
+                     "memory_limit_mb": 0, "cpu_limit": 0, "cpu_seconds": 30.0, "action": "flag"}
+CRASH_POLICY_DEFAULTS = {"restart": True, "restart_on": "crash", "initial": 1.0, "factor": 2.0,
+                         "max_delay": 30.0, "max_crashes": 5, "window": 120.0, "stable_after": 60.0}
+# Keys that are only read at startup, changing them needs a restart
+RESTART_KEYS = ("process_backend", "process_cache_ttl", "process_resync_interval", "audio_buffer", "metrics",
+                "tray", "status_mailbox", "control", "input_devices", "audio_input", "runtime", "resources")
+
+
+class _Frozen:
+    """ Slots based read-only object, attributes are set once in __init__ """
+
+    __slots__ = ()
+
+    def _set(self, **values) -> None:
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"[MI_Monitor] {type(self).__name__} is read-only")
+
+
+def _check(condition: bool, message: str) -> None:
+    if not condition:
+        raise ValueError(f"[MI_Monitor] config - {message}")
+
+
+class ModeSettings(_Frozen):
+    """ Validated, precomputed settings of one MI mode """
+
+    __slots__ = ("name", "mi_exe", "mi_folder_path", "start_phrases", "stop_phrases",
+                 "bat_exit", "bat_forced_exit", "endpoint", "start_timeout",
+                 "stop_timeout", "ready", "duplicate_policy", "crash_policy")
+
+    def __init__(self, name: str, data: Dict):
+        for key in ("mi_exe", "mi_folder", "trigger_phrases"):
+            _check(key in data, f"mode {name} has no {key}")
+        phrases = data["trigger_phrases"]
+        _check(isinstance(phrases, list) and phrases and all(isinstance(p, str) and p.strip() for p in phrases),
+               f"mode {name} trigger_phrases must be a list of words")
+        phrases = [" ".join(phrase.lower().split()) for phrase in phrases]
+        ready = data.get("ready", "process")
+        _check(ready in ("process", "window") or (ready.startswith("port:") and ready[5:].isdigit()),
+               f"mode {name} ready must be process, window or port:<number>")
+        duplicate_policy = data.get("duplicate_policy", "restart")
+        _check(duplicate_policy in DUPLICATE_POLICIES,
+               f"mode {name} duplicate_policy must be one of {DUPLICATE_POLICIES}")
+        crash_policy = dict(CRASH_POLICY_DEFAULTS)
+        crash_policy.update(data.get("crash_policy", {}))
+        _check(set(crash_policy) == set(CRASH_POLICY_DEFAULTS),
+               f"mode {name} crash_policy keys must be {sorted(CRASH_POLICY_DEFAULTS)}")
+        _check(crash_policy["restart_on"] in RESTART_ON,
+               f"mode {name} crash_policy restart_on must be one of {RESTART_ON}")
+        _check(int(crash_policy["max_crashes"]) >= 1, f"mode {name} crash_policy max_crashes must be >= 1")
+        endpoint = data.get("endpoint")
+        if endpoint:
+            endpoint = {"start_max": float(endpoint.get("start_max", 5.0)),
+                        "end": float(endpoint.get("end", 0.5)),
+                        "max": float(endpoint.get("max", 20.0))}
+        self._set(name=name,
+                  mi_exe=data["mi_exe"],
+                  mi_folder_path=os.path.join(DATA_PATH, "..", "..", data["mi_folder"]),
+                  start_phrases=tuple("start " + phrase for phrase in phrases),
+                  stop_phrases=tuple(["stop " + phrase for phrase in phrases]
+                                     + ["close " + phrase for phrase in phrases]),
+                  bat_exit="exit_" + name + ".bat",
+                  bat_forced_exit="forced_exit_" + name + ".bat",
+                  endpoint=MappingProxyType(endpoint or {}),
+                  start_timeout=float(data.get("start_timeout", 5.0)),
+                  stop_timeout=float(data.get("stop_timeout", 3.0)),
+                  ready=ready,
+                  duplicate_policy=duplicate_policy,
+                  crash_policy=MappingProxyType(crash_policy))
+
+
+class ConfigSnapshot(_Frozen):
+    """ One validated, immutable version of config.json """
+
+    __slots__ = ("data", "model", "vosk_path", "process_backend", "process_cache_ttl", "process_resync_interval",
+                 "recognition_mode", "process_control", "fast_partials",
+                 "audio_buffer_settings", "vad_settings", "metrics_settings", "tray_settings",
+                 "status_mailbox_path", "control_settings", "input_devices", "device_dedupe_window",
+                 "audio_input_settings", "runtime_settings", "resource_settings", "current_mode", "watched_modes",
+                 "watch_interval", "modes", "_grammars")
+
+    def __init__(self, data: Dict):
+        for key in ("model", "current_mode", "modes"):
+            _check(key in data, f"{key} is missing")
+        _check(isinstance(data["modes"], dict) and data["modes"], "modes must not be empty")
+        modes = {name: ModeSettings(name, mode_data) for name, mode_data in data["modes"].items()}
+        current_mode = data["current_mode"]
+        _check(current_mode in modes, f"current_mode {current_mode} is not in modes")
+        watched_modes = tuple(data.get("watched_modes", [current_mode]))
+        for mode in watched_modes:
+            _check(mode in modes, f"watched mode {mode} is not in modes")
+        process_backend = data.get("process_backend", "auto")
+        _check(process_backend in BACKENDS, f"process_backend must be one of {BACKENDS}")
+        recognition_mode = data.get("recognition_mode", "grammar")
+        _check(recognition_mode in RECOGNITION_MODES, f"recognition_mode must be one of {RECOGNITION_MODES}")
+        process_control = data.get("process_control", "direct")
+        _check(process_control in PROCESS_CONTROLS, f"process_control must be one of {PROCESS_CONTROLS}")
+        input_devices = tuple(data.get("input_devices", []))
+        for device in input_devices:
+            _check(isinstance(device, (int, str)), "input_devices must be device numbers or names")
+        audio_input = dict({"block_ms": 100.0, "resample": True, "max_batch_ms": 400.0},
+                           **data.get("audio_input", {}))
+        _check(audio_input["block_ms"] > 0 and audio_input["max_batch_ms"] > 0,
+               "audio_input block_ms and max_batch_ms must be positive")
+        runtime = dict({"loop": "threads", "tracker_min": 0.25, "tracker_max": 5.0, "backoff": 2.0},
+                       **data.get("runtime", {}))
+        _check(runtime["loop"] in RUNTIMES, f"runtime loop must be one of {RUNTIMES}")
+        _check(0 < runtime["tracker_min"] <= runtime["tracker_max"] and runtime["backoff"] >= 1,
+               "runtime needs 0 < tracker_min <= tracker_max and backoff >= 1")
+        resources = dict(RESOURCE_DEFAULTS, **data.get("resources", {}))
+        _check(resources["action"] in ("flag", "restart"), "resources action must be \"flag\" or \"restart\"")
+        _check(resources["interval"] > 0 and resources["capacity"] > 1,
+               "resources needs a positive interval and a capacity above 1")
+        control = dict({"enabled": False, "address": "auto"}, **data.get("control", {}))
+        _check(isinstance(control["address"], str), "control address must be a path or \"auto\"")
+        status_mailbox = data.get("status_mailbox", "")
+        _check(isinstance(status_mailbox, str), "status_mailbox must be a path, \"auto\" or \"\"")
+        self._set(data=MappingProxyType(data),
+                  model=data["model"],
+                  vosk_path=os.path.join(DATA_PATH, 'models', data["model"]),
+                  process_backend=process_backend,
+                  process_cache_ttl=float(data.get("process_cache_ttl", 0.25)),
+                  process_resync_interval=float(data.get("process_resync_interval", 30.0)),
+                  recognition_mode=recognition_mode,
+                  process_control=process_control,
+                  fast_partials=bool(data.get("fast_partials", False)),
+                  audio_buffer_settings=MappingProxyType(dict(data.get("audio_buffer", {}))),
+                  vad_settings=MappingProxyType(dict(data.get("vad", {"enabled": False}))),
+                  metrics_settings=MappingProxyType(dict(data.get("metrics", {}))),
+                  tray_settings=MappingProxyType(dict(data.get("tray", {}))),
+                  status_mailbox_path=status_mailbox,
+                  control_settings=MappingProxyType(control),
+                  input_devices=input_devices,
+                  audio_input_settings=MappingProxyType(audio_input),
+                  runtime_settings=MappingProxyType(runtime),
+                  resource_settings=MappingProxyType(resources),
+                  device_dedupe_window=float(data.get("device_dedupe_window", 1.0)),
+                  current_mode=current_mode,
+                  watched_modes=watched_modes,
+                  watch_interval=float(data.get("config_watch_interval", 1.0)),
+                  modes=MappingProxyType(modes),
+                  _grammars={}) # modes tuple -> grammar, filled on first use
+
+
+    def grammar(self, modes: Tuple[str, ...]) -> List[str]:
+        grammar = self._grammars.get(modes)
+        if grammar is None:
+            grammar = []
+            for mode in modes:
+                settings = self.modes[mode]
+                for phrase in settings.start_phrases + settings.stop_phrases:
+                    if phrase not in grammar:
+                        grammar.append(phrase)
+            grammar.append("[unk]")
+            self._grammars[modes] = grammar
+        return list(grammar)
+
 
 class Config:
     """ Class to manage the JSON app configurations """
 
     def __init__(self, json_name: str = "config.json"):
         """
-        Passing a "config.json" (json file name)
+        Passing a "config.json" (json file name in data/, or a path)
         """
-        self.json_path = DATA_PATH + "\\" + json_name
+        self.json_path = os.path.join(DATA_PATH, json_name)
         check_paths(self.json_path)
-        self.data = self.set_config_data()
-        print("DATA: ", self.data)
-        self.current_mode = self.data["current_mode"]
-        self.vosk_model_name = self.data["model"]
+        self._file_stamp = self._stat()
+        self.snapshot = ConfigSnapshot(self.set_config_data())
+        print("DATA: ", dict(self.snapshot.data))
+        self._listeners = []
+        self._reload_lock = Lock()
+        self._watch_stop = Event()
+        self._watch_thread = None
+        self.set_mode(self.snapshot.current_mode)
+
+
+    def set_mode(self, mode: str) -> None:
+        """
+        Switches the active MI mode
+        """
+        if mode not in self.snapshot.modes:
+            raise KeyError(f"[MI_Monitor] Mode {mode} - was not found in {self.json_path}")
+        self.current_mode = mode
         print("CURRENT_MODE: ", self.current_mode)
-        self.mode_data = self.data["modes"][self.current_mode]
-        self.mi_exe = self.mode_data["mi_exe"]
 
 
-    def get_mi_exe(self) -> str:
+    def _mode_data(self, mode: Optional[str] = None) -> ModeSettings:
+        """
+        Settings of mode (the current mode if None)
+        """
+        modes = self.snapshot.modes
+        mode = mode or self.current_mode
+        if mode not in modes:
+            raise KeyError(f"[MI_Monitor] Mode {mode} - was not found in {self.json_path}")
+        return modes[mode]
+
+
+    def get_watched_modes(self) -> List[str]:
+        """
+        Modes supervised at the same time,
+        always including the current mode
+        """
+        watched_modes = list(self.snapshot.watched_modes)
+        if self.current_mode not in watched_modes:
+            watched_modes.append(self.current_mode)
+        return watched_modes
+
+
+    def get_mi_exe(self, mode: Optional[str] = None) -> str:
         """
         Returns only MI exe name
         """
-        return self.mi_exe
+        return self._mode_data(mode).mi_exe
 
 
-    def get_trigger_phrases(self, action : str) -> List[str]:
+    def get_trigger_phrases(self, action : str, mode: Optional[str] = None) -> Tuple[str, ...]:
         """
         Returns all allowed start trigger phrases
         """
-        temp_phrases = self.mode_data["trigger_phrases"]
         if action == "start":
-            trigger_phrases = ["start " + phrase for phrase in temp_phrases]
-            return trigger_phrases # start
-        temp_stop = ["stop " + phrase for phrase in temp_phrases]
-        temp_close = ["close " + phrase for phrase in temp_phrases]
-        trigger_phrases = temp_stop + temp_close
-        return trigger_phrases # stop
+            return self._mode_data(mode).start_phrases # start
+        return self._mode_data(mode).stop_phrases # stop
+
+
+    def get_grammar(self, modes: Optional[List[str]] = None) -> List[str]:
+        """
+        Phrase list for a grammar restricted recogniser:
+        all trigger phrases of the modes (the current one if None)
+        and the "[unk]" garbage class
+        """
+        modes = tuple(modes or [self.current_mode])
+        for mode in modes:
+            self._mode_data(mode)
+        return self.snapshot.grammar(modes)
+
+
+    def get_recognition_mode(self) -> str:
+        """
+        "grammar" (trigger phrases only) or "open" (open vocabulary)
+        """
+        return self.snapshot.recognition_mode
+
+
+    def get_fast_partials(self) -> bool:
+        """
+        True if commands fire from partial results
+        """
+        return self.snapshot.fast_partials
+
+
+    def get_endpoint_settings(self, mode: Optional[str] = None) -> Mapping[str, float]:
+        """
+        Endpoint silence delays (seconds) for the current mode:
+        start_max (silence before speech), end (trailing silence), max (utterance)
+        Empty if the model.conf rules should be used.
+        """
+        return self._mode_data(mode).endpoint
+
+
+    def get_audio_buffer_settings(self) -> Mapping:
+        """
+        Audio ring buffer capacity (blocks) and overflow policy
+        """
+        return self.snapshot.audio_buffer_settings
+
+
+    def get_vad_settings(self) -> Mapping:
+        """
+        Voice activity gate settings (see vad.py),
+        "enabled" tells if the gate is used at all
+        """
+        return self.snapshot.vad_settings
+
+
+    def get_metrics_settings(self) -> Mapping:
+        """
+        Metrics export: "port" (local HTTP endpoint, 0 = off),
+        "file" (Prometheus text file, "" = off) and "interval" (seconds)
+        """
+        return self.snapshot.metrics_settings
+
+
+    def get_tray_settings(self) -> Mapping:
+        """
+        Tray icon "backend" ("auto", "pystray" or "null")
+        and "debounce" (minimum seconds between updates)
+        """
+        return self.snapshot.tray_settings
+
+
+    def get_input_devices(self) -> Tuple:
+        """
+        Audio input devices (sounddevice numbers or names) listened to,
+        each with its own recogniser; empty means the default device
+        """
+        return self.snapshot.input_devices
+
+
+    def get_audio_input_settings(self) -> Mapping:
+        """
+        Capture "block_ms" (audio per device block), "resample" (convert
+        to the model's sample rate before decoding) and "max_batch_ms"
+        (most audio decoded in one call while the decoder catches up)
+        """
+        return self.snapshot.audio_input_settings
+
+
+    def get_runtime_settings(self) -> Mapping:
+        """
+        Main loop: "loop" ("threads" or "asyncio", see async_runtime.py)
+        and the asyncio process tracker cadence, "tracker_min" seconds
+        after a command or change, growing by "backoff" up to
+        "tracker_max" while MI is stable
+        """
+        return self.snapshot.runtime_settings
 
 
-    def get_bat_path(self, specification : str) -> str:
+    def get_resource_settings(self) -> Mapping:
+        """
+        MI resource sampling: "enabled" (off by default), "interval" (seconds), "capacity"
+        (samples kept per PID) and the policy (see resource_sampler.py):
+        "hang_seconds", "hang_cpu", "memory_limit_mb", "cpu_limit",
+        "cpu_seconds" (0 turns a check off) and "action" (flag/restart)
+        """
+        return self.snapshot.resource_settings
+
+
+    def get_device_dedupe_window(self) -> float:
+        """
+        Seconds within which the same command from another input
+        device is taken as the same spoken phrase
+        """
+        return self.snapshot.device_dedupe_window
+
+
+    def get_control_settings(self) -> Mapping:
+        """
+        Local control API: "enabled" (off unless turned on) and "address"
+        (socket path or named pipe, "auto" for the default one of
+        control_server.py, resolved there)
+        """
+        return self.snapshot.control_settings
+
+
+    def get_status_mailbox_path(self) -> str:
+        """
+        File the monitor status is published to ("" = off, the default),
+        "auto" for the default one of status_mailbox.py, resolved there
+        """
+        return self.snapshot.status_mailbox_path
+
+
+    def get_process_control(self) -> str:
+        """
+        "direct" (launch/stop the exe by handle) or "bat" (shell + bat files)
+        """
+        return self.snapshot.process_control
+
+
+    def get_start_timeout(self, mode: Optional[str] = None) -> float:
+        """
+        Seconds MI gets to show up (and be ready) after a launch
+        """
+        return self._mode_data(mode).start_timeout
+
+
+    def get_ready_check(self, mode: Optional[str] = None) -> str:
+        """
+        What "MI started" means on top of the process existing:
+        "process" (nothing more), "window" or "port:<number>"
+        """
+        return self._mode_data(mode).ready
+
+
+    def get_stop_timeout(self, mode: Optional[str] = None) -> float:
+        """
+        Seconds MI gets to close gracefully before it is killed
+        """
+        return self._mode_data(mode).stop_timeout
+
+
+    def get_duplicate_policy(self, mode: Optional[str] = None) -> str:
+        """
+        What to do with duplicate MI instances:
+        "restart" (close all, open one), "keep_oldest" or "ignore"
+        """
+        return self._mode_data(mode).duplicate_policy
+
+
+    def get_crash_policy(self, mode: Optional[str] = None) -> Mapping:
+        """
+        Restart on unexpected exit with backoff and a crash-loop breaker.
+        "restart_on": "crash" cannot restart a crashed MI the monitor did
+        not launch outside Windows (its exit code is unknown), use
+        "crash_or_unknown" for that (see restart_policy.py)
+        """
+        return self._mode_data(mode).crash_policy
+
+
+    def get_bat_path(self, specification : str, mode: Optional[str] = None) -> str:
         """
         Returns the requested bat file path
         for the mode
         """
-        prefix = "exit_"
         if specification == "forced":
-            prefix = "forced_exit_"
-        return prefix + self.current_mode + ".bat"
+            return self._mode_data(mode).bat_forced_exit
+        return self._mode_data(mode).bat_exit
 
 
     def get_bat_folder_path(self):
@@ -78,11 +457,11 @@ class Config:
         return os.path.join(DATA_PATH, "bats")
 
 
-    def get_mi_folder_path(self) -> str:
+    def get_mi_folder_path(self, mode: Optional[str] = None) -> str:
         """
         Returns MI exe folder path
         """
-        return os.path.join(DATA_PATH, "..", "..", self.mode_data["mi_folder"])
+        return self._mode_data(mode).mi_folder_path
 
 
     def set_config_data(self) -> Dict[str, str]:
@@ -94,15 +473,116 @@ class Config:
         return data
 
 
-    def get_file_data(self) -> Dict[str, str]:
+    def get_file_data(self) -> Mapping[str, str]:
         """
         Grabs the whole dict from JSON file
         """
-        return self.data
+        return self.snapshot.data
+
+
+    def get_process_backend(self) -> str:
+        """
+        Process table backend name (see process_source.py)
+        """
+        return self.snapshot.process_backend
+
+
+    def get_process_cache_ttl(self) -> float:
+        """
+        How long (seconds) a process table snapshot is shared
+        """
+        return self.snapshot.process_cache_ttl
+
+
+    def get_process_resync_interval(self) -> float:
+        """
+        Seconds between full process table reads (incremental index)
+        """
+        return self.snapshot.process_resync_interval
 
 
     def get_vosk_path(self) -> str:
         """
         Vosk Path
         """
-        return os.path.join(DATA_PATH, 'models', self.vosk_model_name)
+        return self.snapshot.vosk_path
+
+
+    def get_watch_interval(self) -> float:
+        """
+        Seconds between config.json change checks, 0 turns hot reload off
+        """
+        return self.snapshot.watch_interval
+
+
+    #######################################################################
+
+
+    def add_listener(self, callback: Callable[[ConfigSnapshot, ConfigSnapshot], None]) -> None:
+        """
+        callback(old, new) is called after every successful reload
+        """
+        self._listeners.append(callback)
+
+
+    def _stat(self) -> Tuple[int, int]:
+        try:
+            stat = os.stat(self.json_path)
+        except OSError:
+            return (0, 0)
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+    def reload(self) -> bool:
+        """
+        Re-reads config.json and swaps the new snapshot in.
+        Returns False (keeping the running config) if the file is invalid.
+        """
+        with self._reload_lock:
+            self._file_stamp = self._stat()
+            try:
+                new = ConfigSnapshot(self.set_config_data())
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"[MI_Monitor] config reload failed, keeping the running config: {e}")
+                return False
+            old = self.snapshot
+            current_mode = self.current_mode
+            if new.current_mode != old.current_mode or current_mode not in new.modes:
+                current_mode = new.current_mode # the file switched modes
+            self.snapshot = new
+            self.current_mode = current_mode
+        changed = [key for key in RESTART_KEYS if old.data.get(key) != new.data.get(key)]
+        if changed:
+            print(f"[MI_Monitor] config {', '.join(changed)} changed, restart MIMonitor to apply")
+        for callback in list(self._listeners):
+            try:
+                callback(old, new)
+            except Exception as e:
+                print(f"[MI_Monitor] config listener error: {e}")
+        return True
+
+
+    def watch(self, interval: Optional[float] = None) -> None:
+        """
+        Starts reloading config.json whenever its mtime or size changes
+        """
+        interval = self.get_watch_interval() if interval is None else interval
+        if interval <= 0 or self._watch_thread is not None:
+            return
+        self._watch_stop.clear()
+        self._watch_thread = Thread(target=self._watch, args=(interval,), daemon=True,
+                                    name="MIMonitor Config Watcher")
+        self._watch_thread.start()
+
+
+    def _watch(self, interval: float) -> None:
+        while not self._watch_stop.wait(interval):
+            if self._stat() != self._file_stamp:
+                self.reload()
+
+
+    def stop_watching(self) -> None:
+        self._watch_stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join()
+            self._watch_thread = None
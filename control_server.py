@@ -0,0 +1,391 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Local control API: start/stop/restart MI, switch modes and read the
+status without speaking a phrase (management scripts, load tests).
+
+ControlServer runs an asyncio loop on its own thread and listens on a
+Unix domain socket (a named pipe on Windows). Commands go through the
+same MIMonitor methods (and so the same per-mode supervisor queues) as
+voice commands.
+
+The API is off unless config.json turns it on ("control": {"enabled": true}).
+Who can connect then:
+- Unix socket: this user only (mode 0600, set before the socket appears
+  at its address) and only from this machine
+- named pipe: Windows' default pipe security, i.e. this user, SYSTEM and
+  administrators can send commands (everyone else may only open it for
+  reading). asyncio cannot make the pipe reject remote clients, so this
+  user (or an administrator) can also connect from another machine over
+  the network: only turn it on where that is acceptable.
+
+Protocol: one JSON object per line each way.
+    request   {"id": 1, "cmd": "start", "mode": "facenav", "wait": true}
+    response  {"id": 1, "ok": true, "result": {...}}
+              {"id": 1, "ok": false, "error": "..."}
+cmd is ping, start, stop, restart (mode optional, the current one by
+default; wait=false answers once the command is queued), mode (switch
+the current mode to "mode") or status.
+Clients may pipeline: send many requests without waiting, the answers
+come back in request order (id is echoed), while the commands run
+concurrently on their supervisors. Any number of clients can be
+connected at once.
+
+From the command line:
+    python control_server.py status
+    python control_server.py start facenav [--no-wait]
+'''
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+from concurrent.futures import Future
+from threading import Thread
+from typing import Dict, List, Optional
+
+if sys.platform == "win32":
+    DEFAULT_ADDRESS = r"\\.\pipe\mi_monitor_control"
+else:
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), "mi_monitor_control.sock")
+COMMANDS = ("ping", "start", "stop", "restart", "mode", "status")
+MAX_PIPELINED = 256 # unanswered requests per client before reading pauses
+MAX_LINE = 64 * 1024
+
+
+def _encode(message: Dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class ControlServer:
+    """ asyncio server for the control API, on its own thread """
+
+    def __init__(self, monitor, address: str = DEFAULT_ADDRESS):
+        """
+        monitor - the MIMonitor commands are run on
+        address - socket path (named pipe name on Windows), "auto" is DEFAULT_ADDRESS
+        """
+        self._monitor = monitor
+        self.address = DEFAULT_ADDRESS if address == "auto" else address
+        self._loop = None
+        self._servers = []
+        self._clients = set()
+        self._thread = None
+        self.requests = 0 # requests answered
+
+
+    def start(self) -> None:
+        """
+        Starts listening, returns once the server is ready
+        """
+        ready = Future()
+        self._thread = Thread(target=self._serve, args=(ready,), daemon=True, name="MIMonitor Control Server")
+        self._thread.start()
+        ready.result() # raises what _listen() raised
+        print(f"Control API listening on {self.address}")
+
+
+    def _serve(self, ready: Future) -> None:
+        """
+        Server thread: its own loop, created and run here only, so the
+        caller may itself be running a loop (the asyncio runtime)
+        """
+        loop = asyncio.new_event_loop() # a proactor loop on Windows (named pipes)
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        try:
+            loop.run_until_complete(self._listen())
+        except BaseException as e:
+            self._loop = None
+            loop.close()
+            ready.set_exception(e)
+            return
+        ready.set_result(None)
+        loop.run_forever()
+
+
+    async def _listen(self) -> None:
+        if sys.platform == "win32":
+            factory = lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader(limit=MAX_LINE),
+                                                           self._serve_client)
+            self._servers = await self._loop.start_serving_pipe(factory, self.address)
+            return
+        self._remove_stale_socket()
+        server = await asyncio.start_unix_server(self._serve_client, sock=self._bind_private(), limit=MAX_LINE)
+        self._servers = [server]
+
+
+    def _bind_private(self) -> socket.socket:
+        """
+        Binds the socket in a directory only this user can enter, makes it
+        0600 and only then links it to the address, so it is never
+        reachable with looser permissions
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        private = tempfile.mkdtemp(dir=os.path.dirname(self.address) or None) # 0700
+        staging = os.path.join(private, "control.sock")
+        try:
+            sock.bind(staging)
+            os.chmod(staging, 0o600) # this user only
+            os.link(staging, self.address) # fails if another monitor took the address meanwhile
+        except BaseException:
+            sock.close()
+            raise
+        finally:
+            if os.path.exists(staging):
+                os.unlink(staging)
+            os.rmdir(private)
+        return sock
+
+
+    def _remove_stale_socket(self) -> None:
+        """
+        Removes a socket file left by a monitor that did not stop cleanly,
+        refuses to take over one that still answers
+        """
+        if not os.path.exists(self.address):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.address)
+        except OSError:
+            os.unlink(self.address)
+        else:
+            raise RuntimeError(f"[MI_Monitor] {self.address} - another monitor is already listening")
+        finally:
+            probe.close()
+
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Reads requests and starts each one right away; a second task
+        writes the answers back in request order
+        """
+        self._clients.add(writer)
+        pending = asyncio.Queue(MAX_PIPELINED)
+        answering = asyncio.ensure_future(self._answer(pending, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError: # longer than MAX_LINE
+                    await pending.put(self._error(None, "request too long"))
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    await pending.put(asyncio.ensure_future(self._handle(line)))
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            await pending.put(None)
+            try:
+                await answering
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+            self._clients.discard(writer)
+            writer.close()
+
+
+    async def _answer(self, pending: asyncio.Queue, writer: asyncio.StreamWriter) -> None:
+        while True:
+            answer = await pending.get()
+            if answer is None:
+                return
+            if isinstance(answer, asyncio.Future):
+                answer = await answer
+            writer.write(_encode(answer))
+            self.requests += 1
+            if pending.empty():
+                await writer.drain() # one flush per burst of answers
+
+
+    async def _handle(self, line: bytes) -> Dict:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return self._error(None, "invalid JSON")
+        if not isinstance(request, dict):
+            return self._error(None, "request must be a JSON object")
+        request_id = request.get("id")
+        command = request.get("cmd")
+        if command not in COMMANDS:
+            return self._error(request_id, f"unknown cmd {command!r}, use one of {COMMANDS}")
+        try:
+            result = await getattr(self, "_cmd_" + command)(request)
+        except Exception as e:
+            return self._error(request_id, str(e) or type(e).__name__)
+        return {"id": request_id, "ok": True, "result": result}
+
+
+    @staticmethod
+    def _error(request_id, text: str) -> Dict:
+        return {"id": request_id, "ok": False, "error": text}
+
+
+    async def _cmd_ping(self, request: Dict) -> str:
+        return "pong"
+
+
+    async def _cmd_start(self, request: Dict) -> Dict:
+        return await self._run_command(self._monitor.do_on_start_phrase, request)
+
+
+    async def _cmd_stop(self, request: Dict) -> Dict:
+        return await self._run_command(self._monitor.do_on_stop_phrase, request)
+
+
+    async def _cmd_restart(self, request: Dict) -> Dict:
+        return await self._run_command(self._monitor.do_on_restart_phrase, request)
+
+
+    async def _run_command(self, do_command, request: Dict) -> Dict:
+        """
+        Queues the command like a voice command does and (unless
+        wait is false) answers once the supervisor has run it
+        """
+        mode = request.get("mode")
+        if mode is not None and mode not in self._monitor.supervised_modes():
+            raise ValueError(f"mode {mode} is not watched")
+        ticket = do_command(mode, wait=False)
+        if request.get("wait", True):
+            done = self._loop.create_future()
+            ticket.add_done_callback(lambda t: self._loop.call_soon_threadsafe(_set_done, done))
+            await done
+            if ticket.error is not None:
+                raise ticket.error
+        mode = mode or self._monitor.current_mode()
+        return {"mode": mode, "state": self._monitor.state(mode),
+                "done": ticket.done(), "coalesced": ticket.coalesced}
+
+
+    async def _cmd_mode(self, request: Dict) -> Dict:
+        mode = request.get("mode")
+        if not mode:
+            raise ValueError("mode is missing")
+        # rebuilds the phrase matcher and recogniser, off the event loop
+        await self._loop.run_in_executor(None, self._monitor.set_mode, mode)
+        return {"mode": self._monitor.current_mode()}
+
+
+    async def _cmd_status(self, request: Dict) -> Dict:
+        return self._monitor.status()
+
+
+    def stop(self) -> None:
+        """
+        Stops listening and disconnects the clients
+        """
+        if self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._close(), self._loop)
+        try:
+            future.result(2.0)
+        except Exception as e:
+            print(f"[MI_Monitor] control server did not close cleanly: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(2.0)
+        self._loop.close()
+        self._loop = None
+        if sys.platform != "win32" and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+    async def _close(self) -> None:
+        for server in self._servers:
+            server.close()
+        for writer in list(self._clients):
+            writer.close()
+
+
+def _set_done(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ControlClient:
+    """ Blocking client for the control API """
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, timeout: Optional[float] = 60.0):
+        self.address = address
+        self._next_id = 0
+        if sys.platform == "win32":
+            pipe = open(address, "r+b", buffering=0)
+            self._reader = io.BufferedReader(pipe)
+            self._send = pipe.write
+            self._close = pipe.close
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect(address)
+            self._reader = sock.makefile("rb")
+            self._send = sock.sendall
+            self._close = sock.close
+
+
+    def request(self, cmd: str, **args):
+        """
+        Runs one command, returns its result, raises RuntimeError
+        if the monitor answered with an error
+        """
+        answer = self.pipeline([dict(args, cmd=cmd)])[0]
+        if not answer["ok"]:
+            raise RuntimeError(f"[MI_Monitor] {cmd} failed: {answer['error']}")
+        return answer["result"]
+
+
+    def pipeline(self, requests: List[Dict]) -> List[Dict]:
+        """
+        Sends all requests at once, then reads all the answers
+        (in request order, errors are returned, not raised)
+        """
+        batch = []
+        for request in requests:
+            self._next_id += 1
+            batch.append(_encode(dict(request, id=self._next_id)))
+        self._send(b"".join(batch))
+        answers = []
+        for _ in requests:
+            line = self._reader.readline()
+            if not line:
+                raise ConnectionError(f"[MI_Monitor] {self.address} - connection closed by the monitor")
+            answers.append(json.loads(line))
+        return answers
+
+
+    def close(self) -> None:
+        self._reader.close()
+        self._close()
+
+
+    def __enter__(self) -> "ControlClient":
+        return self
+
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Control a running MIMonitor")
+    parser.add_argument("cmd", choices=COMMANDS)
+    parser.add_argument("mode", nargs="?", help="Mode (the current one if not given)")
+    parser.add_argument("--no-wait", action="store_true", help="Return once the command is queued")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Control socket / named pipe")
+    args = parser.parse_args()
+    request = {"wait": not args.no_wait}
+    if args.mode:
+        request["mode"] = args.mode
+    try:
+        with ControlClient(args.address) as client:
+            print(json.dumps(client.request(args.cmd, **request), indent=2))
+    except (OSError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+A separate thread to
+show/change/hide Windows system tray icon.
+
+It keeps an icon in Windows system tray,
+which switches between red when MI app is closed
+and green when MI app is running.
+Hovering over the icon show text 'UCL MotionInput - ON/OFF'
+The menu shows the same text and a Quit item.
+
+One pystray Icon lives for the whole run (its loop runs on this
+thread); a colour change only swaps its image and title in place.
+Both images are loaded from disk once and shared by all icons.
+Changes are debounced: at most one UI update per debounce seconds,
+always ending on the latest state, so a flapping MI does not churn
+the tray.
+
+backend "null" (or "auto" without pystray/PIL/a display) keeps the
+same API without a tray, e.g. headless on Linux and in tests.
+'''
+import os
+import sys
+import time
+from threading import Event, Lock, Thread, Timer
+from typing import Callable, Dict, Optional
+
+try:
+    from PIL import Image
+    from pystray import Icon, Menu, MenuItem as item
+except Exception: # not installed, or no display to connect to
+    Image = Icon = Menu = item = None
+
+# Adjustable global variables
+RED_ICON = 'data//assets//red.ico'
+GREEN_ICON = 'data//assets//green.ico'
+TRAY_ICON_NAME = 'UCL MotionInput'
+BACKENDS = ("auto", "pystray", "null")
+
+_images = {}
+_images_lock = Lock()
+
+
+def _load_images() -> Dict[bool, object]:
+    """
+    Red (False) and green (True) images, read from disk once per process
+    """
+    with _images_lock:
+        if not _images:
+            for flag, path in ((False, RED_ICON), (True, GREEN_ICON)):
+                with Image.open(path) as image:
+                    image.load()
+                    _images[flag] = image.copy()
+        return _images
+
+
+def _has_display() -> bool:
+    if sys.platform in ("win32", "darwin"):
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+class NullIcon:
+    """ pystray.Icon stand-in without a tray, records what would be shown """
+
+    def __init__(self, name: str, icon=None, title: str = "", menu=None):
+        self.name = name
+        self.icon = icon
+        self.title = title
+        self.menu = menu
+        self.visible = False
+        self._stopped = Event()
+
+
+    def run(self, setup: Optional[Callable] = None) -> None:
+        self.visible = True
+        if setup is not None:
+            setup(self)
+        self._stopped.wait()
+        self.visible = False
+
+
+    def update_menu(self) -> None:
+        pass
+
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class IconManager(Thread):
+    """ System Tray Icon Manager """
+
+    def __init__(self, tray_name: str = TRAY_ICON_NAME, backend: str = "auto",
+                 debounce: float = 0.2, on_quit: Optional[Callable[[], None]] = None):
+        """
+        tray_name - text shown before ON/OFF (one icon per supervised mode)
+        backend - "pystray", "null" (no tray) or "auto"
+        debounce - minimum seconds between two UI updates
+        on_quit - called after Quit was clicked in the menu
+        """
+        super().__init__()
+        self.name = "Icon Manager Thread"
+        self.tray_name = tray_name
+        self.daemon = True
+        if backend not in BACKENDS:
+            raise ValueError(f"[MI_Monitor] Unknown tray backend '{backend}', use one of {BACKENDS}")
+        if backend == "auto":
+            backend = "pystray" if Icon is not None and _has_display() else "null"
+        if backend == "pystray" and Icon is None:
+            raise ImportError("[MI_Monitor] pystray and Pillow are needed for the tray icon")
+        self.backend = backend
+        self._debounce = debounce
+        self._on_quit = on_quit
+        self._is_running = False
+        self._lock = Lock()
+        self._timer = None
+        self._last_update = 0.0
+        self.icon_flag = False # Red Icon
+        self.status_text = "" # extra state shown after ON/OFF, e.g. "voice loading"
+        self.icon_title = self._title()
+        self.current_icon = RED_ICON
+        self.requests = 0 # colour/status changes asked for
+        self.updates = 0 # changes that reached the tray
+        self._shown = (self.icon_flag, self.icon_title)
+        self.icon = self._create_icon()
+        self.start()
+
+
+    def _create_icon(self):
+        """
+        The one Icon used for the whole run
+        """
+        if self.backend == "null":
+            return NullIcon(self.tray_name, RED_ICON, self.icon_title)
+        menu = Menu(item(lambda _: self.icon_title, None, enabled=False),
+                    item('Quit', self._quit))
+        return Icon(self.tray_name, _load_images()[False], self.icon_title, menu)
+
+
+    def run(self) -> None:
+        """
+        Runs the tray loop until stop_icon()
+        """
+        self._is_running = True
+        try:
+            self.icon.run(self._setup)
+        finally:
+            self._is_running = False
+
+
+    def _setup(self, icon) -> None:
+        icon.visible = True
+        self._apply() # anything requested before the loop started
+
+
+    def _title(self) -> str:
+        title = self.tray_name + (" - ON" if self.icon_flag else " - OFF")
+        if self.status_text:
+            title += " (" + self.status_text + ")"
+        return title
+
+
+    def _request_update(self) -> None:
+        """
+        Applies the change now, or once debounce seconds passed
+        since the last update (later changes just replace it)
+        """
+        with self._lock:
+            self.requests += 1
+            self.icon_title = self._title()
+            if self._timer is not None:
+                return # an update is already scheduled, it will show the latest state
+            wait = self._last_update + self._debounce - time.monotonic()
+            if wait > 0:
+                self._timer = Timer(wait, self._apply)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self._apply()
+
+
+    def _apply(self) -> None:
+        """
+        One in-place image/title swap
+        """
+        with self._lock:
+            self._timer = None
+            self._last_update = time.monotonic()
+            shown = (self.icon_flag, self.icon_title)
+            if shown == self._shown:
+                return
+            self._shown = shown
+            self.current_icon = GREEN_ICON if self.icon_flag else RED_ICON
+            self.updates += 1
+        if self.backend == "null":
+            self.icon.icon = self.current_icon
+        else:
+            self.icon.icon = _load_images()[shown[0]]
+        self.icon.title = shown[1]
+        self.icon.update_menu()
+        print("Green Icon" if shown[0] else "Red Icon")
+
+
+    def green_icon_set(self) -> None:
+        """
+        Trigger Icon change to Green
+        """
+        self.icon_flag = True
+        self._request_update()
+
+
+    def red_icon_set(self) -> None:
+        """
+        Trigger Icon change to Red
+        """
+        self.icon_flag = False
+        self._request_update()
+
+
+    def set_status(self, text: str) -> None:
+        """
+        Shows extra state (e.g. "voice loading") in the icon title
+        """
+        self.status_text = text
+        self._request_update()
+
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Requested vs applied tray updates
+        """
+        return {"requests": self.requests, "updates": self.updates}
+
+
+    def _quit(self, *args) -> None:
+        self.stop_icon()
+        if self._on_quit is not None:
+            self._on_quit()
+
+
+    def stop_icon(self) -> None:
+        """
+        Removes the icon and ends the tray loop
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.icon.visible = False
+        self.icon.stop()
+
+
+    def is_running(self) -> bool:
+        """
+        Returns True is the IconManager is running
+        """
+        return self._is_running
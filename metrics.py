@@ -0,0 +1,290 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Lightweight metrics for MIMonitor's hot paths.
+
+Counters, gauges and fixed bucket histograms kept in one registry
+(REGISTRY) and exported in the Prometheus text format, either from a
+local HTTP endpoint (start_http_server) or by rewriting a file every
+few seconds (FileExporter), see "metrics" in config.json.
+
+Recording is a lock, an add and (for histograms) a bisect, so it can
+stay on in production. Values that already exist elsewhere (audio
+buffer depth, cache hits) are read only when the metrics are rendered,
+via set_function().
+'''
+import os
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """ One time series (a name and a set of labels) """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, labels: Tuple[Tuple[str, str], ...]):
+        self.name = name
+        self.labels = labels
+        self._lock = Lock()
+        self._function = None
+
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Reads the value from function() at render time instead
+        """
+        self._function = function
+
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """ Monotonically increasing value """
+
+    kind = "counter"
+
+    def __init__(self, name: str, labels: Tuple[Tuple[str, str], ...]):
+        super().__init__(name, labels)
+        self._value = 0
+
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+
+    def value(self) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+
+    def samples(self):
+        yield self.name, self.labels, "", self.value()
+
+
+class Gauge(Counter):
+    """ Value that can go up and down """
+
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+
+class Histogram(_Metric):
+    """ Fixed bucket histogram (bucket upper bounds in seconds by default) """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, labels: Tuple[Tuple[str, str], ...], buckets: Tuple[float, ...]):
+        super().__init__(name, labels)
+        self._bounds = tuple(sorted(buckets))
+        self._counts = [0] * (len(self._bounds) + 1) # last one is +Inf
+        self._sum = 0.0
+        self._count = 0
+
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+
+    def time(self) -> "_Timer":
+        """
+        Context manager observing the duration of the wrapped block
+        """
+        return _Timer(self)
+
+
+    def snapshot(self) -> Tuple[list, float, int]:
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+
+    def samples(self):
+        counts, total, count = self.snapshot()
+        cumulative = 0
+        for bound, bucket_count in zip(self._bounds + (float("inf"),), counts):
+            cumulative += bucket_count
+            yield self.name + "_bucket", self.labels, f'le="{_format_value(bound)}"', cumulative
+        yield self.name + "_sum", self.labels, "", total
+        yield self.name + "_count", self.labels, "", count
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started)
+        return False
+
+
+class MetricsRegistry:
+    """ All metrics of the process, rendered in Prometheus text format """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._metrics = {} # (name, labels) -> metric
+        self._help = {} # name -> (kind, help text)
+
+
+    def _get(self, cls, name: str, help_text: str, labels: Optional[Dict[str, str]], *args):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                if name in self._help and self._help[name][0] != cls.kind:
+                    raise ValueError(f"[MI_Monitor] Metric {name} - already registered as {self._help[name][0]}")
+                metric = cls(name, key[1], *args)
+                self._metrics[key] = metric
+                self._help.setdefault(name, (cls.kind, help_text))
+            return metric
+
+
+    def counter(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+
+    def gauge(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Gauge:
+        return self._get(Gauge, name, help_text, labels)
+
+
+    def histogram(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None,
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, labels, buckets)
+
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: (metric.name, metric.labels))
+            help_texts = dict(self._help)
+        lines = []
+        last_name = None
+        for metric in metrics:
+            if metric.name != last_name:
+                kind, help_text = help_texts[metric.name]
+                lines.append(f"# HELP {metric.name} {help_text}")
+                lines.append(f"# TYPE {metric.name} {kind}")
+                last_name = metric.name
+            try:
+                samples = list(metric.samples())
+            except Exception as e: # a value function failed, skip this series
+                print(f"[MI_Monitor] metric {metric.name} could not be read: {e}")
+                continue
+            for name, labels, extra, value in samples:
+                lines.append(f"{name}{_format_labels(labels, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def start_http_server(port: int, host: str = "127.0.0.1",
+                      registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Serves registry.render() on http://host:port/metrics from a daemon thread,
+    call shutdown() on the returned server to stop it
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # no print per scrape
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True, name="MIMonitor Metrics Server").start()
+    return server
+
+
+class FileExporter:
+    """ Rewrites a Prometheus text file every interval seconds """
+
+    def __init__(self, path: str, interval: float = 10.0, registry: MetricsRegistry = REGISTRY):
+        self._path = path
+        self._interval = interval
+        self._registry = registry
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, daemon=True, name="MIMonitor Metrics File")
+
+
+    def start(self) -> None:
+        self._thread.start()
+
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._interval):
+            self.write()
+
+
+    def write(self) -> None:
+        """
+        Writes the metrics now (to a temporary file first,
+        so readers never see a half written file)
+        """
+        temp_path = self._path + ".tmp"
+        try:
+            with open(temp_path, "w") as f:
+                f.write(self._registry.render())
+            os.replace(temp_path, self._path)
+        except OSError as e:
+            print(f"[MI_Monitor] metrics file {self._path} could not be written: {e}")
+
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.write()
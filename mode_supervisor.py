@@ -0,0 +1,680 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Supervision of the MI instances of one mode.
+
+MIMonitor can watch several modes at once (config "watched_modes"),
+e.g. facenav and multitouch. Each mode gets a ModeSupervisor holding
+everything that used to be per-monitor: its MI exe, ProcessController,
+timeouts and tray icon.
+
+Each supervisor is an actor: start/stop/restart/deduplicate/reconfigure
+are submitted to its command queue and run one at a time on its own
+thread, so no locks are needed and the voice loop never waits for a
+process scan or for MI to start. submit() returns a CommandTicket that
+can be waited on. A command equal to the one already queued last, or
+to the one running with nothing queued behind it, is coalesced into it
+(e.g. "start motion" said twice, or a second duplicate check).
+The state (stopped/starting/running/stopping/deduplicating) is a plain
+attribute, readable at any time without blocking. on_change (if set) is
+called after every command, exit and state change, e.g. to publish the
+status (see status_mailbox.py).
+
+The recogniser, the process source and the snapshot cache are shared
+by all supervisors (MIMonitor does one scan per tracker cycle for all
+watched exes and hands each supervisor its own instances).
+
+duplicate_policy (per mode) decides what happens to duplicate instances:
+- "restart"     - close all, open one (the original behaviour)
+- "keep_oldest" - close all but the one started first
+- "ignore"      - leave them running
+
+reconfigure() re-reads the mode's settings after a config reload.
+
+Every MI instance seen is watched by the ProcessController, so an exit
+is known immediately. An exit the supervisor did not ask for is handled
+by the mode's crash_policy (see restart_policy.py): MI is started again
+after a backoff delay ("recover" command) unless the crash-loop breaker
+is open. A manual "start" closes the breaker, a "stop" cancels a pending
+restart. Recovery time (exit to MI confirmed running) is a metric.
+'''
+from collections import deque
+from subprocess import Popen
+from threading import Condition, Event, Lock, Thread, Timer
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+from metrics import REGISTRY
+from process_cache import ProcessSnapshotCache
+from process_controller import ProcessController
+from restart_policy import RestartPolicy
+from waiter import port_ready, wait_for, window_ready
+
+LOOKUP_SECONDS = REGISTRY.histogram("mimonitor_process_lookup_seconds",
+                                    "MI instance lookups (cached or scanning)")
+
+STOPPED = "stopped"
+STARTING = "starting"
+RUNNING = "running"
+STOPPING = "stopping"
+DEDUPLICATING = "deduplicating"
+COMMANDS = ("start", "stop", "restart", "deduplicate", "reconfigure", "recover")
+
+
+class CommandTicket:
+    """ A submitted command, set once the supervisor has run it """
+
+    def __init__(self, command: str):
+        self.command = command
+        self.submitted = time.perf_counter()
+        self.coalesced = 0 # identical commands merged into this one
+        self.error = None
+        self._done = Event()
+        self._callbacks = []
+        self._callbacks_lock = Lock()
+
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits for the command to finish, False on timeout
+        """
+        return self._done.wait(timeout)
+
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+
+    def add_done_callback(self, callback: Callable[["CommandTicket"], None]) -> None:
+        """
+        Calls callback(ticket) once the command finished (right away if
+        it already has), on the supervisor thread, so it must be quick
+        """
+        with self._callbacks_lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+
+    def _finish(self) -> None:
+        with self._callbacks_lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"[MI_Monitor] {self.command} callback error: {e}")
+
+
+    def result(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits for the command and raises its error, if any
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"[MI_Monitor] {self.command} did not finish in {timeout} s")
+        if self.error is not None:
+            raise self.error
+
+
+class ModeSupervisor:
+    """ Starts, stops and de-duplicates the MI instances of one mode """
+
+    def __init__(self, mode: str, config: Config, process_cache: ProcessSnapshotCache,
+                 icon_manager):
+        self.mode = mode
+        self._config = config
+        self._process_cache = process_cache
+        self.icon_manager = icon_manager
+        self.mi_exe = None
+        self._mi_folder_path = None
+        self.process_controller = None
+        self._crash_policy_settings = None
+        self._restart_timer = None
+        self._crashed_at = None # monotonic time of the crash being recovered from
+        self.reconfigure()
+        self.process_event = Event() # set on exec/exit events of this mode's exe
+        self._command_timings = deque(maxlen=100)
+        self._last_MI_check = False # Starts at False since the icon is initially set to red; True == green icon
+        self.on_change = None # Optional[Callable[[], None]]
+        self._state = STOPPED
+        self.state_since = time.time()
+        self.pids = [] # MI instances last seen
+        self.last_command = ""
+        self.last_command_ok = None # None until a command ran
+        self.last_command_at = 0.0
+        self.counters = {"commands": 0, "launches": 0, "kills": 0,
+                         "crashes": 0, "recoveries": 0, "duplicates_closed": 0}
+        # Command queue (actor)
+        self._queue = deque() # CommandTickets waiting
+        self._queue_changed = Condition()
+        self._current = None # CommandTicket running now
+        self._closed = False
+        self._queue_seconds = REGISTRY.histogram("mimonitor_command_queue_seconds",
+                                                 "Time commands waited in the queue", {"mode": mode})
+        self._thread = Thread(target=self._run_commands, daemon=True,
+                              name=f"MIMonitor {mode} Supervisor")
+        self._thread.start()
+
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+
+    @state.setter
+    def state(self, state: str) -> None:
+        if state != self._state:
+            self._state = state
+            self.state_since = time.time()
+            self._changed()
+
+
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"[MI_Monitor] {self.mode} on_change error: {e}")
+
+
+    def submit(self, command: str) -> CommandTicket:
+        """
+        Queues a command (see COMMANDS) without waiting for it
+        """
+        if command not in COMMANDS:
+            raise ValueError(f"[MI_Monitor] Unknown command {command}, use one of {COMMANDS}")
+        with self._queue_changed:
+            if self._closed:
+                raise RuntimeError(f"[MI_Monitor] Supervisor {self.mode} is closed")
+            ticket = self._coalesce_with(command)
+            if ticket is not None:
+                ticket.coalesced += 1
+                REGISTRY.counter("mimonitor_commands_coalesced_total", "Commands merged into an identical one",
+                                 {"mode": self.mode, "command": command}).inc()
+                return ticket
+            ticket = CommandTicket(command)
+            self._queue.append(ticket)
+            self._queue_changed.notify()
+            return ticket
+
+
+    def _coalesce_with(self, command: str) -> Optional[CommandTicket]:
+        """
+        The queued or running ticket an identical command can join
+        """
+        if self._queue:
+            if self._queue[-1].command == command:
+                return self._queue[-1]
+            if command == "deduplicate":
+                return next((t for t in self._queue if t.command == command), None)
+            return None
+        # reconfigure must re-read a config that may have changed since
+        if self._current is not None and self._current.command == command and command != "reconfigure":
+            return self._current
+        return None
+
+
+    def _run_commands(self) -> None:
+        """
+        Actor loop, runs the queued commands one by one
+        """
+        run_command = {"start": self._manual_start, "stop": self._manual_stop, "restart": self.restart,
+                       "deduplicate": self.deduplicate, "reconfigure": self.reconfigure,
+                       "recover": self.recover}
+        while True:
+            with self._queue_changed:
+                while not self._queue and not self._closed:
+                    self._queue_changed.wait()
+                if not self._queue:
+                    return # closed and drained
+                ticket = self._current = self._queue.popleft()
+            self._queue_seconds.observe(time.perf_counter() - ticket.submitted)
+            previous_state = self.state
+            try:
+                try:
+                    run_command[ticket.command]()
+                except Exception as e:
+                    print(f"[MI_Monitor] {self.mode} {ticket.command} failed: {e}")
+                    ticket.error = e
+                    self._recover_state(previous_state)
+                self.counters["commands"] += 1
+                self.last_command = ticket.command
+                self.last_command_ok = ticket.error is None
+                self.last_command_at = time.time()
+                self._changed()
+                # submitted -> MI confirmed started/stopped
+                REGISTRY.histogram("mimonitor_command_seconds", "Command latency, submitted to MI confirmed",
+                                   {"mode": self.mode, "action": ticket.command}
+                                   ).observe(time.perf_counter() - ticket.submitted)
+            finally:
+                # always completes the ticket, or wait=True callers would hang
+                with self._queue_changed:
+                    self._current = None
+                    ticket._finish()
+
+
+    def _recover_state(self, previous_state: str) -> None:
+        """
+        State after a failed command, from the process table;
+        the state before the command if that cannot be read either
+        """
+        try:
+            self.state = RUNNING if self.MI_process_info() else STOPPED
+        except Exception as e:
+            print(f"[MI_Monitor] {self.mode} state unknown, keeping {previous_state}: {e}")
+            self.state = previous_state
+
+
+    def is_idle(self) -> bool:
+        """
+        True if no command is running or queued
+        """
+        return self._current is None and not self._queue
+
+
+    def observe(self, MI_instances: List[Dict], icon_on: Optional[bool] = None) -> None:
+        """
+        Tracker update: new instances get an exit watch, state and icon
+        follow the process table while no command is running.
+        icon_on overrides the icon colour (an icon shared by several modes)
+        """
+        self._watch_instances(MI_instances)
+        self.pids = [process["ProcessId"] for process in MI_instances]
+        if not self.is_idle():
+            return
+        self.state = RUNNING if MI_instances else STOPPED
+        self.set_icon(bool(MI_instances) if icon_on is None else icon_on) # green if running, red if not
+
+
+    def close(self, timeout: Optional[float] = 1.0) -> None:
+        """
+        Stops the actor, dropping queued commands;
+        waits up to timeout for the running one
+        """
+        self._cancel_recovery()
+        with self._queue_changed:
+            self._closed = True
+            while self._queue:
+                ticket = self._queue.popleft()
+                ticket.error = RuntimeError(f"[MI_Monitor] Supervisor {self.mode} closed before {ticket.command} ran")
+                ticket._finish()
+            self._queue_changed.notify()
+        self._thread.join(timeout)
+
+
+    def reconfigure(self) -> None:
+        """
+        (Re)reads this mode's settings from the config,
+        submit("reconfigure") once the supervisor is running
+        """
+        config, mode = self._config, self.mode
+        mi_exe = config.get_mi_exe(mode)
+        mi_folder_path = config.get_mi_folder_path(mode)
+        self._bat_exit = config.get_bat_path("exit", mode) # /im
+        self._bat_forced_exit = config.get_bat_path("forced", mode) # /f
+        self._bat_folder_path = config.get_bat_folder_path()
+        self._process_control = config.get_process_control()
+        self._start_timeout = config.get_start_timeout(mode)
+        self._stop_timeout = config.get_stop_timeout(mode)
+        self._ready_check = config.get_ready_check(mode)
+        self.duplicate_policy = config.get_duplicate_policy(mode)
+        crash_policy = config.get_crash_policy(mode)
+        if crash_policy != self._crash_policy_settings:
+            self._restart_policy = RestartPolicy.from_settings(crash_policy)
+            self._crash_policy_settings = crash_policy
+        if (self.process_controller is None or mi_exe != self.mi_exe
+                or mi_folder_path != self._mi_folder_path):
+            # instances launched by the old controller are still found by name
+            self.process_controller = ProcessController(mi_exe, mi_folder_path, self._stop_timeout)
+        else:
+            self.process_controller.stop_timeout = self._stop_timeout
+        self.mi_exe = mi_exe
+        self._mi_folder_path = mi_folder_path
+        self._process_cache.watch([mi_exe]) # MI lookups become a dictionary lookup
+
+
+    def on_process_event(self, event: str, record: Dict) -> None:
+        """
+        Wakes up anything waiting for this mode's MI to appear or go away
+        """
+        if record["Name"] == self.mi_exe:
+            self.process_event.set()
+
+
+    def MI_process_info(self) -> List[Dict]:
+        """
+        Returns the running instances of this mode's MI
+        """
+        try:
+            with LOOKUP_SECONDS.time():
+                return self._process_cache.find(self.mi_exe)
+        except Exception as e:
+            print("ERROR <MI_process_info> process source: ", e)
+            raise
+
+
+    def _fresh_MI_process_info(self) -> List[Dict]:
+        """
+        MI instances from a new scan (used while waiting for MI to start/stop)
+        """
+        self._process_cache.invalidate()
+        return self.MI_process_info()
+
+
+    def set_icon(self, value) -> None:
+        """
+        Sets the icon to the correct colour
+        """
+        if self._last_MI_check and not value:
+            self.icon_manager.red_icon_set() # set icon red
+            self._last_MI_check = False
+        elif not self._last_MI_check and value:
+            self.icon_manager.green_icon_set() # set icon green
+            self._last_MI_check = True
+
+
+    def start(self) -> None:
+        """
+        Starts MI (one instance) unless it is already running
+        """
+        MI_instances = self.MI_process_info()
+        if len(MI_instances) == 1:
+            self.state = RUNNING
+            return
+        elif len(MI_instances) > 1:
+            self.stop()
+        self.state = STARTING
+        started = time.monotonic()
+        pid = None
+        try:
+            if self._process_control == "direct":
+                pid = self._launch_direct()
+            else:
+                Popen("start cmd /C" + self.mi_exe, cwd=self._mi_folder_path, shell=True)
+            self._process_cache.invalidate()
+        except Exception as e:
+            print(f"ModeSupervisor({self.mode}).start(): start subprocess issue", e)
+            raise
+        # wait for process to get added to os processes (and to be ready)
+        is_running, _ = wait_for(lambda: len(self._fresh_MI_process_info()) >= 1,
+                                 self._start_timeout, self.process_event)
+        if is_running:
+            is_running = self._wait_until_ready(pid, started)
+        self._record_timing("launch", time.monotonic() - started, is_running)
+        if not is_running:
+            raise RuntimeError(f"{self.mi_exe} app NOT detected in process list. There was a problem with starting the app. Please make sure the path is correct.")
+        print(f"{self.mi_exe} app detected in process list") # MI app is confirmed running
+        MI_instances = self.MI_process_info()
+        self._watch_instances(MI_instances)
+        self.pids = [process["ProcessId"] for process in MI_instances]
+        self.state = RUNNING
+        self.set_icon(True)
+
+
+    def _launch_direct(self) -> Optional[int]:
+        """
+        Starts the MI exe without a shell and returns its PID,
+        the "start cmd /C" way is the fallback (no PID)
+        """
+        try:
+            return self.process_controller.launch()
+        except OSError as e:
+            print("MIMonitor: direct launch failed, using start cmd", e)
+            Popen("start cmd /C" + self.mi_exe, cwd=self._mi_folder_path, shell=True)
+            return None
+
+
+    def _wait_until_ready(self, pid: Optional[int], started: float) -> bool:
+        """
+        Optional readiness check on top of the process showing up:
+        "window" (MI window visible) or "port:<n>" (MI accepts connections)
+        """
+        left = max(self._start_timeout - (time.monotonic() - started), 0)
+        if self._ready_check == "window":
+            if pid is None:
+                pid = self.MI_process_info()[0]["ProcessId"]
+            is_ready, _ = wait_for(lambda: window_ready(pid), left)
+            return is_ready
+        if self._ready_check.startswith("port:"):
+            port = int(self._ready_check.split(":", 1)[1])
+            is_ready, _ = wait_for(lambda: port_ready(port), left)
+            return is_ready
+        return True
+
+
+    def stop(self) -> None:
+        """
+        Kills this mode's MI instance(s)
+        """
+        MI_instances = self.MI_process_info()
+        if len(MI_instances) == 0:
+            self.state = STOPPED
+            return
+        self.state = STOPPING
+        started = time.monotonic()
+        if self._process_control == "direct":
+            try:
+                exit_codes = self.process_controller.terminate(
+                    [process["ProcessId"] for process in MI_instances])
+            except OSError as e:
+                print(f"ModeSupervisor({self.mode}).stop(): direct stop failed, using bat files", e)
+            else:
+                # the handles are gone, give the process table a moment to follow
+                is_gone, _ = wait_for(lambda: len(self._fresh_MI_process_info()) == 0,
+                                      self._stop_timeout, self.process_event)
+                self._record_timing("kill", time.monotonic() - started, is_gone)
+                self.state = STOPPED if is_gone else RUNNING
+                if is_gone:
+                    self.set_icon(False)
+                print("MI closed, exit codes: ", exit_codes)
+                return
+        is_gone = self._stop_with_bats()
+        self.state = STOPPED if is_gone else RUNNING
+        self._record_timing("kill", time.monotonic() - started, is_gone)
+
+
+    def _stop_with_bats(self) -> bool:
+        """
+        Kills MI with the exit_*.bat / forced_exit_*.bat files,
+        returns True once MI is confirmed gone
+        """
+        print("bat_exit: ", self._bat_exit, "bat_folder: ", self._bat_folder_path)
+        Popen("start cmd /C" + self._bat_exit, cwd=self._bat_folder_path, shell=True) # attempt image process kill
+        self._process_cache.invalidate()
+        # wait for process to get removed from os processes
+        is_gone, _ = wait_for(lambda: len(self._fresh_MI_process_info()) == 0,
+                              self._stop_timeout, self.process_event)
+        if is_gone:
+            self.set_icon(False)
+            print("MI closed")
+            return True
+        Popen("start cmd /C" + self._bat_forced_exit, cwd=self._bat_folder_path, shell=True) # forced process kill
+        self._process_cache.invalidate()
+        is_gone, _ = wait_for(lambda: len(self._fresh_MI_process_info()) == 0,
+                              self._stop_timeout, self.process_event)
+        if is_gone:
+            self.set_icon(False)
+        print("MI forced closed")
+        return is_gone
+
+
+    def _manual_start(self) -> None:
+        """
+        "start" command: also closes the crash-loop breaker
+        """
+        self._restart_policy.reset()
+        self._cancel_recovery()
+        self.start()
+
+
+    def _manual_stop(self) -> None:
+        """
+        "stop" command: also cancels a pending crash restart
+        """
+        self._cancel_recovery()
+        self.stop()
+
+
+    def _watch_instances(self, MI_instances: List[Dict]) -> None:
+        for process in MI_instances:
+            self.process_controller.watch(process["ProcessId"], self._on_exit, process["CreationDate"])
+
+
+    def _on_exit(self, pid: int, exit_code: Optional[int], uptime: Optional[float], expected: bool) -> None:
+        """
+        Exit watch callback (watch thread), runs the moment an instance exits
+        """
+        self._process_cache.invalidate()
+        self.process_event.set()
+        self.pids = [p for p in self.pids if p != pid]
+        if expected or self.state in (STOPPING, DEDUPLICATING):
+            self._changed()
+            return
+        uptime_text = "?" if uptime is None else f"{uptime:.1f}"
+        print(f"{self.mi_exe} PID {pid} exited unexpectedly, exit code {exit_code}, uptime {uptime_text} s")
+        if self.is_idle() and not self.MI_process_info():
+            self.state = STOPPED
+            self.set_icon(False)
+        if not self._restart_policy.is_crash(exit_code):
+            return # closed by the user
+        REGISTRY.counter("mimonitor_crashes_total", "Unexpected MI exits counted as crashes",
+                         {"mode": self.mode}).inc()
+        self.counters["crashes"] += 1
+        self._changed()
+        delay = self._restart_policy.next_delay(uptime)
+        if delay is None:
+            if self._restart_policy.breaker_open:
+                print(f"[MI_Monitor] {self.mode} crash loop, not restarting until MI is started manually")
+            return
+        if self._crashed_at is None:
+            self._crashed_at = time.monotonic()
+        self._schedule_recovery(delay)
+
+
+    def _schedule_recovery(self, delay: float) -> None:
+        self._cancel_timer()
+        print(f"Restarting {self.mi_exe} in {delay:.1f} s")
+        self._restart_timer = Timer(delay, self._submit_recover)
+        self._restart_timer.daemon = True
+        self._restart_timer.start()
+
+
+    def _submit_recover(self) -> None:
+        try:
+            self.submit("recover")
+        except RuntimeError:
+            pass # closed
+
+
+    def _cancel_timer(self) -> None:
+        if self._restart_timer is not None:
+            self._restart_timer.cancel()
+            self._restart_timer = None
+
+
+    def _cancel_recovery(self) -> None:
+        self._cancel_timer()
+        self._crashed_at = None
+
+
+    def recover(self) -> None:
+        """
+        "recover" command: starts MI again after a crash
+        """
+        crashed_at = self._crashed_at
+        if crashed_at is None:
+            return # cancelled by a stop/start command
+        try:
+            self.start()
+        except Exception:
+            # a failed start counts as another crash
+            delay = self._restart_policy.next_delay(0.0)
+            if delay is not None:
+                self._schedule_recovery(delay)
+            else:
+                self._crashed_at = None
+            raise
+        self._crashed_at = None
+        self.counters["recoveries"] += 1
+        recovery = time.monotonic() - crashed_at
+        REGISTRY.histogram("mimonitor_crash_recovery_seconds", "MI crash to MI running again",
+                           {"mode": self.mode}).observe(recovery)
+        print(f"{self.mi_exe} recovered {recovery:.2f} s after the crash")
+
+
+    def exit_history(self) -> List:
+        """
+        Recent (pid, exit code, time, uptime, expected) of this mode's MI
+        """
+        return list(self.process_controller.exit_history)
+
+
+    def restart(self) -> None:
+        """
+        Closes all instances, then opens one
+        """
+        self.stop() # returns once MI is gone
+        self.start()
+
+
+    def deduplicate(self) -> None:
+        """
+        Applies the mode's duplicate_policy if more than one
+        instance is running
+        """
+        MI_instances = self._fresh_MI_process_info()
+        if len(MI_instances) < 2 or self.duplicate_policy == "ignore":
+            return
+        self._duplicates_closed(len(MI_instances) if self.duplicate_policy == "restart"
+                                else len(MI_instances) - 1)
+        if self.duplicate_policy == "restart":
+            self.restart()
+            return
+        # keep_oldest
+        self.state = DEDUPLICATING
+        started = time.monotonic()
+        MI_instances = sorted(MI_instances, key=lambda process: process["CreationDate"] or 0)
+        extra = [process["ProcessId"] for process in MI_instances[1:]]
+        exit_codes = self.process_controller.terminate(extra)
+        is_done, _ = wait_for(lambda: len(self._fresh_MI_process_info()) <= 1,
+                              self._stop_timeout, self.process_event)
+        self._record_timing("deduplicate", time.monotonic() - started, is_done)
+        self.state = RUNNING
+        print(f"{self.mi_exe} duplicates closed, kept PID {MI_instances[0]['ProcessId']}, exit codes: ", exit_codes)
+
+
+    def _duplicates_closed(self, count: int) -> None:
+        self.counters["duplicates_closed"] += count
+        REGISTRY.counter("mimonitor_duplicates_closed_total", "Duplicate MI instances closed",
+                         {"mode": self.mode, "policy": self.duplicate_policy}).inc(count)
+
+
+    def _record_timing(self, action: str, seconds: float, ok: bool) -> None:
+        REGISTRY.histogram("mimonitor_mi_action_seconds", "MI launch/kill/deduplicate until confirmed",
+                           {"mode": self.mode, "action": action, "confirmed": str(ok).lower()}).observe(seconds)
+        self._command_timings.append((action, seconds, ok))
+        counter = {"launch": "launches", "kill": "kills"}.get(action)
+        if counter is not None:
+            self.counters[counter] += 1
+        print(f"MI {self.mode} {action} took {seconds * 1000:.0f} ms" + ("" if ok else " (not confirmed)"))
+
+
+    def command_timings(self) -> List:
+        """
+        Recent (action, seconds, confirmed) for every launch and kill
+        """
+        return list(self._command_timings)
+
+
+    def status(self) -> Dict:
+        """
+        State, MI instances, last command and counters (see status_mailbox.py)
+        """
+        pids = list(self.pids)
+        return {"mode": self.mode, "state": self.state, "state_since": self.state_since,
+                "pid": pids[0] if pids else 0, "instances": len(pids),
+                "last_command": self.last_command, "last_command_ok": self.last_command_ok,
+                "last_command_at": self.last_command_at, "counters": dict(self.counters)}
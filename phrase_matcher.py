@@ -0,0 +1,107 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Word level multi-pattern matcher for the trigger phrases.
+
+All phrases are compiled once into an Aho-Corasick automaton over words
+(not characters), so one pass over the recognised text finds every
+trigger phrase, only on whole words ("start motions" does not match
+"start motion"). Overlapping matches are resolved leftmost-longest and
+the matches come back in the order they were spoken, so
+"stop motion ... start motion" is a stop followed by a start.
+'''
+from collections import deque
+from typing import Any, Dict, List, NamedTuple
+
+
+class PhraseMatch(NamedTuple):
+    """ A trigger phrase found in the text (start/end are word positions) """
+    start: int
+    end: int
+    phrase: str
+    action: Any
+
+
+class PhraseMatcher:
+    """ Aho-Corasick automaton over words """
+
+    def __init__(self, phrases: Dict[str, Any]):
+        """
+        phrases - {trigger phrase: action}
+        """
+        self._goto = [{}] # node -> {word: node}
+        self._fail = [0]
+        self._out = [[]] # node -> [(number of words, phrase, action)]
+        for phrase, action in phrases.items():
+            self._add(phrase, action)
+        self._build_fail_links()
+
+
+    def _add(self, phrase: str, action: Any) -> None:
+        words = phrase.split()
+        if not words:
+            return
+        node = 0
+        for word in words:
+            next_node = self._goto[node].get(word)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][word] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        self._out[node].append((len(words), " ".join(words), action))
+
+
+    def _build_fail_links(self) -> None:
+        todo = deque(self._goto[0].values())
+        while todo:
+            node = todo.popleft()
+            for word, child in self._goto[node].items():
+                todo.append(child)
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word, 0)
+                # a phrase ending here may also end a shorter phrase
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+
+    def find_all(self, text: str) -> List[PhraseMatch]:
+        """
+        Returns the non-overlapping matches in text, in spoken order
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        node = 0
+        for position, word in enumerate(text.split()):
+            while node and word not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word, 0)
+            for length, phrase, action in out[node]:
+                matches.append(PhraseMatch(position - length + 1, position + 1, phrase, action))
+        if len(matches) < 2:
+            return matches
+        # leftmost-longest, without overlaps
+        matches.sort(key=lambda match: (match.start, match.start - match.end))
+        resolved = []
+        for match in matches:
+            if not resolved or match.start >= resolved[-1].end:
+                resolved.append(match)
+        return resolved
+
+
+    def has_match(self, text: str) -> bool:
+        """
+        True if text contains at least one phrase
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for word in text.split():
+            while node and word not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word, 0)
+            if out[node]:
+                return True
+        return False
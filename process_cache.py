@@ -0,0 +1,206 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Shared process snapshot cache used by all MIMonitor threads.
+
+The trackers, start and stop handlers all ask for the MI instances,
+often back to back. Instead of each of them scanning the process table,
+they share one snapshot which is reused for ttl seconds.
+Callers that arrive while a scan is already running wait for that
+scan (single-flight) instead of starting their own.
+invalidate() is called whenever MIMonitor starts or kills MI,
+so the next caller always sees a fresh process table.
+For polled backends a "scan" is a ProcessIndex refresh (only new and
+vanished PIDs are read) and MI lookups use the index's name lookup.
+Backends that filter by name themselves (wmic) skip the index: a "scan"
+is one query for every watched MI executable, and snapshot() reads the
+full table, uncached.
+'''
+import time
+from threading import Event, Lock
+from typing import Dict, Iterable, List
+
+from metrics import REGISTRY
+from process_index import ProcessIndex
+from process_source import ProcessSource
+
+SCAN_SECONDS = REGISTRY.histogram("mimonitor_process_scan_seconds",
+                                  "Process table scans (duration, count = number of scans)")
+
+
+class _Flight:
+    """ A scan in progress that other callers can wait for """
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.event = Event()
+        self.result = None
+        self.error = None
+
+
+class ProcessSnapshotCache:
+    """ TTL, single-flight cache in front of a ProcessSource """
+
+    def __init__(self, source: ProcessSource, ttl: float = 0.25, resync_interval: float = 30.0):
+        """
+        resync_interval - seconds between full process table reads
+        (see ProcessIndex), event driven backends need no index
+        """
+        self._source = source
+        self._by_name = source.name_filtered and not source.event_driven
+        self._index = None if source.event_driven or self._by_name else ProcessIndex(source, resync_interval)
+        self._watched = frozenset() # names looked up together (name filtered backends)
+        self._ttl = ttl
+        self._lock = Lock()
+        self._snapshot = None
+        self._taken_at = 0.0
+        self._snapshot_generation = -1
+        self._generation = 0 # bumped by invalidate()
+        self._in_flight = None
+        self._created_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0 # == number of scans started
+        self.coalesced = 0
+
+
+    def snapshot(self) -> List[Dict]:
+        """
+        Returns the cached process table,
+        scanning (once for all callers) if it is stale
+        """
+        if self._by_name:
+            return self._source.snapshot() # only the MI lookups are cached
+        return self._cached()
+
+
+    def _cached(self):
+        """
+        The cached scan result, scanning if it is stale
+        """
+        with self._lock:
+            if (self._snapshot is not None
+                    and self._snapshot_generation == self._generation
+                    and time.monotonic() - self._taken_at < self._ttl):
+                self.hits += 1
+                return self._snapshot
+            flight = self._in_flight
+            if flight is not None and flight.generation == self._generation:
+                self.coalesced += 1
+                is_leader = False
+            else:
+                self.misses += 1
+                flight = _Flight(self._generation)
+                self._in_flight = flight
+                is_leader = True
+        if not is_leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        return self._scan(flight)
+
+
+    def _scan(self, flight: _Flight):
+        started = time.monotonic()
+        try:
+            if self._by_name:
+                flight.result = self._source.find_all(self._watched)
+            elif self._index is not None:
+                self._index.refresh()
+                flight.result = self._index.snapshot()
+            else:
+                flight.result = self._source.snapshot()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            SCAN_SECONDS.observe(time.monotonic() - started)
+            with self._lock:
+                if flight.error is None and flight.generation == self._generation:
+                    self._snapshot = flight.result
+                    self._taken_at = started
+                    self._snapshot_generation = flight.generation
+                if self._in_flight is flight:
+                    self._in_flight = None
+            flight.event.set()
+        return flight.result
+
+
+    def find(self, name: str) -> List[Dict]:
+        """
+        Returns the records of all processes called name
+        """
+        if self._source.event_driven:
+            # Event driven tables are never scanned, nothing to cache
+            return self._source.find(name)
+        if self._by_name:
+            return self._lookup([name])[name]
+        self.snapshot() # refreshes the index if stale
+        return self._index.find(name)
+
+
+    def find_all(self, names: List[str]) -> Dict[str, List[Dict]]:
+        """
+        Returns {name: records} for several names from one snapshot
+        """
+        if self._source.event_driven:
+            return {name: self._source.find(name) for name in names}
+        if self._by_name:
+            found = self._lookup(names)
+            return {name: found[name] for name in names}
+        self.snapshot()
+        return self._index.find_all(names)
+
+
+    def watch(self, names: List[str]) -> None:
+        """
+        Precomputes the lookup of names (MI executables)
+        """
+        if self._by_name:
+            names = frozenset(names)
+            with self._lock:
+                if not names <= self._watched:
+                    self._watched = self._watched | names
+                    self._generation += 1 # the cached lookups lack the new names
+            return
+        if self._index is not None:
+            self._index.watch(names)
+
+
+    def _lookup(self, names: Iterable[str]) -> Dict[str, List[Dict]]:
+        """
+        {name: records} of every watched name (names included),
+        one backend query per ttl for all of them
+        """
+        self.watch(names)
+        return self._cached()
+
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached snapshot. Scans already running
+        will not be reused by callers arriving after this.
+        """
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+
+    def stats(self, reset: bool = False) -> Dict[str, float]:
+        """
+        Returns hit/miss/coalesce counters and scans per second
+        """
+        with self._lock:
+            elapsed = max(time.monotonic() - self._created_at, 1e-9)
+            stats = {"hits": self.hits,
+                     "misses": self.misses,
+                     "coalesced": self.coalesced,
+                     "scans": self.misses,
+                     "scans_per_second": self.misses / elapsed}
+            if self._index is not None:
+                stats["index"] = self._index.stats()
+            if reset:
+                self.hits = self.misses = self.coalesced = 0
+                self._created_at = time.monotonic()
+        return stats
+
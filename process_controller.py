@@ -0,0 +1,323 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Direct MI process launch and termination.
+
+MI used to be started with "start cmd /C <exe>" and stopped with the
+exit_*.bat / forced_exit_*.bat files, i.e. two extra shells per action
+and no PID or exit status. ProcessController starts the exe directly,
+keeps the Popen handle of every instance it launched, and stops
+instances gracefully first (WM_CLOSE on Windows, like taskkill without /F;
+SIGTERM elsewhere), escalating to a forced kill after a timeout.
+Exit codes are returned and kept in exit_history.
+
+Instances MIMonitor did not launch itself (found in the process table)
+are handled by PID; on Windows their exit code is still read from a
+process handle, elsewhere it is not available (None).
+
+watch() reports an exit the moment it happens by blocking on the
+process handle (Popen.wait for our children, WaitForSingleObject on
+Windows, a pidfd on Linux) on a small thread, instead of waiting for
+the next process table scan.
+'''
+import os
+import select
+import signal
+import subprocess
+import sys
+import time
+from threading import Lock, Thread
+from typing import Callable, Dict, List, Optional
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+
+    _user32 = ctypes.windll.user32
+    _kernel32 = ctypes.windll.kernel32
+    _kernel32.OpenProcess.restype = wintypes.HANDLE
+    WM_CLOSE = 0x0010
+    PROCESS_TERMINATE = 0x0001
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    SYNCHRONIZE = 0x00100000
+    WAIT_OBJECT_0 = 0
+    _ENUM_WINDOWS_PROC = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+
+
+def _post_close(pid: int) -> bool:
+    """
+    Asks pid to close: WM_CLOSE to its top level windows on Windows,
+    SIGTERM elsewhere. Returns False if there was nothing to ask.
+    """
+    if sys.platform != "win32":
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return False
+        return True
+    windows = []
+    def on_window(hwnd, _):
+        owner = wintypes.DWORD()
+        _user32.GetWindowThreadProcessId(hwnd, ctypes.byref(owner))
+        if owner.value == pid:
+            windows.append(hwnd)
+        return True
+    _user32.EnumWindows(_ENUM_WINDOWS_PROC(on_window), 0)
+    for hwnd in windows:
+        _user32.PostMessageW(hwnd, WM_CLOSE, 0, 0)
+    return bool(windows)
+
+
+class _PidHandle:
+    """ Minimal Popen-like wrapper around a process MIMonitor did not start """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.returncode = None
+        self._handle = None
+        self._pidfd = None
+        if hasattr(os, "pidfd_open"):
+            # Linux: a pidfd becomes readable when the process exits
+            try:
+                self._pidfd = os.pidfd_open(pid)
+            except ProcessLookupError:
+                raise
+            except OSError:
+                self._pidfd = None # old kernel, fall back to polling
+        if sys.platform == "win32":
+            access = PROCESS_TERMINATE | PROCESS_QUERY_LIMITED_INFORMATION | SYNCHRONIZE
+            self._handle = _kernel32.OpenProcess(access, False, pid)
+            if not self._handle:
+                raise ProcessLookupError(f"[MI_Monitor] Process {pid} - could not be opened")
+
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[int]:
+        if sys.platform == "win32":
+            ms = 0xFFFFFFFF if timeout is None else int(timeout * 1000)
+            if _kernel32.WaitForSingleObject(self._handle, ms) != WAIT_OBJECT_0:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            code = wintypes.DWORD()
+            _kernel32.GetExitCodeProcess(self._handle, ctypes.byref(code))
+            self.returncode = code.value
+            return self.returncode
+        if self._pidfd is not None:
+            readable, _, _ = select.select([self._pidfd], [], [], timeout)
+            if not readable:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            return None # not our child, exit code unknown
+        # Not our child, so it cannot be waited on; poll for it to go away
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.005
+        while self._is_alive():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        return None
+
+
+    def _is_alive(self) -> bool:
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        try:
+            # A zombie has exited, it is only waiting for its parent
+            with open(f"/proc/{self.pid}/stat", "rb") as f:
+                return f.read().rsplit(b")", 1)[1].split()[0] != b"Z"
+        except (OSError, IndexError):
+            return True
+
+
+    def kill(self) -> None:
+        if sys.platform == "win32":
+            _kernel32.TerminateProcess(self._handle, 1)
+            return
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+    def close(self) -> None:
+        if self._handle:
+            _kernel32.CloseHandle(self._handle)
+            self._handle = None
+        if self._pidfd is not None:
+            os.close(self._pidfd)
+            self._pidfd = None
+
+
+class ProcessController:
+    """ Launches MI directly and stops it by handle/PID """
+
+    def __init__(self, exe_name: str, folder: str, stop_timeout: float = 3.0):
+        self._exe_name = exe_name
+        self._folder = folder
+        self.stop_timeout = stop_timeout
+        self._children = {} # pid -> Popen of instances launched by us
+        self._lock = Lock()
+        self._live = {} # pid -> start time (time.time(), None if unknown), until its exit is recorded
+        self._expected = set() # pids being stopped by terminate()
+        self._watched = set() # pids with a watch() thread
+        self.exit_history = [] # (pid, exit code, time.time(), uptime seconds or None, expected)
+
+
+    def launch(self) -> int:
+        """
+        Starts the MI exe without a shell and returns its PID
+        """
+        exe_path = os.path.join(self._folder, self._exe_name)
+        flags = 0
+        if sys.platform == "win32":
+            # Not tied to our console, like the old "start cmd /C"
+            flags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        process = subprocess.Popen([exe_path], cwd=self._folder, creationflags=flags,
+                                   stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        with self._lock:
+            self._children[process.pid] = process
+            self._live[process.pid] = time.time()
+        print(f"{self._exe_name} launched, PID {process.pid}")
+        return process.pid
+
+
+    def terminate(self, pids: List[int], timeout: Optional[float] = None) -> Dict[int, Optional[int]]:
+        """
+        Stops all pids: graceful close first, forced kill for whatever
+        is still running after timeout. Returns {pid: exit code}.
+        """
+        timeout = self.stop_timeout if timeout is None else timeout
+        handles = {}
+        with self._lock:
+            for pid in pids:
+                self._expected.add(pid)
+                self._live.setdefault(pid, None)
+        for pid in pids:
+            handle = self._children.get(pid)
+            if handle is None:
+                try:
+                    handle = _PidHandle(pid)
+                except ProcessLookupError:
+                    self._record_exit(pid, None) # already gone
+                    continue
+            handles[pid] = handle
+            _post_close(pid)
+        deadline = time.monotonic() + timeout
+        exit_codes = {}
+        for pid, handle in handles.items():
+            try:
+                exit_codes[pid] = handle.wait(max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                print(f"{self._exe_name} PID {pid} did not close in {timeout} s, killing it")
+                handle.kill()
+                try:
+                    exit_codes[pid] = handle.wait(timeout)
+                except subprocess.TimeoutExpired:
+                    print(f"{self._exe_name} PID {pid} survived a forced kill")
+                    exit_codes[pid] = None
+            self._forget(pid, handle, exit_codes[pid])
+        return exit_codes
+
+
+    def _forget(self, pid: int, handle, exit_code: Optional[int]) -> None:
+        if isinstance(handle, _PidHandle):
+            handle.close()
+        self._record_exit(pid, exit_code)
+
+
+    def _record_exit(self, pid: int, exit_code: Optional[int]):
+        """
+        Records an exit once (terminate, poll and watch can all see it).
+        Returns (uptime, expected), None if it was already recorded.
+        """
+        ended = time.time()
+        with self._lock:
+            if pid not in self._live:
+                return None
+            started = self._live.pop(pid)
+            self._children.pop(pid, None)
+            expected = pid in self._expected
+            self._expected.discard(pid)
+            uptime = None if started is None else max(ended - started, 0.0)
+            self.exit_history.append((pid, exit_code, ended, uptime, expected))
+            del self.exit_history[:-100]
+        return uptime, expected
+
+
+    def watch(self, pid: int, on_exit: Callable[[int, Optional[int], Optional[float], bool], None],
+              started: Optional[float] = None) -> bool:
+        """
+        Calls on_exit(pid, exit code, uptime, expected) as soon as pid exits.
+        expected is True if terminate() stopped it. started (epoch seconds)
+        is used for the uptime of instances we did not launch.
+        Returns False if pid is already watched or gone.
+        """
+        with self._lock:
+            if pid in self._watched:
+                return False
+            handle = self._children.get(pid)
+            self._watched.add(pid)
+            if pid not in self._live:
+                self._live[pid] = started
+        if handle is None:
+            try:
+                handle = _PidHandle(pid)
+            except ProcessLookupError:
+                with self._lock:
+                    self._watched.discard(pid)
+                self._record_exit(pid, None)
+                return False
+        Thread(target=self._wait_exit, args=(pid, handle, on_exit), daemon=True,
+               name=f"MIMonitor Exit Watch {pid}").start()
+        return True
+
+
+    def _wait_exit(self, pid: int, handle, on_exit: Callable) -> None:
+        try:
+            exit_code = handle.wait()
+        except OSError as e:
+            print(f"[MI_Monitor] {self._exe_name} PID {pid} could not be watched: {e}")
+            exit_code = None
+        finally:
+            if isinstance(handle, _PidHandle):
+                handle.close()
+        with self._lock:
+            self._watched.discard(pid)
+        recorded = self._record_exit(pid, exit_code)
+        if recorded is not None:
+            uptime, expected = recorded
+        else:
+            # terminate() or poll() recorded it first
+            with self._lock:
+                entry = next((e for e in reversed(self.exit_history) if e[0] == pid), None)
+            if entry is None:
+                return
+            _, exit_code, _, uptime, expected = entry
+        on_exit(pid, exit_code, uptime, expected)
+
+
+    def poll(self) -> Dict[int, int]:
+        """
+        Reaps launched instances that exited on their own,
+        returns {pid: exit code} for them
+        """
+        exited = {}
+        with self._lock:
+            children = list(self._children.items())
+        for pid, process in children:
+            exit_code = process.poll()
+            if exit_code is not None:
+                exited[pid] = exit_code
+                self._forget(pid, process, exit_code)
+        return exited
+
+
+    def children(self) -> List[int]:
+        """
+        PIDs of running instances launched by this controller
+        """
+        with self._lock:
+            return list(self._children)
@@ -0,0 +1,180 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Incremental process table index for the polled process backends.
+
+Instead of rebuilding a record for every process on every scan, the
+index keeps pid -> record and, on refresh(), only lists the PIDs and
+reads the records of processes that appeared since the last refresh
+(and drops the ones that vanished), so the cost follows process churn
+rather than the number of processes on the host.
+
+A process is identified by (pid, CreationDate): the few processes of
+the watched executables are re-read on every refresh, so a PID reused
+by another program is noticed; for everything else a full resync every
+resync_interval seconds catches reuse (and backends that cannot list
+PIDs cheaply are resynced on every refresh).
+
+Watched names have a precomputed lookup (by Name and by executable
+file name), so find() for MI is a dictionary lookup.
+'''
+import ntpath
+import time
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+
+from process_source import ProcessSource
+
+
+def _exe_name(record: Dict) -> str:
+    # ntpath splits on both "\" and "/"
+    return ntpath.basename(record["ExecutablePath"]) if record["ExecutablePath"] else ""
+
+
+class ProcessIndex:
+    """ pid -> record map refreshed from PID churn """
+
+    def __init__(self, source: ProcessSource, resync_interval: float = 30.0):
+        self._source = source
+        self._resync_interval = resync_interval
+        self._lock = Lock() # one refresh at a time, guards the tables
+        self._table = {} # pid -> record
+        self._watched = {} # watched name -> {pid: record}
+        self._records = [] # snapshot list, rebuilt after changes
+        self._changed = True
+        self._resynced_at = None
+        self.refreshes = 0
+        self.resyncs = 0
+        self.added = 0 # records read for new or reused PIDs
+        self.removed = 0
+
+
+    def watch(self, names: Iterable[str]) -> None:
+        """
+        Keeps a lookup for processes called name (or running name)
+        """
+        with self._lock:
+            for name in names:
+                if name not in self._watched:
+                    self._watched[name] = {pid: record for pid, record in self._table.items()
+                                           if self._matches(record, name)}
+
+
+    @staticmethod
+    def _matches(record: Dict, name: str) -> bool:
+        return record["Name"] == name or _exe_name(record) == name
+
+
+    def refresh(self) -> None:
+        """
+        Brings the index up to date with the process table
+        """
+        with self._lock:
+            self.refreshes += 1
+            now = time.monotonic()
+            if (not self._source.incremental or self._resynced_at is None
+                    or now - self._resynced_at >= self._resync_interval):
+                self._resync(now)
+                return
+            pids = set(self._source.pids())
+            gone = self._table.keys() - pids
+            for pid in gone:
+                self._remove(pid)
+            # new PIDs, plus the watched ones again (PID reuse)
+            to_read = pids - self._table.keys()
+            watched_pids = {pid for by_pid in self._watched.values() for pid in by_pid}
+            to_read |= watched_pids & pids
+            if not to_read:
+                return
+            found = set()
+            for record in self._source.records(to_read):
+                pid = record["ProcessId"]
+                found.add(pid)
+                old = self._table.get(pid)
+                if old is not None and old["CreationDate"] == record["CreationDate"]:
+                    continue # same process
+                if old is not None:
+                    self._remove(pid) # PID reused by a new process
+                self._add(record)
+            for pid in to_read - found:
+                if pid in self._table:
+                    self._remove(pid) # ended between listing and reading
+
+
+    def _resync(self, now: float) -> None:
+        """
+        Rebuilds everything from a full snapshot
+        """
+        records = self._source.snapshot()
+        self.resyncs += 1
+        self._resynced_at = now # only once it worked, a failed one is retried next refresh
+        table = {record["ProcessId"]: record for record in records}
+        for pid, record in self._table.items():
+            new = table.get(pid)
+            if new is None or new["CreationDate"] != record["CreationDate"]:
+                self.removed += 1
+        self.added += sum(1 for pid, record in table.items()
+                          if pid not in self._table or self._table[pid]["CreationDate"] != record["CreationDate"])
+        self._table = table
+        for name in self._watched:
+            self._watched[name] = {pid: record for pid, record in table.items()
+                                   if self._matches(record, name)}
+        self._records = records
+        self._changed = False
+
+
+    def _add(self, record: Dict) -> None:
+        self._table[record["ProcessId"]] = record
+        for name, by_pid in self._watched.items():
+            if self._matches(record, name):
+                by_pid[record["ProcessId"]] = record
+        self.added += 1
+        self._changed = True
+
+
+    def _remove(self, pid: int) -> Optional[Dict]:
+        record = self._table.pop(pid, None)
+        for by_pid in self._watched.values():
+            by_pid.pop(pid, None)
+        self.removed += 1
+        self._changed = True
+        return record
+
+
+    def snapshot(self) -> List[Dict]:
+        """
+        Records of all indexed processes (shared list, do not modify)
+        """
+        with self._lock:
+            if self._changed:
+                self._records = list(self._table.values())
+                self._changed = False
+            return self._records
+
+
+    def find(self, name: str) -> List[Dict]:
+        """
+        Records of the processes called name (watched from now on)
+        """
+        by_pid = self._watched.get(name)
+        if by_pid is None:
+            self.watch([name])
+            by_pid = self._watched[name]
+        with self._lock:
+            return list(by_pid.values())
+
+
+    def find_all(self, names: Iterable[str]) -> Dict[str, List[Dict]]:
+        """
+        {name: records} for several names
+        """
+        return {name: self.find(name) for name in names}
+
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Size of the index and how much work the refreshes did
+        """
+        return {"processes": len(self._table), "watched": len(self._watched),
+                "refreshes": self.refreshes, "resyncs": self.resyncs,
+                "added": self.added, "removed": self.removed}
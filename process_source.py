@@ -0,0 +1,602 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Interchangeable process table backends for MIMonitor.
+
+Every backend returns the same small process record
+(a dict with wmic style keys) so MIMonitor does not care
+where the information came from:
+    Name, ProcessId, ParentProcessId, CreationDate, ExecutablePath
+CreationDate is seconds since the epoch (float) or None.
+
+Backends:
+- wmic           - the original Windows implementation (one subprocess per scan),
+                   asks only for the record fields and parses the output
+                   as it streams in (see iter_wmic_records)
+- psutil         - cross platform, no subprocess
+- proc           - reads /proc directly (Linux)
+- proc_connector - Linux kernel proc connector (netlink), exec/exit events
+                   are pushed to us, so lookups never scan the process table
+- fake           - in-memory table for tests
+
+"auto" picks the cheapest backend available on the current platform.
+
+Polled backends that can list PIDs cheaply and read single records
+(incremental = True) let ProcessIndex (process_index.py) refresh only
+the processes that started or ended since its last refresh. Backends
+that can filter by name themselves (name_filtered = True, wmic) are
+asked for the MI executables only (find_all) instead.
+'''
+import os
+import socket
+import struct
+import sys
+import time
+from calendar import timegm
+from contextlib import closing
+from subprocess import DEVNULL, PIPE, CalledProcessError, Popen
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+PROCESS_FIELDS = ("Name", "ProcessId", "ParentProcessId", "CreationDate", "ExecutablePath")
+BACKENDS = ("auto", "wmic", "psutil", "proc", "proc_connector", "fake")
+
+# Process events delivered to listeners
+EVENT_EXEC = "exec"
+EVENT_EXIT = "exit"
+
+
+def make_record(name: str, pid: int, ppid: int = 0,
+                created: Optional[float] = None, exe: str = "") -> Dict:
+    """
+    Builds a process record
+    """
+    return {"Name": name, "ProcessId": pid, "ParentProcessId": ppid,
+            "CreationDate": created, "ExecutablePath": exe or ""}
+
+
+class ProcessSource:
+    """ Base class for all process table backends """
+
+    event_driven = False # True if the backend pushes exec/exit events
+    incremental = False # True if pids()/records() are cheaper than snapshot()
+    name_filtered = False # True if find()/find_all() are cheaper than snapshot()
+
+    def __init__(self):
+        self._listeners = []
+
+
+    def snapshot(self) -> List[Dict]:
+        """
+        Returns a record for every process on the system
+        """
+        raise NotImplementedError
+
+
+    def find(self, name: str) -> List[Dict]:
+        """
+        Returns the records of all processes called name
+        """
+        return [process for process in self.snapshot() if process["Name"] == name]
+
+
+    def find_all(self, names: Iterable[str]) -> Dict[str, List[Dict]]:
+        """
+        Returns {name: records} for several names from one scan
+        """
+        found = {name: [] for name in names}
+        for process in self.snapshot():
+            if process["Name"] in found:
+                found[process["Name"]].append(process)
+        return found
+
+
+    def pids(self) -> Iterable[int]:
+        """
+        Returns the PIDs of all processes
+        """
+        return [process["ProcessId"] for process in self.snapshot()]
+
+
+    def records(self, pids: Iterable[int]) -> List[Dict]:
+        """
+        Returns the records of the given PIDs (gone ones are left out)
+        """
+        pids = set(pids)
+        return [process for process in self.snapshot() if process["ProcessId"] in pids]
+
+
+    def add_listener(self, callback: Callable[[str, Dict], None]) -> None:
+        """
+        Registers callback(event, record) for exec/exit events.
+        Only event driven backends call it.
+        """
+        self._listeners.append(callback)
+
+
+    def remove_listener(self, callback: Callable[[str, Dict], None]) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+
+    def _notify(self, event: str, record: Dict) -> None:
+        for callback in list(self._listeners):
+            try:
+                callback(event, record)
+            except Exception as e:
+                print(f"[MI_Monitor] process listener error: {e}", file=sys.stderr)
+
+
+    def start(self) -> None:
+        """
+        Starts any background activity (nothing for polled backends)
+        """
+
+
+    def close(self) -> None:
+        """
+        Releases the backend resources
+        """
+
+
+def parse_wmic_date(value: str) -> Optional[float]:
+    """
+    Converts a wmic CIM datetime (yyyymmddHHMMSS.mmmmmm+UUU)
+    to seconds since the epoch
+    """
+    if not value or len(value) < 22 or value[14] != ".":
+        return None
+    try:
+        # sliced by hand, strptime would dominate parsing a full process list
+        seconds = timegm((int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                          int(value[8:10]), int(value[10:12]), int(value[12:14])))
+        return seconds + int(value[15:21]) / 1e6 - int(value[21:]) * 60
+    except ValueError:
+        return None
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+_WMIC_FIELDS = frozenset(field.encode() for field in PROCESS_FIELDS)
+_WMIC_GET = ["get", ",".join(sorted(PROCESS_FIELDS)), "/format:list"] # only the record fields
+
+
+def _wmic_lines(args: List[str]) -> Iterator[bytes]:
+    """
+    Runs "wmic process <args>" and yields its output lines as they
+    arrive; closing the generator early kills wmic
+    """
+    try:
+        process = Popen(["wmic", "process"] + args, stdout=PIPE, stdin=DEVNULL, stderr=DEVNULL)
+    except OSError as e:
+        print("ERROR <WmicProcessSource> wmic could not be started: ", e)
+        raise
+    finished = False
+    try:
+        yield from process.stdout
+        finished = True
+    finally:
+        if process.poll() is None:
+            process.kill() # early exit
+        process.stdout.close()
+        process.wait()
+    if finished and process.returncode:
+        raise CalledProcessError(process.returncode, ["wmic", "process"] + args)
+
+
+def _wmic_record(process: Dict[bytes, bytes]) -> Dict:
+    return make_record(process.get(b"Name", b"").decode("utf-8", "replace"),
+                       _to_int(process.get(b"ProcessId")),
+                       _to_int(process.get(b"ParentProcessId")),
+                       parse_wmic_date(process.get(b"CreationDate", b"").decode("ascii", "replace")),
+                       process.get(b"ExecutablePath", b"").decode("utf-8", "replace"))
+
+
+def iter_wmic_records(lines: Iterable[bytes]) -> Iterator[Dict]:
+    """
+    Yields a record as soon as its block of wmic /format:list output
+    ("Key=Value" lines, blank lines between processes) is complete.
+    Only the record fields are kept, the other "Key=Value" lines of
+    e.g. "list full" output are skipped without being decoded.
+    """
+    process = {}
+    for line in lines:
+        line = line.strip() # lines end in \r\r\n
+        if not line:
+            if process:
+                yield _wmic_record(process)
+                process = {}
+            continue
+        key, separator, value = line.partition(b"=")
+        if separator and key in _WMIC_FIELDS:
+            process[key] = value
+    if process:
+        yield _wmic_record(process)
+
+
+class WmicProcessSource(ProcessSource):
+    """ Original wmic backend (Windows). Spawns wmic on every scan """
+
+    # not incremental: listing PIDs costs a wmic start of its own, as much as a
+    # full (projected) snapshot, so a refresh is one snapshot, i.e. one wmic start
+    name_filtered = True
+
+    def snapshot(self) -> List[Dict]:
+        with closing(_wmic_lines(_WMIC_GET)) as lines:
+            return list(iter_wmic_records(lines))
+
+
+    def find(self, name: str) -> List[Dict]:
+        return self.find_all([name])[name]
+
+
+    def find_all(self, names: Iterable[str]) -> Dict[str, List[Dict]]:
+        # WMI filters by name, only the matching processes are written and parsed
+        found = {name: [] for name in names}
+        if not found:
+            return found
+        where = " or ".join("Name='{}'".format(name.replace("\\", "\\\\").replace("'", "\\'"))
+                            for name in sorted(found))
+        asked = {} # WMI compares names case insensitively
+        for name in found:
+            asked.setdefault(name.lower(), []).append(name)
+        with closing(_wmic_lines(["where", where] + _WMIC_GET)) as lines:
+            for record in iter_wmic_records(lines):
+                for name in asked.get(record["Name"].lower(), ()):
+                    found[name].append(record)
+        return found
+
+
+class PsutilProcessSource(ProcessSource):
+    """ psutil backend, no subprocess per scan """
+
+    incremental = True
+    _attrs = ["pid", "name", "ppid", "create_time", "exe"]
+
+    def __init__(self):
+        super().__init__()
+        import psutil
+        self._psutil = psutil
+
+
+    def snapshot(self) -> List[Dict]:
+        records = []
+        for p in self._psutil.process_iter(self._attrs):
+            info = p.info
+            records.append(make_record(info["name"] or "", info["pid"], info["ppid"] or 0,
+                                       info["create_time"], info["exe"] or ""))
+        return records
+
+
+    def find(self, name: str) -> List[Dict]:
+        # Only the name is fetched for every process, the rest for matches
+        found = []
+        for p in self._psutil.process_iter(["name"]):
+            if p.info["name"] != name:
+                continue
+            try:
+                with p.oneshot():
+                    found.append(make_record(name, p.pid, p.ppid(), p.create_time(),
+                                             self._safe_exe(p)))
+            except self._psutil.NoSuchProcess:
+                continue
+        return found
+
+
+    def pids(self) -> Iterable[int]:
+        return self._psutil.pids()
+
+
+    def records(self, pids: Iterable[int]) -> List[Dict]:
+        records = []
+        for pid in pids:
+            try:
+                p = self._psutil.Process(pid)
+                with p.oneshot():
+                    records.append(make_record(p.name(), pid, p.ppid(), p.create_time(),
+                                               self._safe_exe(p)))
+            except (self._psutil.NoSuchProcess, self._psutil.AccessDenied):
+                continue
+        return records
+
+
+    def _safe_exe(self, p) -> str:
+        try:
+            return p.exe()
+        except (self._psutil.AccessDenied, self._psutil.ZombieProcess):
+            return ""
+
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _boot_time() -> float:
+    with open("/proc/stat", "rb") as f:
+        for line in f:
+            if line.startswith(b"btime"):
+                return float(line.split()[1])
+    return 0.0
+
+
+def read_proc_record(pid: int, boot_time: float) -> Optional[Dict]:
+    """
+    Reads one process record from /proc/<pid>.
+    Returns None if the process has gone away.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # comm is in brackets and can itself contain spaces or brackets
+    comm = stat[stat.index(b"(") + 1:stat.rindex(b")")].decode("utf-8", "replace")
+    fields = stat[stat.rindex(b")") + 2:].split()
+    ppid = int(fields[1])
+    created = boot_time + int(fields[19]) / _CLOCK_TICKS
+    try:
+        exe = os.readlink(f"/proc/{pid}/exe")
+    except OSError:
+        exe = ""
+    # comm is truncated to 15 characters, the exe/cmdline name is not
+    name = os.path.basename(exe) if exe else ""
+    if not name:
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                argv0 = f.read().split(b"\0", 1)[0].decode("utf-8", "replace")
+            name = os.path.basename(argv0.replace("\\", "/"))
+        except OSError:
+            pass
+    return make_record(name or comm, pid, ppid, created, exe)
+
+
+def _proc_pids() -> Iterable[int]:
+    return (int(entry) for entry in os.listdir("/proc") if entry.isdigit())
+
+
+class ProcProcessSource(ProcessSource):
+    """ Reads /proc directly (Linux) """
+
+    incremental = True
+
+    def __init__(self):
+        super().__init__()
+        self._boot_time = _boot_time()
+
+
+    def snapshot(self) -> List[Dict]:
+        records = []
+        for pid in _proc_pids():
+            record = read_proc_record(pid, self._boot_time)
+            if record is not None:
+                records.append(record)
+        return records
+
+
+    def pids(self) -> Iterable[int]:
+        return _proc_pids()
+
+
+    def records(self, pids: Iterable[int]) -> List[Dict]:
+        records = []
+        for pid in pids:
+            record = read_proc_record(pid, self._boot_time)
+            if record is not None:
+                records.append(record)
+        return records
+
+
+# Linux proc connector constants (linux/connector.h, linux/cn_proc.h)
+NETLINK_CONNECTOR = 11
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+NLMSG_DONE = 3
+PROC_CN_MCAST_LISTEN = 1
+PROC_CN_MCAST_IGNORE = 2
+PROC_EVENT_EXEC = 0x00000002
+PROC_EVENT_EXIT = 0x80000000
+_NLMSGHDR = struct.Struct("=IHHII")
+_CN_MSG = struct.Struct("=IIIIHH")
+_PROC_EVENT = struct.Struct("=IIQ")
+_EXEC_EVENT = struct.Struct("=II")
+
+
+class ProcConnectorProcessSource(ProcessSource):
+    """
+    Event driven backend using the Linux proc connector.
+    The table is seeded once from /proc and then kept up to date
+    from exec/exit events, so find() is a dictionary lookup.
+    Needs CAP_NET_ADMIN (usually root).
+    """
+
+    event_driven = True
+
+    def __init__(self):
+        super().__init__()
+        self._boot_time = _boot_time()
+        self._table = {} # pid -> record
+        self._by_name = {} # name -> {pid: record}
+        self._table_lock = Lock()
+        self._is_running = False
+        self._thread = None
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+        try:
+            self._sock.bind((os.getpid(), CN_IDX_PROC))
+            self._send_control(PROC_CN_MCAST_LISTEN)
+            self._sock.settimeout(1.0)
+        except OSError:
+            self._sock.close()
+            raise
+
+
+    def _send_control(self, op: int) -> None:
+        payload = struct.pack("=I", op)
+        cn_msg = _CN_MSG.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(payload), 0) + payload
+        header = _NLMSGHDR.pack(_NLMSGHDR.size + len(cn_msg), NLMSG_DONE, 0, 0, os.getpid())
+        self._sock.send(header + cn_msg)
+
+
+    def start(self) -> None:
+        if self._is_running:
+            return
+        self._is_running = True
+        # Subscribe before seeding so nothing started in between is missed
+        for pid in _proc_pids():
+            self._add(pid)
+        self._thread = Thread(target=self._listen, daemon=True,
+                              name="MIMonitor Process Events")
+        self._thread.start()
+
+
+    def _add(self, pid: int) -> Optional[Dict]:
+        record = read_proc_record(pid, self._boot_time)
+        if record is None:
+            return None
+        with self._table_lock:
+            old = self._table.pop(pid, None)
+            if old is not None:
+                self._by_name.get(old["Name"], {}).pop(pid, None)
+            self._table[pid] = record
+            self._by_name.setdefault(record["Name"], {})[pid] = record
+        return record
+
+
+    def _remove(self, pid: int) -> Optional[Dict]:
+        with self._table_lock:
+            record = self._table.pop(pid, None)
+            if record is not None:
+                self._by_name.get(record["Name"], {}).pop(pid, None)
+        return record
+
+
+    def _listen(self) -> None:
+        offset = _NLMSGHDR.size + _CN_MSG.size
+        while self._is_running:
+            try:
+                data = self._sock.recv(4096)
+            except socket.timeout:
+                continue # lets close() end the loop
+            except OSError:
+                if self._is_running:
+                    print("[MI_Monitor] proc connector socket error", file=sys.stderr)
+                break
+            if len(data) < offset + _PROC_EVENT.size + _EXEC_EVENT.size:
+                continue
+            what = _PROC_EVENT.unpack_from(data, offset)[0]
+            pid, tgid = _EXEC_EVENT.unpack_from(data, offset + _PROC_EVENT.size)
+            if pid != tgid: # thread events
+                continue
+            if what == PROC_EVENT_EXEC:
+                record = self._add(tgid)
+                if record is not None:
+                    self._notify(EVENT_EXEC, record)
+            elif what == PROC_EVENT_EXIT:
+                record = self._remove(tgid)
+                if record is not None:
+                    self._notify(EVENT_EXIT, record)
+
+
+    def snapshot(self) -> List[Dict]:
+        with self._table_lock:
+            return list(self._table.values())
+
+
+    def find(self, name: str) -> List[Dict]:
+        with self._table_lock:
+            return list(self._by_name.get(name, {}).values())
+
+
+    def close(self) -> None:
+        self._is_running = False
+        try:
+            self._send_control(PROC_CN_MCAST_IGNORE)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+class FakeProcessSource(ProcessSource):
+    """ In-memory process table for tests """
+
+    event_driven = True
+    incremental = True
+
+    def __init__(self, records: Iterable[Dict] = ()):
+        super().__init__()
+        self._table = {record["ProcessId"]: record for record in records}
+        self._next_pid = max(self._table, default=1000) + 1
+        self._table_lock = Lock()
+        self.scans = 0
+
+
+    def spawn(self, name: str, exe: str = "", ppid: int = 0) -> Dict:
+        """
+        Adds a fake process and returns its record
+        """
+        with self._table_lock:
+            record = make_record(name, self._next_pid, ppid, time.time(), exe)
+            self._table[record["ProcessId"]] = record
+            self._next_pid += 1
+        self._notify(EVENT_EXEC, record)
+        return record
+
+
+    def kill(self, pid: int) -> None:
+        """
+        Removes a fake process
+        """
+        with self._table_lock:
+            record = self._table.pop(pid, None)
+        if record is not None:
+            self._notify(EVENT_EXIT, record)
+
+
+    def snapshot(self) -> List[Dict]:
+        with self._table_lock:
+            self.scans += 1
+            return list(self._table.values())
+
+
+    def pids(self) -> Iterable[int]:
+        with self._table_lock:
+            return list(self._table)
+
+
+    def records(self, pids: Iterable[int]) -> List[Dict]:
+        with self._table_lock:
+            return [self._table[pid] for pid in pids if pid in self._table]
+
+
+def make_process_source(backend: str = "auto") -> ProcessSource:
+    """
+    Creates the requested process backend.
+    "auto" falls back from the cheapest to the most portable one.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"[MI_Monitor] Unknown process backend '{backend}', use one of {BACKENDS}")
+    if backend == "wmic":
+        return WmicProcessSource()
+    if backend == "psutil":
+        return PsutilProcessSource()
+    if backend == "proc":
+        return ProcProcessSource()
+    if backend == "proc_connector":
+        return ProcConnectorProcessSource()
+    if backend == "fake":
+        return FakeProcessSource()
+    # auto
+    if sys.platform.startswith("linux"):
+        try:
+            return ProcConnectorProcessSource()
+        except (OSError, AttributeError):
+            return ProcProcessSource()
+    try:
+        return PsutilProcessSource()
+    except ImportError:
+        if sys.platform == "win32":
+            return WmicProcessSource()
+        raise
@@ -0,0 +1,338 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Recognition workers, one per audio input device.
+
+Every worker has its own audio ring buffer, Vosk recogniser and voice
+activity gate and decodes on its own thread, but all recognisers are
+built from the one Vosk model MIMonitor loaded, so another microphone
+adds a recogniser's decoding state, not another copy of the model.
+(Vosk releases the GIL while decoding, so the threads decode in
+parallel.)
+
+Blocks are decoded as soon as they arrive (by the worker's thread, or,
+under the asyncio runtime, by decode_available() on an executor thread
+when on_audio reports a new block); when the decoder falls
+behind, the blocks waiting are decoded together (up to max_batch
+frames) in one AcceptWaveform call, trading a little latency for less
+per call overhead until it has caught up.
+
+Recognised phrases go to MIMonitor as PhraseEvents; CommandMerger then
+drops a command another device already delivered a moment ago, so one
+phrase heard by two microphones starts MI once.
+'''
+import json
+import time
+from threading import Thread
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from audio_buffer import AudioRingBuffer
+from audio_source import AudioSource
+from metrics import REGISTRY
+from phrase_matcher import PhraseMatcher
+
+
+class PhraseEvent(NamedTuple):
+    """ Text a worker recognised """
+    device: str
+    text: str
+    position: float # seconds of this device's audio decoded when it was heard
+    heard_at: float # time.monotonic()
+
+
+class RecognitionWorker:
+    """ Audio buffer, recogniser and VAD of one input device """
+
+    def __init__(self, name: str, source: AudioSource, buffer_settings: Dict,
+                 matcher: Callable[[], PhraseMatcher], on_phrase: Callable[[PhraseEvent], None],
+                 fast_partials: bool = False, max_batch_ms: float = 400.0):
+        """
+        name - device name used in logs and metric labels
+        matcher - returns the current phrase matcher (fast partials)
+        on_phrase - called on the worker thread for every recognised phrase
+        max_batch_ms - most audio decoded in one call while catching up
+        """
+        self.name = name
+        self.source = source
+        self.samplerate = source.samplerate
+        self.blocksize = source.blocksize # frames per audio block
+        buffer_settings = dict(buffer_settings)
+        if not source.realtime:
+            # Faster than real time sources must not lose blocks
+            buffer_settings.update(policy="block", block_timeout=None)
+        self.buffer = AudioRingBuffer(block_frames=self.blocksize, **buffer_settings)
+        self.fast_partials = fast_partials
+        self.max_batch = max(self.blocksize, int(self.samplerate * max_batch_ms / 1000)) # frames
+        self.batches = 0 # decoder calls
+        self.recogniser = None
+        self.vad = None
+        self._replacement = None # (recogniser, vad) picked up between blocks
+        self._matcher = matcher
+        self._on_phrase = on_phrase
+        self._partial_words_fired = 0 # words of the current utterance already acted on
+        self.frames = 0 # frames decoded so far
+        self.phrases = 0
+        self.on_audio = None # Optional[Callable[[RecognitionWorker], None]], audio thread, per block
+        self._running = False
+        self._driven = False # decoded by decode_available() instead of the thread
+        self._finished = False
+        self._thread = Thread(target=self._run, daemon=True, name=f"MIMonitor Recogniser {name}")
+        self._register_metrics()
+
+
+    def _register_metrics(self) -> None:
+        labels = {"device": self.name}
+        self._accept_seconds = REGISTRY.histogram("mimonitor_accept_waveform_seconds",
+                                                  "Vosk AcceptWaveform time per decoder call", labels)
+        self._phrase_counter = REGISTRY.counter("mimonitor_device_phrases_total",
+                                                "Phrases recognised per input device", labels)
+        for key, name, kind, help_text in (
+                ("depth", "mimonitor_audio_queue_depth", "gauge", "Audio blocks waiting for the recogniser"),
+                ("high_water", "mimonitor_audio_queue_high_water", "gauge", "Most audio blocks ever waiting"),
+                ("overruns", "mimonitor_audio_overruns_total", "counter",
+                 "Audio blocks dropped because the queue was full")):
+            getattr(REGISTRY, kind)(name, help_text, labels).set_function(
+                lambda key=key: self.buffer.stats()[key])
+        for key in ("forwarded", "dropped"):
+            REGISTRY.counter("mimonitor_vad_blocks_total", "Audio blocks seen by the voice activity gate",
+                             dict(labels, result=key)).set_function(lambda key=key: self.vad_stats().get(key, 0))
+
+
+    def replace(self, recogniser, vad) -> None:
+        """
+        Swaps in a new recogniser and VAD (e.g. after a config reload),
+        applied by the decoder (thread or decode_available()) before its
+        next block, or right away if the worker is not decoding
+        """
+        if self._running or self.is_alive():
+            self._replacement = (recogniser, vad)
+            if not self._finished:
+                return
+            # decoding ended meanwhile, nothing will pick it up
+        self._replacement = None
+        self.recogniser, self.vad = recogniser, vad
+
+
+    def start(self, decode_thread: bool = True) -> None:
+        """
+        Starts decoding, then the audio input.
+        decode_thread=False leaves the decoding to decode_available()
+        """
+        self._running = True
+        self._driven = not decode_thread
+        if decode_thread:
+            self._thread.start()
+        self.source.start(self._callback)
+
+
+    def _callback(self, indata, frames: int, time, status) -> None:
+        """
+        Called (from the audio thread) for each audio block
+        """
+        if status:
+            print(f"{self.name}: {status}")
+        if self._running:
+            self.buffer.put(indata)
+            if self.on_audio is not None:
+                self.on_audio(self)
+
+
+    def _run(self) -> None:
+        """
+        Decodes blocks until the buffer is closed and drained
+        """
+        try:
+            while self._decode_next(self.buffer.get()): # memoryview into the ring, no copy
+                pass
+        except Exception as e:
+            self._finished = True
+            print(f"[MI_Monitor] recognition on {self.name} stopped: {e}")
+
+
+    def decode_available(self) -> bool:
+        """
+        Decodes the blocks buffered so far without waiting (when started
+        with decode_thread=False), False once the audio ended
+        """
+        if self._finished:
+            return False
+        try:
+            while self.buffer.depth() or self.buffer.is_closed():
+                if not self._decode_next(self.buffer.get(0)):
+                    return False
+        except Exception as e:
+            self._finished = True
+            print(f"[MI_Monitor] recognition on {self.name} stopped: {e}")
+            return False
+        return True
+
+
+    def _decode_next(self, audio) -> bool:
+        """
+        Decodes one block (None = closed and drained: delivers
+        whatever was still pending), False once the audio ended
+        """
+        if self._replacement is not None:
+            (self.recogniser, self.vad), self._replacement = self._replacement, None
+            self._partial_words_fired = 0
+        if audio is None:
+            text = self._final_result(self.recogniser.FinalResult())
+            if text not in ("", "[unk]"):
+                self._emit(text)
+            self._finished = True
+            return False
+        for text in self._decode(audio):
+            if text not in ("", "[unk]"):
+                self._emit(text)
+        return True
+
+
+    def _decode(self, audio) -> List[str]:
+        """
+        Feeds the block (and, when behind, the blocks waiting after it)
+        to the recogniser, returns the recognised texts
+        """
+        texts = []
+        speech = [] # bytes for the decoder
+        batched = 0
+        while True:
+            frames = len(audio) // 2
+            self.frames += frames
+            batched += frames
+            if self.vad is None:
+                speech.append(bytes(audio))
+            else:
+                # Only speech (with pre-roll and hangover) reaches the decoder
+                blocks = self.vad.process(audio)
+                if self.vad.consume_reset():
+                    # Long silence, flush whatever is pending and start clean
+                    texts.append(self._accept(speech))
+                    speech = []
+                    texts.append(self._final_result(self.recogniser.FinalResult()))
+                # copied now, the ring slot is reused after the next get()
+                speech.extend(bytes(block) for block in blocks)
+            if batched >= self.max_batch or self.buffer.depth() == 0:
+                break
+            audio = self.buffer.get(0)
+            if audio is None:
+                break
+        texts.append(self._accept(speech))
+        return texts
+
+
+    def _accept(self, speech: List[bytes]) -> str:
+        """
+        One decoder call, returns the recognised text ("" if none yet)
+        """
+        if not speech:
+            return ""
+        started = time.perf_counter()
+        is_final = self.recogniser.AcceptWaveform(speech[0] if len(speech) == 1 else b"".join(speech))
+        self._accept_seconds.observe(time.perf_counter() - started)
+        self.batches += 1
+        if is_final:
+            return self._final_result(self.recogniser.Result())
+        if self.fast_partials:
+            # Act as soon as a partial hypothesis holds a whole trigger phrase
+            # instead of waiting for the endpoint silence
+            return self._partial_result(self.recogniser.PartialResult())
+        return ""
+
+
+    def _partial_result(self, result: str) -> str:
+        """
+        Returns the part of the partial hypothesis not acted on yet,
+        only if it contains a complete trigger phrase
+        """
+        words = json.loads(result).get("partial", "").split()
+        new_text = " ".join(words[self._partial_words_fired:])
+        if not self._matcher().has_match(new_text):
+            return ""
+        self._partial_words_fired = len(words)
+        return new_text
+
+
+    def _final_result(self, result: str) -> str:
+        """
+        Returns the final result without the words
+        already acted on from partial hypotheses
+        """
+        words = json.loads(result).get("text", "").split()
+        words, self._partial_words_fired = words[self._partial_words_fired:], 0
+        return " ".join(words)
+
+
+    def _emit(self, text: str) -> None:
+        self.phrases += 1
+        self._phrase_counter.inc()
+        self._on_phrase(PhraseEvent(self.name, text, self.position(), time.monotonic()))
+
+
+    def position(self) -> float:
+        """
+        Seconds of audio decoded so far
+        """
+        return self.frames / self.samplerate
+
+
+    def is_alive(self) -> bool:
+        """
+        True until the audio ended and was fully decoded
+        """
+        if self._driven:
+            return not self._finished
+        return self._thread.is_alive()
+
+
+    def vad_stats(self) -> Dict[str, int]:
+        vad = self.vad
+        return {} if vad is None else vad.stats()
+
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Buffer, VAD and phrase counters of this device
+        """
+        return {"audio_buffer": self.buffer.stats(), "vad": self.vad_stats(),
+                "phrases": self.phrases, "audio_seconds": self.position(),
+                "decoder_calls": self.batches, "samplerate": self.samplerate}
+
+
+    def stop(self, timeout: Optional[float] = 2.0) -> None:
+        """
+        Stops the audio input, the worker drains the buffer and ends
+        """
+        self._running = False
+        self.buffer.close()
+        try:
+            self.source.stop()
+        finally:
+            if self._thread.is_alive():
+                self._thread.join(timeout)
+
+
+class CommandMerger:
+    """ Merges the commands of all devices into one stream """
+
+    def __init__(self, window: float = 1.0):
+        """
+        window - seconds within which the same command from
+        another device counts as the same spoken phrase
+        """
+        self.window = window
+        self._last = {} # action -> (device, heard_at)
+
+
+    def accept(self, action, device: str, heard_at: float) -> bool:
+        """
+        False if another device delivered action less than window seconds
+        earlier (a phrase repeated on the same device always goes through)
+        """
+        last = self._last.get(action)
+        duplicate = (last is not None and last[0] != device
+                     and abs(heard_at - last[1]) < self.window)
+        REGISTRY.counter("mimonitor_device_commands_total", "Commands per input device, after merging",
+                         {"device": device, "result": "duplicate" if duplicate else "accepted"}).inc()
+        if not duplicate:
+            self._last[action] = (device, heard_at)
+        return not duplicate
@@ -0,0 +1,146 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Capture side resampling to the model's native sample rate.
+
+Input devices usually record at 44.1 or 48 kHz while the Vosk models
+are trained on 16 kHz audio. Fed at the device rate, Kaldi downsamples
+internally (--allow-downsample) on up to three times as many samples.
+ResampledSource converts every captured block to the model rate first,
+so the recogniser and the VAD only ever see 16 kHz audio.
+
+PolyphaseResampler is a streaming rational (up/down) resampler: one
+Kaiser windowed sinc low-pass split into `up` polyphase filters, so
+each output sample costs ~2 * zero_crossings * max(1, down/up)
+multiply-adds. A block is done in one vectorised NumPy pass (gather
+the input windows, one einsum), the last input samples are carried
+over to the next block, so block boundaries are seamless. The added
+delay is half the filter, about a millisecond with the defaults.
+'''
+import os
+from math import ceil, gcd
+from typing import Callable, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from audio_source import AudioSource
+
+DEFAULT_MODEL_SAMPLERATE = 16000
+
+
+def model_samplerate(model_path: str, default: int = DEFAULT_MODEL_SAMPLERATE) -> int:
+    """
+    Sample rate the Vosk model was trained on (conf/mfcc.conf)
+    """
+    try:
+        with open(os.path.join(model_path, "conf", "mfcc.conf"), "r") as f:
+            for line in f:
+                if line.startswith("--sample-frequency="):
+                    return int(float(line.split("=", 1)[1]))
+    except (OSError, ValueError):
+        pass
+    return default
+
+
+class PolyphaseResampler:
+    """ Streaming int16 resampler from in_rate to out_rate """
+
+    def __init__(self, in_rate: int, out_rate: int = DEFAULT_MODEL_SAMPLERATE,
+                 zero_crossings: int = 16, beta: float = 8.0, rolloff: float = 0.95):
+        """
+        zero_crossings - sinc zero crossings on each side (filter quality)
+        beta - Kaiser window shape (stop band attenuation)
+        rolloff - pass band edge as a fraction of the lower Nyquist frequency
+        """
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        divisor = gcd(in_rate, out_rate)
+        self.up = out_rate // divisor
+        self.down = in_rate // divisor
+        # Prototype low-pass at the upsampled rate (in_rate * up)
+        ratio = max(self.up, self.down)
+        cutoff = rolloff / (2 * ratio) # cycles per upsampled sample
+        length = 2 * zero_crossings * ratio + 1
+        n = np.arange(length) - (length - 1) / 2
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta)
+        prototype *= self.up / prototype.sum() # unity gain after upsampling
+        # Split into `up` phases of taps taps each, reversed to line up with input windows
+        self.taps = ceil(length / self.up)
+        padded = np.zeros(self.taps * self.up)
+        padded[:length] = prototype
+        self._phases = padded.reshape(self.taps, self.up).T[:, ::-1].astype(np.float32)
+        self.delay = (length - 1) / 2 / (in_rate * self.up) # seconds
+        self.reset()
+
+
+    def reset(self) -> None:
+        """
+        Forgets the carried over input (a new stream)
+        """
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._consumed = 0 # input samples seen
+        self._produced = 0 # output samples made
+
+
+    def max_output(self, in_frames: int) -> int:
+        """
+        Most output frames one block of in_frames can produce
+        """
+        return -(-in_frames * self.up // self.down) + 1
+
+
+    def process(self, block) -> np.ndarray:
+        """
+        Resamples one block (any buffer of int16 samples), returns int16
+        """
+        samples = np.frombuffer(block, dtype=np.int16)
+        if self.up == self.down:
+            return samples
+        signal = np.concatenate((self._history, samples.astype(np.float32)))
+        consumed = self._consumed + len(samples)
+        # every output whose newest input sample has arrived
+        end = -(-consumed * self.up // self.down)
+        outputs = np.arange(self._produced, end, dtype=np.int64)
+        position = outputs * self.down
+        newest = position // self.up # input sample aligned with the output
+        phase = position - newest * self.up
+        windows = sliding_window_view(signal, self.taps)[newest - self._consumed]
+        out = np.einsum("ij,ij->i", windows, self._phases[phase])
+        self._history = signal[len(signal) - (self.taps - 1):]
+        self._consumed = consumed
+        self._produced = end
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+
+
+class ResampledSource(AudioSource):
+    """ Wraps an audio source, delivering its blocks at another sample rate """
+
+    def __init__(self, source: AudioSource, samplerate: int = DEFAULT_MODEL_SAMPLERATE, **resampler_args):
+        self.source = source
+        self.resampler = PolyphaseResampler(source.samplerate, samplerate, **resampler_args)
+        super().__init__(samplerate, self.resampler.max_output(source.blocksize))
+        self.realtime = source.realtime
+        self.name = getattr(source, "name", "audio")
+        self.capture_samplerate = source.samplerate
+
+
+    def start(self, callback: Callable) -> None:
+        self.resampler.reset()
+        def resampled(indata, frames: int, time, status) -> None:
+            out = self.resampler.process(indata)
+            callback(out, len(out), time, status)
+        self.source.start(resampled)
+
+
+    def stop(self) -> None:
+        self.source.stop()
+
+
+def resample_source(source: AudioSource, samplerate: Optional[int]) -> AudioSource:
+    """
+    source at samplerate (unchanged if it already is, or samplerate is None)
+    """
+    if samplerate is None or source.samplerate == samplerate:
+        return source
+    return ResampledSource(source, samplerate)
@@ -0,0 +1,374 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Resource sampling and health policies for the supervised MI instances.
+
+Knowing that MI exists says nothing about whether it still works.
+ResourceSampler reads CPU time, resident memory, thread count and I/O
+counters of the supervised MI PIDs only (never the whole process table)
+every interval seconds, into one fixed size ring per PID: an array.array
+per field, so memory stays constant however long MI runs.
+
+Readers (like the process backends):
+- psutil - Process.oneshot() (cpu_times, memory_info, num_threads,
+           io_counters and status in one go)
+- proc   - /proc/<pid>/stat and /proc/<pid>/io (Linux, no psutil)
+
+ResourcePolicy checks the rings after every sample:
+- "hang"    - below hang_cpu % CPU for hang_seconds while the process
+              looks stuck: its window is not responding (Windows), the OS
+              reports it stopped, or it did no I/O at all meanwhile
+- "memory"  - resident memory above memory_limit_mb
+- "cpu"     - above cpu_limit % (of one core) on average for cpu_seconds
+A violation is counted and printed ("flag") and, with action "restart",
+the mode's supervisor restarts MI. It fires once per PID and reason.
+
+One sample costs a few file reads/syscalls per MI PID, so the sampler
+stays far below 1% of a core (see mimonitor_resource_sample_seconds).
+'''
+import os
+import sys
+import time
+from array import array
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from metrics import REGISTRY
+from waiter import window_hung
+
+FIELDS = ("time", "cpu_percent", "rss", "threads", "read_bytes", "write_bytes")
+REASONS = ("hang", "memory", "cpu")
+ACTIONS = ("flag", "restart")
+STUCK_STATUSES = ("stopped", "zombie", "disk-sleep")
+POLICY_KEYS = ("hang_seconds", "hang_cpu", "memory_limit_mb", "cpu_limit", "cpu_seconds", "action")
+
+SAMPLE_SECONDS = REGISTRY.histogram("mimonitor_resource_sample_seconds",
+                                    "Time taken by one resource sample of all MI instances")
+
+# (cpu seconds, rss bytes, threads, read bytes, write bytes, status)
+Reading = Tuple[float, float, float, float, float, str]
+
+
+class ResourceRing:
+    """ Fixed size ring of samples, one array per field """
+
+    def __init__(self, capacity: int = 600):
+        self.capacity = capacity
+        self._columns = {field: array("d", bytes(8 * capacity)) for field in FIELDS}
+        self._next = 0 # slot the next sample goes to
+        self._count = 0
+
+
+    def append(self, *values: float) -> None:
+        """
+        Stores one sample (values in FIELDS order), overwriting the oldest
+        """
+        for field, value in zip(FIELDS, values):
+            self._columns[field][self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+
+    def __len__(self) -> int:
+        return self._count
+
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        if not self._count:
+            return None
+        slot = self._next - 1
+        return {field: column[slot] for field, column in self._columns.items()}
+
+
+    def series(self, field: str, seconds: Optional[float] = None) -> List[float]:
+        """
+        Values of field, oldest first (only the last seconds if given)
+        """
+        start = (self._next - self._count) % self.capacity
+        slots = [(start + i) % self.capacity for i in range(self._count)]
+        if seconds is not None and slots:
+            since = self._columns["time"][slots[-1]] - seconds
+            times = self._columns["time"]
+            slots = [slot for slot in slots if times[slot] >= since]
+        column = self._columns[field]
+        return [column[slot] for slot in slots]
+
+
+    def covers(self, seconds: float) -> bool:
+        """
+        True if the ring holds at least seconds of samples
+        """
+        times = self.series("time")
+        return bool(times) and times[-1] - times[0] >= seconds
+
+
+def _psutil_reader() -> Optional[Callable[[int], Optional[Reading]]]:
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    def read(pid: int) -> Optional[Reading]:
+        try:
+            process = psutil.Process(pid)
+            with process.oneshot():
+                cpu = process.cpu_times()
+                try:
+                    io = process.io_counters()
+                    read_bytes, write_bytes = io.read_bytes, io.write_bytes
+                except (psutil.AccessDenied, AttributeError):
+                    read_bytes = write_bytes = 0
+                return (cpu.user + cpu.system, process.memory_info().rss, process.num_threads(),
+                        read_bytes, write_bytes, process.status())
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+    return read
+
+
+_PROC_STATUSES = {"R": "running", "S": "sleeping", "D": "disk-sleep", "T": "stopped",
+                  "t": "stopped", "Z": "zombie", "X": "dead", "I": "idle"}
+
+
+def _proc_reader() -> Optional[Callable[[int], Optional[Reading]]]:
+    if not os.path.isdir("/proc/self"):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def read(pid: int) -> Optional[Reading]:
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            return None
+        # the name (field 2) can hold spaces, the rest starts after its ")"
+        fields = stat[stat.rfind(b")") + 2:].split()
+        read_bytes = write_bytes = 0
+        try:
+            with open(f"/proc/{pid}/io", "rb") as f:
+                for line in f:
+                    if line.startswith(b"rchar:"):
+                        read_bytes = int(line[6:])
+                    elif line.startswith(b"wchar:"):
+                        write_bytes = int(line[6:])
+        except OSError:
+            pass # another user's process
+        return ((int(fields[11]) + int(fields[12])) / ticks, int(fields[21]) * page_size, int(fields[17]),
+                read_bytes, write_bytes, _PROC_STATUSES.get(fields[0].decode(), "unknown"))
+    return read
+
+
+def make_reader() -> Optional[Callable[[int], Optional[Reading]]]:
+    """
+    The cheapest reader available, None if there is none
+    """
+    return _psutil_reader() or (_proc_reader() if sys.platform.startswith("linux") else None)
+
+
+class ResourcePolicy:
+    """ Decides when a sampled MI instance is hung or out of bounds """
+
+    def __init__(self, hang_seconds: float = 30.0, hang_cpu: float = 0.5, memory_limit_mb: float = 0.0,
+                 cpu_limit: float = 0.0, cpu_seconds: float = 30.0, action: str = "flag"):
+        """
+        memory_limit_mb, cpu_limit, hang_seconds - 0 turns that check off
+        action - "flag" (count and print) or "restart"
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"[MI_Monitor] resources action must be one of {ACTIONS}")
+        self.hang_seconds = hang_seconds
+        self.hang_cpu = hang_cpu
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.cpu_limit = cpu_limit
+        self.cpu_seconds = cpu_seconds
+        self.action = action
+
+
+    @classmethod
+    def from_settings(cls, settings: Mapping) -> "ResourcePolicy":
+        """
+        Builds the policy from config "resources" (sampler keys are ignored)
+        """
+        return cls(**{key: value for key, value in settings.items() if key in POLICY_KEYS})
+
+
+    def check(self, ring: ResourceRing, status: str,
+              is_hung: Callable[[], Optional[bool]] = lambda: None) -> List[str]:
+        """
+        The reasons (see REASONS) ring breaks the policy, [] if it is healthy.
+        status - OS status of the process, is_hung - whether its window is
+        not responding (only asked once the CPU use looks like a hang)
+        """
+        latest = ring.latest()
+        if latest is None:
+            return []
+        reasons = []
+        if self.hang_seconds and ring.covers(self.hang_seconds):
+            if max(ring.series("cpu_percent", self.hang_seconds)) <= self.hang_cpu and (
+                    status in STUCK_STATUSES or is_hung() or self._no_io(ring)):
+                reasons.append("hang")
+        if self.memory_limit and latest["rss"] > self.memory_limit:
+            reasons.append("memory")
+        if self.cpu_limit and ring.covers(self.cpu_seconds):
+            cpu = ring.series("cpu_percent", self.cpu_seconds)
+            if sum(cpu) / len(cpu) > self.cpu_limit:
+                reasons.append("cpu")
+        return reasons
+
+
+    def _no_io(self, ring: ResourceRing) -> bool:
+        reads = ring.series("read_bytes", self.hang_seconds)
+        writes = ring.series("write_bytes", self.hang_seconds)
+        return reads[0] == reads[-1] and writes[0] == writes[-1]
+
+
+class ResourceSampler:
+    """ Samples the supervised MI PIDs on its own thread """
+
+    def __init__(self, pids: Callable[[], Dict[str, List[int]]],
+                 on_violation: Callable[[str, int, str, str], None],
+                 policy: Optional[ResourcePolicy] = None, interval: float = 1.0, capacity: int = 600,
+                 reader: Optional[Callable[[int], Optional[Reading]]] = None):
+        """
+        pids - returns {mode: PIDs} of the MI instances to watch
+        on_violation(mode, pid, reason, action) - called on the sampler thread
+        reader - reads one PID (make_reader() by default)
+        """
+        self._pids = pids
+        self._on_violation = on_violation
+        self.policy = policy or ResourcePolicy()
+        self.interval = interval
+        self.capacity = capacity
+        self._reader = reader or make_reader()
+        self._lock = Lock() # guards the rings for readers on other threads
+        self._rings = {} # pid -> ResourceRing
+        self._previous = {} # pid -> (monotonic time, cpu seconds)
+        self._modes = {} # pid -> mode
+        self._flagged = set() # (pid, reason) already reported
+        self._metric_modes = set()
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, daemon=True, name="MIMonitor Resource Sampler")
+        self.samples = 0
+
+
+    def available(self) -> bool:
+        return self._reader is not None
+
+
+    def start(self) -> None:
+        if self._reader is None:
+            print("[MI_Monitor] resource sampling needs psutil (or /proc), it is off")
+            return
+        self._thread.start()
+
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"[MI_Monitor] resource sample failed: {e}")
+
+
+    def sample(self) -> None:
+        """
+        Reads every watched PID once and applies the policy
+        """
+        started = time.perf_counter()
+        now = time.monotonic()
+        watched = {pid: mode for mode, pids in self._pids().items() for pid in pids}
+        violations = []
+        with self._lock:
+            for pid in list(self._rings):
+                if pid not in watched:
+                    self._forget(pid)
+            for pid, mode in watched.items():
+                reading = self._reader(pid)
+                if reading is None:
+                    self._forget(pid) # gone, or not ours to read
+                    continue
+                violations += [(mode, pid, reason) for reason in self._add(pid, mode, now, reading)]
+            self.samples += 1
+        SAMPLE_SECONDS.observe(time.perf_counter() - started)
+        for mode, pid, reason in violations:
+            REGISTRY.counter("mimonitor_resource_violations_total", "MI instances found hung or out of bounds",
+                             {"mode": mode, "reason": reason, "action": self.policy.action}).inc()
+            self._on_violation(mode, pid, reason, self.policy.action)
+
+
+    def _add(self, pid: int, mode: str, now: float, reading: Reading) -> List[str]:
+        """
+        Stores a reading, returns the policy violations of pid not reported yet
+        """
+        cpu_seconds, rss, threads, read_bytes, write_bytes, status = reading
+        ring = self._rings.get(pid)
+        if ring is None:
+            ring = self._rings[pid] = ResourceRing(self.capacity)
+            self._modes[pid] = mode
+            if mode not in self._metric_modes:
+                self._metric_modes.add(mode)
+                self._register_metrics(mode)
+        previous = self._previous.get(pid)
+        self._previous[pid] = (now, cpu_seconds)
+        if previous is None:
+            return [] # CPU % needs two readings
+        elapsed = max(now - previous[0], 1e-9)
+        ring.append(now, (cpu_seconds - previous[1]) / elapsed * 100, rss, threads, read_bytes, write_bytes)
+        reasons = [reason for reason in self.policy.check(ring, status, lambda: window_hung(pid))
+                   if (pid, reason) not in self._flagged]
+        self._flagged.update((pid, reason) for reason in reasons)
+        return reasons
+
+
+    def _forget(self, pid: int) -> None:
+        self._rings.pop(pid, None)
+        self._previous.pop(pid, None)
+        self._modes.pop(pid, None)
+        self._flagged = {(p, reason) for p, reason in self._flagged if p != pid}
+
+
+    def _register_metrics(self, mode: str) -> None:
+        labels = {"mode": mode}
+        for field, name, help_text in (("cpu_percent", "mimonitor_mi_cpu_percent", "MI CPU use, % of one core"),
+                                       ("rss", "mimonitor_mi_resident_bytes", "MI resident memory"),
+                                       ("threads", "mimonitor_mi_threads", "MI threads")):
+            REGISTRY.gauge(name, help_text, labels).set_function(
+                lambda field=field: self.latest(mode).get(field, 0.0))
+
+
+    def latest(self, mode: str) -> Dict[str, float]:
+        """
+        Latest sample of mode's MI, summed over its instances
+        """
+        total = {}
+        with self._lock:
+            for pid, ring in self._rings.items():
+                latest = ring.latest() if self._modes.get(pid) == mode else None
+                for field, value in (latest or {}).items():
+                    if field != "time":
+                        total[field] = total.get(field, 0.0) + value
+        return total
+
+
+    def history(self, pid: int, field: str, seconds: Optional[float] = None) -> List[float]:
+        """
+        Sampled values of field for pid, oldest first
+        """
+        with self._lock:
+            ring = self._rings.get(pid)
+            return [] if ring is None else ring.series(field, seconds)
+
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Latest sample per watched PID
+        """
+        with self._lock:
+            return {str(pid): dict(ring.latest() or {}, mode=self._modes.get(pid))
+                    for pid, ring in self._rings.items()}
+
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
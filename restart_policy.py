@@ -0,0 +1,101 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Crash restart policy for one MI mode.
+
+After an unexpected MI exit the supervisor asks next_delay() how long to
+wait before starting MI again. The delay grows exponentially with the
+number of crashes in a row (initial * factor ** n, capped at max_delay);
+a run that lasted stable_after seconds resets the streak.
+If max_crashes crashes happen within window seconds the circuit breaker
+opens and MI is no longer restarted automatically until reset()
+(a manual "start" command).
+
+So recovery after a crash takes at most: exit detection (immediate,
+see ProcessController.watch) + max_delay + the mode's start_timeout.
+
+Which exits are crashes (restart_on):
+- "crash"            - a non-zero exit code
+- "crash_or_unknown" - also an exit whose code is unknown
+- "any"              - every exit MIMonitor did not ask for
+The exit code is unknown for an MI instance MIMonitor did not launch
+itself (it was already running, or was started by hand) on Linux and
+macOS: only the parent of a process can read its exit code. With
+"crash" such an instance is not restarted after it crashes, since that
+cannot be told apart from the user closing it; "crash_or_unknown"
+restarts it in both cases. On Windows the code is read from a process
+handle, so "crash" works for every instance.
+'''
+import time
+from collections import deque
+from typing import Mapping, Optional
+
+RESTART_ON = ("crash", "crash_or_unknown", "any")
+
+
+class RestartPolicy:
+    """ Exponential backoff and crash-loop circuit breaker """
+
+    def __init__(self, restart: bool = True, restart_on: str = "crash", initial: float = 1.0,
+                 factor: float = 2.0, max_delay: float = 30.0, max_crashes: int = 5,
+                 window: float = 120.0, stable_after: float = 60.0):
+        self.restart = restart
+        self.restart_on = restart_on
+        self._initial = initial
+        self._factor = factor
+        self._max_delay = max_delay
+        self._max_crashes = max_crashes
+        self._window = window
+        self._stable_after = stable_after
+        self._crashes = deque() # monotonic times of recent crashes
+        self._streak = 0 # crashes in a row without a stable run
+        self.breaker_open = False
+
+
+    @classmethod
+    def from_settings(cls, settings: Mapping) -> "RestartPolicy":
+        """
+        Builds the policy from a mode's "crash_policy" config
+        """
+        return cls(**settings)
+
+
+    def is_crash(self, exit_code: Optional[int]) -> bool:
+        """
+        True if an unexpected exit with exit_code counts as a crash.
+        An unknown exit code (None: an MI the monitor did not launch)
+        is one only with "crash_or_unknown" (or "any")
+        """
+        if self.restart_on == "any":
+            return True
+        if exit_code is None:
+            return self.restart_on == "crash_or_unknown"
+        return exit_code != 0
+
+
+    def next_delay(self, uptime: Optional[float]) -> Optional[float]:
+        """
+        Records a crash after uptime seconds of running, returns the delay
+        before restarting, None if MI must not be restarted
+        """
+        now = time.monotonic()
+        self._crashes.append(now)
+        while self._crashes and now - self._crashes[0] > self._window:
+            self._crashes.popleft()
+        if uptime is not None and uptime >= self._stable_after:
+            self._streak = 0
+        self._streak += 1
+        if len(self._crashes) >= self._max_crashes:
+            self.breaker_open = True
+        if not self.restart or self.breaker_open:
+            return None
+        return min(self._initial * self._factor ** (self._streak - 1), self._max_delay)
+
+
+    def reset(self) -> None:
+        """
+        Closes the circuit breaker and forgets the crash streak
+        """
+        self._crashes.clear()
+        self._streak = 0
+        self.breaker_open = False
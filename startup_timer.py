@@ -0,0 +1,77 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Startup timing report.
+
+STARTUP is created when this module is first imported (it is the first
+import in MI_monitor.py), so every mark is measured from (close to) launch.
+Imports and init stages are wrapped in STARTUP.timed(...) and one-off
+milestones ("first duplicate check", "first command") use mark_once().
+'''
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import List, Tuple
+
+
+class StartupTimer:
+    """ Records durations of startup stages and milestones since launch """
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._lock = Lock()
+        self._stages = [] # (name, seconds since launch at the end, duration)
+        self._marks = set()
+
+
+    @contextmanager
+    def timed(self, stage: str):
+        """
+        Times the wrapped block as one stage
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended = time.perf_counter()
+            with self._lock:
+                self._stages.append((stage, ended - self._started, ended - started))
+
+
+    def mark(self, milestone: str) -> None:
+        """
+        Records a milestone (no duration)
+        """
+        now = time.perf_counter()
+        with self._lock:
+            self._stages.append((milestone, now - self._started, 0.0))
+
+
+    def mark_once(self, milestone: str) -> None:
+        """
+        Records a milestone only the first time it happens
+        """
+        with self._lock:
+            if milestone in self._marks:
+                return
+            self._marks.add(milestone)
+        self.mark(milestone)
+
+
+    def stages(self) -> List[Tuple[str, float, float]]:
+        with self._lock:
+            return list(self._stages)
+
+
+    def report(self) -> str:
+        """
+        Human readable table of all stages so far
+        """
+        lines = [f"{'stage':<36} {'at (ms)':>10} {'took (ms)':>10}"]
+        for stage, at, duration in sorted(self.stages(), key=lambda s: s[1]):
+            took = f"{duration * 1000:10.1f}" if duration else f"{'':>10}"
+            lines.append(f"{stage:<36} {at * 1000:10.1f} {took}")
+        return "\n".join(lines)
+
+
+STARTUP = StartupTimer()
@@ -0,0 +1,292 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Memory-mapped status mailbox between MIMonitor and external tools
+(e.g. MITracker).
+
+MIMonitor writes its status into a small fixed layout file, mapped into
+memory; any number of readers (of the same user, the file is 0600) map
+the same file and poll it without locks and without talking to the
+monitor. The default file is in a folder only this user can use
+($XDG_RUNTIME_DIR, or mi_monitor-<uid> in the temp folder, 0700); the
+writer never follows a symlink and refuses a file owned by someone else. A sequence lock keeps reads
+consistent: the writer makes the sequence number odd, writes, and makes
+it even again; a reader retries if the number was odd or changed while
+it copied the data.
+
+Layout (little endian):
+    header  magic "MIMS", version, mode slots, sequence number
+    monitor updated_at, started_at, monitor pid (0 once stopped),
+            voice ready, modes used, current mode
+    mode    name, state, last command, first MI pid (0 = none),
+    (slots) instances, last command ok (-1 = none yet), state since,
+            last command at, commands, launches, kills, crashes,
+            recoveries, duplicates closed
+
+Reading from Python:
+    reader = StatusReader()          # or read_status() for one read
+    status = reader.read()           # {"current_mode": ..., "modes": [...]}
+From the command line:
+    python status_mailbox.py [--watch SECONDS] [path]
+'''
+import argparse
+import mmap
+import os
+import stat
+import struct
+import sys
+import tempfile
+import time
+from threading import Lock
+from typing import Dict, List, Optional
+
+MAGIC = b"MIMS"
+VERSION = 1
+DEFAULT_SLOTS = 8
+
+
+def _user_folder() -> str:
+    """
+    Folder of the default status file, private to this user
+    """
+    if sys.platform == "win32":
+        return tempfile.gettempdir() # already per user
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and os.path.isdir(runtime):
+        return runtime
+    return os.path.join(tempfile.gettempdir(), f"mi_monitor-{os.getuid()}")
+
+
+DEFAULT_PATH = os.path.join(_user_folder(), "mi_monitor_status.bin")
+
+_HEADER = struct.Struct("<4sHHQ") # magic, version, slots, sequence
+_SEQUENCE = struct.Struct("<Q")
+_SEQUENCE_OFFSET = 8
+_MONITOR = struct.Struct("<ddiBB2x32s")
+_MODE = struct.Struct("<32s16s16siHbxddIIIIII")
+_COUNTERS = ("commands", "launches", "kills", "crashes", "recoveries", "duplicates_closed")
+
+
+def _size(slots: int) -> int:
+    return _HEADER.size + _MONITOR.size + _MODE.size * slots
+
+
+def _text(raw: bytes) -> str:
+    return raw.rstrip(b"\0").decode("utf-8", "replace")
+
+
+def _make_private_folder(folder: str) -> None:
+    """
+    Creates folder (0700) unless it exists, and makes sure it is a real
+    folder of this user that nobody else can use
+    """
+    try:
+        os.mkdir(folder, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(folder)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"[MI_Monitor] {folder} - is not a private folder of this user")
+
+
+def _open_private(path: str) -> int:
+    """
+    Opens (creating it 0600) the status file for writing, never through
+    a symlink and only if it is a regular file of this user
+    """
+    if sys.platform == "win32":
+        return os.open(path, os.O_RDWR | os.O_CREAT | os.O_BINARY, 0o600)
+    if os.path.dirname(path) == _user_folder():
+        _make_private_folder(os.path.dirname(path))
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW | os.O_CLOEXEC, 0o600)
+    try:
+        info = os.fstat(fd)
+        if not stat.S_ISREG(info.st_mode) or info.st_uid != os.getuid():
+            raise PermissionError(f"[MI_Monitor] {path} - is not a file of this user, not writing to it")
+        if info.st_mode & 0o077:
+            os.fchmod(fd, 0o600) # left readable by an older version
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+class StatusMailbox:
+    """ Writer side, owned by MIMonitor (one writer per file) """
+
+    def __init__(self, path: str = DEFAULT_PATH, slots: int = DEFAULT_SLOTS):
+        """
+        path - status file, "auto" is DEFAULT_PATH
+        """
+        path = DEFAULT_PATH if path == "auto" else path
+        self.path = path
+        self.slots = slots
+        size = _size(slots)
+        # the file is reused, not replaced, so readers can keep it mapped
+        fd = _open_private(path)
+        try:
+            os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE)
+        finally:
+            os.close(fd)
+        self._lock = Lock()
+        self._closed = False
+        self._sequence = _HEADER.unpack_from(self._mm, 0)[3] & ~1 # keep counting across restarts
+        _HEADER.pack_into(self._mm, 0, MAGIC, VERSION, slots, self._sequence)
+        self.started_at = time.time()
+
+
+    def publish(self, current_mode: str, modes: List[Dict], voice_ready: bool = False,
+                monitor_pid: Optional[int] = None) -> None:
+        """
+        Writes one consistent status. modes are dicts with the keys of
+        a mode slot (see the module docstring); missing ones are 0/"".
+        """
+        if len(modes) > self.slots:
+            modes = modes[:self.slots]
+        body = bytearray(_MONITOR.size + _MODE.size * self.slots)
+        _MONITOR.pack_into(body, 0, time.time(), self.started_at,
+                           os.getpid() if monitor_pid is None else monitor_pid,
+                           int(voice_ready), len(modes), current_mode.encode()[:32])
+        for index, mode in enumerate(modes):
+            last_ok = mode.get("last_command_ok")
+            counters = mode.get("counters", {})
+            _MODE.pack_into(body, _MONITOR.size + index * _MODE.size,
+                            mode.get("mode", "").encode()[:32],
+                            mode.get("state", "").encode()[:16],
+                            mode.get("last_command", "").encode()[:16],
+                            mode.get("pid") or 0,
+                            min(mode.get("instances", 0), 0xFFFF),
+                            -1 if last_ok is None else int(last_ok),
+                            mode.get("state_since", 0.0),
+                            mode.get("last_command_at", 0.0),
+                            *(counters.get(name, 0) & 0xFFFFFFFF for name in _COUNTERS))
+        with self._lock:
+            if self._closed:
+                return
+            self._sequence += 1 # odd: write in progress
+            _SEQUENCE.pack_into(self._mm, _SEQUENCE_OFFSET, self._sequence)
+            self._mm[_HEADER.size:_HEADER.size + len(body)] = body
+            self._sequence += 1 # even: consistent
+            _SEQUENCE.pack_into(self._mm, _SEQUENCE_OFFSET, self._sequence)
+
+
+    def close(self, current_mode: str = "", modes: Optional[List[Dict]] = None) -> None:
+        """
+        Publishes a last status with monitor pid 0 (not running)
+        """
+        self.publish(current_mode, modes or [], monitor_pid=0)
+        with self._lock:
+            self._closed = True
+            self._mm.flush()
+            self._mm.close()
+
+
+class StatusReader:
+    """ Lock-free reader, keep one around to poll at high frequency """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slots, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"[MI_Monitor] {path} - is not a version {VERSION} MIMonitor status file")
+        self._body_size = _MONITOR.size + _MODE.size * self.slots
+        self.retries = 0 # reads repeated because the writer was busy
+
+
+    def read(self, timeout: float = 0.1) -> Dict:
+        """
+        Returns the latest consistent status
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            sequence = _SEQUENCE.unpack_from(self._mm, _SEQUENCE_OFFSET)[0]
+            if not sequence & 1:
+                body = self._mm[_HEADER.size:_HEADER.size + self._body_size]
+                if _SEQUENCE.unpack_from(self._mm, _SEQUENCE_OFFSET)[0] == sequence:
+                    return self._parse(body, sequence)
+            self.retries += 1
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"[MI_Monitor] {self.path} - no consistent status within {timeout} s")
+            time.sleep(0) # let the writer finish
+
+
+    def _parse(self, body: bytes, sequence: int) -> Dict:
+        updated_at, started_at, monitor_pid, voice_ready, count, current_mode = _MONITOR.unpack_from(body, 0)
+        modes = []
+        for index in range(min(count, self.slots)):
+            values = _MODE.unpack_from(body, _MONITOR.size + index * _MODE.size)
+            name, state, last_command, pid, instances, last_ok, state_since, last_command_at = values[:8]
+            modes.append({"mode": _text(name), "state": _text(state),
+                          "last_command": _text(last_command), "pid": pid or None,
+                          "instances": instances,
+                          "last_command_ok": None if last_ok < 0 else bool(last_ok),
+                          "state_since": state_since, "last_command_at": last_command_at,
+                          "counters": dict(zip(_COUNTERS, values[8:]))})
+        return {"sequence": sequence, "updated_at": updated_at, "started_at": started_at,
+                "monitor_pid": monitor_pid or None, "voice_ready": bool(voice_ready),
+                "current_mode": _text(current_mode), "modes": modes}
+
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def read_status(path: str = DEFAULT_PATH) -> Dict:
+    """
+    One status read (opens and closes the file)
+    """
+    reader = StatusReader(path)
+    try:
+        return reader.read()
+    finally:
+        reader.close()
+
+
+def format_status(status: Dict) -> str:
+    """
+    Human readable status, as printed by the CLI
+    """
+    now = time.time()
+    running = "running" if status["monitor_pid"] else "stopped"
+    lines = [f"MIMonitor {running} (pid {status['monitor_pid']}), current mode {status['current_mode']}, "
+             f"voice {'ready' if status['voice_ready'] else 'not ready'}, "
+             f"updated {now - status['updated_at']:.1f} s ago"]
+    for mode in status["modes"]:
+        last = mode["last_command"] or "-"
+        if mode["last_command_ok"] is not None:
+            last += " ok" if mode["last_command_ok"] else " failed"
+        counters = " ".join(f"{name} {value}" for name, value in mode["counters"].items())
+        lines.append(f"  {mode['mode']:<12} {mode['state']:<13} for {now - mode['state_since']:7.1f} s  "
+                     f"pid {mode['pid'] or '-'} ({mode['instances']} running)  last {last}  {counters}")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show the status MIMonitor publishes")
+    parser.add_argument("path", nargs="?", default=DEFAULT_PATH, help="Status file")
+    parser.add_argument("--watch", type=float, default=0, help="Refresh every WATCH seconds")
+    args = parser.parse_args()
+    try:
+        reader = StatusReader(args.path)
+    except (OSError, ValueError) as e:
+        print(f"No MIMonitor status: {e}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        while True:
+            print(format_status(reader.read()))
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+            print()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from phrase_matcher import PhraseMatcher
+
+
+WORDS = ["motion", "face", "nose", "eyes", "head", "hand", "hands", "gaze", "mouth",
+         "speech", "body", "walk", "arm", "finger", "tilt", "blink", "smile", "joystick"]
+FILLER = ["please", "now", "the", "and", "then", "could", "you", "start", "stop", "close"]
+
+
+def make_phrases(n_modes: int, words_per_mode: int):
+    # Same layout as Config.get_trigger_phrases for every mode
+    words = [f"{random.choice(WORDS)}{i}" for i in range(n_modes * words_per_mode)]
+    start = ["start " + word for word in words]
+    stop = ["stop " + word for word in words] + ["close " + word for word in words]
+    return start, stop
+
+
+def make_utterances(start, stop, n: int = 200):
+    utterances = []
+    for _ in range(n):
+        text = random.choices(FILLER, k=random.randint(2, 8))
+        text.insert(random.randint(0, len(text)), random.choice(start + stop))
+        utterances.append(" ".join(text))
+    return utterances
+
+
+def loop_match(utterance, start, stop):
+    # The original MIMonitor.run() loops
+    actions = []
+    for phrase in stop:
+        if phrase in utterance:
+            actions.append("stop")
+    for phrase in start:
+        if phrase in utterance:
+            actions.append("start")
+    return actions
+
+
+def bench():
+    random.seed(0)
+    print(f"{'modes':>6} {'phrases':>8} {'loop us':>10} {'matcher us':>11} {'speed up':>9}")
+    for n_modes in (1, 2, 4, 8, 16, 32):
+        start, stop = make_phrases(n_modes, 5)
+        utterances = make_utterances(start, stop)
+        phrases = {phrase: "stop" for phrase in stop}
+        phrases.update({phrase: "start" for phrase in start})
+        matcher = PhraseMatcher(phrases)
+        loop_time = timeit.timeit(lambda: [loop_match(u, start, stop) for u in utterances], number=20)
+        matcher_time = timeit.timeit(lambda: [matcher.find_all(u) for u in utterances], number=20)
+        per_loop = loop_time / (20 * len(utterances)) * 1e6
+        per_matcher = matcher_time / (20 * len(utterances)) * 1e6
+        print(f"{n_modes:>6} {len(phrases):>8} {per_loop:>10.2f} {per_matcher:>11.2f} {per_loop / per_matcher:>8.1f}x")
+
+
+bench()
@@ -0,0 +1,140 @@
+'''
+Offline recognition benchmark.
+
+Replays WAV files through MIMonitor (recogniser, VAD, phrase matching)
+without a microphone, tray icon or real MI processes and reports
+real time factor, detection latency and hit/miss/false trigger rates.
+
+    python tests/bench_recognition.py <clip.wav | clips folder> [--realtime] [--blocksize 8000]
+
+Expected commands per clip come from labels.json in the clips folder:
+    {"clip1.wav": {"commands": ["start motion"], "speech_end": [1.35]}}
+or, without labels.json, from the file name: "start_motion__01.wav",
+"stop_face__take2.wav", "none__noise.wav" (no command expected).
+speech_end (seconds) defaults to the last loud sample of the clip.
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_source import WavFileSource, read_wav
+from config import Config
+from icon_manager import IconManager
+from MI_monitor import MIMonitor
+from process_source import FakeProcessSource
+from vosk import Model
+
+
+class BenchMonitor(MIMonitor):
+    """ MIMonitor that records commands instead of starting/killing MI """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.detections = [] # ((action, mode), audio time)
+
+    def do_on_start_phrase(self, mode=None, wait=True):
+        self.detections.append((("start", mode), self.audio_position()))
+
+    def do_on_stop_phrase(self, mode=None, wait=True):
+        self.detections.append((("stop", mode), self.audio_position()))
+
+
+def load_labels(folder: str):
+    path = os.path.join(folder, "labels.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def label_from_name(file_name: str):
+    label = os.path.basename(file_name).split("__")[0]
+    if label == "none":
+        return []
+    return [label.replace("_", " ")]
+
+
+def estimate_speech_end(path: str, threshold: int = 1000) -> float:
+    samples, samplerate = read_wav(path)
+    loud = np.flatnonzero(np.abs(samples.astype(np.int32)) > threshold)
+    return (loud[-1] + 1) / samplerate if len(loud) else 0.0
+
+
+def run_clip(path: str, label: dict, model, blocksize: int, realtime: bool):
+    # closing the buffer after the last block lets the worker drain it and end
+    source = WavFileSource(path, blocksize=blocksize, realtime=realtime,
+                           on_finished=lambda: monitor._workers[0].buffer.close())
+    monitor = BenchMonitor(audio_source=source, icon_manager=IconManager(backend="null"),
+                           process_source=FakeProcessSource(), model=model)
+    started = time.perf_counter()
+    monitor.start(track_processes=False)
+    monitor._voice_thread.join() # recogniser built, replay started
+    while monitor.is_listening() or monitor.pending_phrases():
+        monitor.run()
+    elapsed = time.perf_counter() - started
+    monitor.stop()
+    # Expected actions, in order, from the labelled phrases
+    expected = []
+    for phrase in label["commands"]:
+        expected += [match.action for match in monitor._phrase_matcher.find_all(phrase)]
+    speech_end = label.get("speech_end") or [estimate_speech_end(path)] * len(expected)
+    result = {"file": os.path.basename(path), "audio": source.duration, "elapsed": elapsed,
+              "hits": 0, "misses": 0, "false": 0, "latencies": []}
+    unused = list(monitor.detections)
+    for action, end in zip(expected, speech_end):
+        found = next((d for d in unused if d[0] == action), None)
+        if found is None:
+            result["misses"] += 1
+            continue
+        unused.remove(found)
+        result["hits"] += 1
+        result["latencies"].append(found[1] - end)
+    result["false"] = len(unused)
+    return result
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="Offline MIMonitor recognition benchmark")
+    parser.add_argument("path", help="WAV file or folder of labelled WAV clips")
+    parser.add_argument("--realtime", action="store_true", help="Replay at real time speed")
+    parser.add_argument("--blocksize", type=int, default=8000, help="Frames per audio block")
+    args = parser.parse_args()
+    if os.path.isdir(args.path):
+        folder = args.path
+        files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".wav"))
+    else:
+        folder = os.path.dirname(args.path)
+        files = [args.path]
+    labels = load_labels(folder)
+    load_started = time.perf_counter()
+    model = Model(Config().get_vosk_path())
+    print(f"Model load: {time.perf_counter() - load_started:.2f} s")
+    results = []
+    for path in files:
+        label = labels.get(os.path.basename(path), {"commands": label_from_name(path)})
+        result = run_clip(path, label, model, args.blocksize, args.realtime)
+        results.append(result)
+        latency = " ".join(f"{l * 1000:.0f}" for l in result["latencies"])
+        print(f"{result['file']:<40} RTF {result['elapsed'] / result['audio']:.3f} "
+              f"hits {result['hits']} misses {result['misses']} false {result['false']} "
+              f"latency ms [{latency}]")
+    audio = sum(r["audio"] for r in results)
+    elapsed = sum(r["elapsed"] for r in results)
+    hits = sum(r["hits"] for r in results)
+    misses = sum(r["misses"] for r in results)
+    false = sum(r["false"] for r in results)
+    latencies = [l for r in results for l in r["latencies"]]
+    print("-" * 80)
+    print(f"Clips {len(results)}  audio {audio:.1f} s  real time factor {elapsed / max(audio, 1e-9):.3f}")
+    print(f"Hit rate {hits / max(hits + misses, 1):.1%}  misses {misses}  false triggers {false}")
+    if latencies:
+        print(f"Latency ms  median {np.median(latencies) * 1000:.0f}  "
+              f"p90 {np.percentile(latencies, 90) * 1000:.0f}  max {max(latencies) * 1000:.0f}")
+
+
+bench()
@@ -0,0 +1,113 @@
+'''
+Capture side resampling benchmark.
+
+For device rates of 44.1 and 48 kHz and a range of capture block sizes
+reports the resampler's CPU time per second of audio and the latency a
+block adds before decoding can start (buffering the block + filter
+delay + resampling time).
+
+    python tests/bench_resampler.py [--seconds 30] [--model data/models/english] [--wav clip.wav]
+
+With --model (needs vosk) it also decodes the audio at the device rate
+(Kaldi downsampling internally) and after resampling to the model's rate,
+and reports the decoder CPU time per second of audio for both.
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_source import read_wav
+from resampler import PolyphaseResampler, model_samplerate
+
+DEVICE_RATES = (44100, 48000)
+BLOCK_MS = (10, 20, 50, 100, 170, 250, 500) # 170 ms ~ the old 8000 frame blocks at 44.1/48 kHz
+
+
+def make_audio(samplerate: int, seconds: float, wav: str = None) -> np.ndarray:
+    """
+    The WAV file at samplerate, or speech band noise bursts
+    """
+    if wav:
+        samples, rate = read_wav(wav)
+        if rate != samplerate:
+            samples = PolyphaseResampler(rate, samplerate).process(samples)
+        repeats = int(np.ceil(seconds * samplerate / len(samples)))
+        return np.tile(samples, repeats)[:int(seconds * samplerate)]
+    rng = np.random.default_rng(0)
+    n = int(seconds * samplerate)
+    noise = rng.normal(0, 3000, n)
+    envelope = (np.sin(2 * np.pi * 0.7 * np.arange(n) / samplerate) > 0).astype(float)
+    return np.clip(noise * (0.1 + envelope), -32768, 32767).astype(np.int16)
+
+
+def blocks(audio: np.ndarray, blocksize: int):
+    for offset in range(0, len(audio), blocksize):
+        yield audio[offset:offset + blocksize]
+
+
+def bench_resampler(audio: np.ndarray, rate: int, block_ms: float, out_rate: int):
+    blocksize = int(rate * block_ms / 1000)
+    resampler = PolyphaseResampler(rate, out_rate)
+    per_block = []
+    cpu_started = time.process_time()
+    for block in blocks(audio, blocksize):
+        started = time.perf_counter()
+        resampler.process(block)
+        per_block.append(time.perf_counter() - started)
+    cpu = time.process_time() - cpu_started
+    seconds = len(audio) / rate
+    latency = block_ms / 1000 + resampler.delay + float(np.mean(per_block))
+    return cpu / seconds, latency, resampler
+
+
+def bench_decoder(model, audio: np.ndarray, rate: int, block_ms: float, out_rate: int, resample: bool):
+    from vosk import KaldiRecognizer
+    blocksize = int(rate * block_ms / 1000)
+    resampler = PolyphaseResampler(rate, out_rate) if resample else None
+    recogniser = KaldiRecognizer(model, out_rate if resample else rate)
+    cpu_started = time.process_time()
+    for block in blocks(audio, blocksize):
+        if resampler is not None:
+            block = resampler.process(block)
+        recogniser.AcceptWaveform(block.tobytes())
+    recogniser.FinalResult()
+    return (time.process_time() - cpu_started) / (len(audio) / rate)
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="Capture side resampling benchmark")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Seconds of audio per run")
+    parser.add_argument("--model", help="Vosk model folder, also benchmarks decoding")
+    parser.add_argument("--wav", help="Audio to use instead of generated noise")
+    args = parser.parse_args()
+    out_rate = model_samplerate(args.model) if args.model else 16000
+    model = None
+    if args.model:
+        from vosk import Model, SetLogLevel
+        SetLogLevel(-1)
+        model = Model(args.model)
+    header = f"{'device Hz':>9} {'block ms':>8} {'frames':>7} {'resample cpu ms/s':>18} {'added latency ms':>17}"
+    if model is not None:
+        header += f" {'decode ms/s device rate':>24} {'decode ms/s resampled':>22}"
+    print(f"Resampling to {out_rate} Hz, {args.seconds:.0f} s of audio per run")
+    print(header)
+    for rate in DEVICE_RATES:
+        audio = make_audio(rate, args.seconds, args.wav)
+        for block_ms in BLOCK_MS:
+            cpu, latency, resampler = bench_resampler(audio, rate, block_ms, out_rate)
+            line = (f"{rate:>9} {block_ms:>8} {int(rate * block_ms / 1000):>7} "
+                    f"{cpu * 1000:>18.2f} {latency * 1000:>17.1f}")
+            if model is not None:
+                native = bench_decoder(model, audio, rate, block_ms, out_rate, resample=False)
+                resampled = bench_decoder(model, audio, rate, block_ms, out_rate, resample=True)
+                line += f" {native * 1000:>24.1f} {resampled * 1000:>22.1f}"
+            print(line)
+        print(f"{'':>9} filter: {resampler.up}/{resampler.down}, {resampler.taps} taps per output sample, "
+              f"delay {resampler.delay * 1000:.2f} ms")
+
+
+bench()
@@ -0,0 +1,51 @@
+'''
+Cost of the MI resource sampler.
+
+Starts a few child processes standing in for MI instances, samples them
+(resource_sampler.py, with the reader available here: psutil or /proc)
+and reports the sampler's CPU time per sample and as a share of one core
+at the given interval.
+
+    python tests/bench_resource_sampler.py [--processes 3] [--samples 2000] [--interval 1.0]
+'''
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from resource_sampler import ResourcePolicy, ResourceSampler, make_reader
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="MI resource sampler cost")
+    parser.add_argument("--processes", type=int, default=3, help="Sampled processes")
+    parser.add_argument("--samples", type=int, default=2000, help="Samples taken")
+    parser.add_argument("--interval", type=float, default=1.0, help="Sampling interval the share is given for")
+    args = parser.parse_args()
+    if make_reader() is None:
+        print("No resource reader on this platform (install psutil)")
+        return
+    children = [subprocess.Popen([sys.executable, "-c", "import time; time.sleep(600)"])
+                for _ in range(args.processes)]
+    try:
+        pids = [child.pid for child in children]
+        violations = []
+        sampler = ResourceSampler(lambda: {"bench": pids}, lambda *violation: violations.append(violation),
+                                  ResourcePolicy(), args.interval)
+        sampler.sample() # first readings, no CPU % yet
+        cpu_started, started = time.process_time(), time.perf_counter()
+        for _ in range(args.samples):
+            sampler.sample()
+        cpu = (time.process_time() - cpu_started) / args.samples
+        wall = (time.perf_counter() - started) / args.samples
+    finally:
+        for child in children:
+            child.kill()
+            child.wait()
+    print(f"{args.processes} processes: {cpu * 1e6:.0f} us CPU ({wall * 1e6:.0f} us wall) per sample, "
+          f"{cpu / args.interval:.4%} of one core at one sample every {args.interval:g} s")
+
+
+bench()
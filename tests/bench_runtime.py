@@ -0,0 +1,69 @@
+'''
+Idle cost of the threaded and the asyncio runtime.
+
+Runs MIMonitor with no audio input and no MI running (the state it
+spends most of its time in) on the configured (or given) process
+backend, and reports the CPU time used and the process scans per
+second for each runtime (see async_runtime.py).
+
+    python tests/bench_runtime.py [--seconds 20] [--backend wmic]
+'''
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from async_runtime import AsyncRuntime
+from icon_manager import IconManager
+from MI_monitor import MIMonitor
+from process_source import BACKENDS, make_process_source
+
+
+def make_monitor(backend: str) -> MIMonitor:
+    # no input devices and a placeholder model: only process tracking runs
+    process_source = make_process_source(backend) if backend else None
+    return MIMonitor(audio_sources=[], icon_manager=IconManager(backend="null"), process_source=process_source, model=object())
+
+
+def bench_threads(seconds: float, backend: str):
+    monitor = make_monitor(backend)
+    monitor.start()
+    time.sleep(1.0) # startup
+    cpu_started, scans = time.process_time(), monitor.process_cache_stats()["scans"]
+    time.sleep(seconds)
+    result = (time.process_time() - cpu_started, monitor.process_cache_stats()["scans"] - scans)
+    monitor.stop()
+    return result
+
+
+def bench_asyncio(seconds: float, backend: str):
+    monitor = make_monitor(backend)
+    runtime = AsyncRuntime(monitor)
+    result = []
+    def measure():
+        time.sleep(1.0)
+        cpu_started, scans = time.process_time(), monitor.process_cache_stats()["scans"]
+        time.sleep(seconds)
+        result.extend((time.process_time() - cpu_started, monitor.process_cache_stats()["scans"] - scans))
+        runtime.stop()
+    threading.Thread(target=measure, daemon=True).start()
+    asyncio.run(runtime.run())
+    return result[0], result[1], runtime.cadence.current
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="Idle CPU of the MIMonitor runtimes")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Idle seconds measured per runtime")
+    parser.add_argument("--backend", choices=BACKENDS, help="Process backend instead of the configured one")
+    args = parser.parse_args()
+    cpu, scans = bench_threads(args.seconds, args.backend)
+    print(f"threads  cpu {cpu / args.seconds:.2%}  scans/s {scans / args.seconds:.2f}")
+    cpu, scans, interval = bench_asyncio(args.seconds, args.backend)
+    print(f"asyncio  cpu {cpu / args.seconds:.2%}  scans/s {scans / args.seconds:.2f}  "
+          f"(tracker interval now {interval:.2f} s)")
+
+
+bench()
@@ -0,0 +1,63 @@
+'''
+Voice activity gate benchmark: what keeping the pre-roll costs.
+
+Silent blocks are read from an AudioRingBuffer (memoryviews into its
+rows, like the recognition loop does) and fed to the VAD. For a range
+of block sizes reports the time per block of the gate with and without
+pre-roll, and of the copy that pre-roll makes of every silent block
+(a ring row can be written again right after the next get(), so the
+pre-roll cannot keep the view).
+
+    python tests/bench_vad.py [--blocks 20000] [--samplerate 16000]
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_buffer import AudioRingBuffer
+from vad import VoiceActivityDetector
+
+BLOCK_MS = (10, 50, 100, 250, 500)
+
+
+def silent_views(samplerate: int, block_ms: float, count: int):
+    """
+    count ring buffer views of low level noise blocks
+    """
+    frames = int(samplerate * block_ms / 1000)
+    ring = AudioRingBuffer(capacity=4, block_frames=frames)
+    noise = np.random.default_rng(0).normal(0, 20, frames).astype(np.int16)
+    for _ in range(count):
+        ring.put(noise)
+        yield ring.get(0)
+
+
+def per_block(samplerate: int, block_ms: float, count: int, process) -> float:
+    views = list(silent_views(samplerate, block_ms, 64)) # the views share 5 rows, reused
+    started = time.perf_counter()
+    for i in range(count):
+        process(views[i % len(views)])
+    return (time.perf_counter() - started) / count
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="Voice activity gate pre-roll benchmark")
+    parser.add_argument("--blocks", type=int, default=20000, help="Blocks per run")
+    parser.add_argument("--samplerate", type=int, default=16000)
+    args = parser.parse_args()
+    rate, count = args.samplerate, args.blocks
+    print(f"{args.samplerate} Hz, {count} silent blocks per run, us per block")
+    print(f"{'block ms':>8} {'gate':>8} {'gate + pre-roll':>16} {'pre-roll copy':>14} {'copy share':>11}")
+    for block_ms in BLOCK_MS:
+        gate = per_block(rate, block_ms, count, VoiceActivityDetector(rate, preroll=0.0).process)
+        with_preroll = per_block(rate, block_ms, count, VoiceActivityDetector(rate, preroll=0.3).process)
+        copy = per_block(rate, block_ms, count, bytes)
+        print(f"{block_ms:>8} {gate * 1e6:>8.1f} {with_preroll * 1e6:>16.1f} {copy * 1e6:>14.2f} "
+              f"{copy / with_preroll:>10.1%}")
+
+
+bench()
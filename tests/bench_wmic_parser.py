@@ -0,0 +1,200 @@
+'''
+wmic output parsing benchmark, runs anywhere from fixtures.
+
+Compares the old parser (decode the whole "wmic process list full"
+output, split it into processes and build a dict of every field) with
+the streaming parser of process_source.py (iter_wmic_records), fed line
+by line from a pipe-like reader:
+- over the same "list full" output
+- over the field-projected output the wmic backend asks for now
+  ("get CreationDate,ExecutablePath,Name,ParentProcessId,ProcessId")
+- over the output of the MI lookup (find_all: "where Name='...'", WMI
+  filters, only the MI processes are written and parsed), emulated by
+  keeping the MI blocks of the projected output
+
+The MI lookup replaced the early exit the streaming parser first had
+(records() stopped reading wmic once every requested PID was parsed):
+MI lookups no longer read the full table at all, so there is no early
+exit left to measure and records() was removed from the wmic backend.
+
+Without --fixtures, outputs of 100 to 3000 processes are generated.
+Recorded fixtures are made on Windows with
+    python tests/bench_wmic_parser.py --record fixtures_folder
+and replayed (on any platform) with
+    python tests/bench_wmic_parser.py --fixtures fixtures_folder [--repeat 20]
+(the wmic process start itself is not part of the timings)
+'''
+import argparse
+import io
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from process_source import PROCESS_FIELDS, iter_wmic_records, make_record
+
+SIZES = (100, 300, 1000, 3000)
+MI_NAME = "MI3-FacialNavigation-3.1.exe" # the name looked up
+LIST_FULL_FIELDS = ("CommandLine", "CSName", "Description", "ExecutablePath", "ExecutionState", "Handle",
+                    "HandleCount", "InstallDate", "KernelModeTime", "MaximumWorkingSetSize",
+                    "MinimumWorkingSetSize", "Name", "OSName", "OtherOperationCount", "OtherTransferCount",
+                    "PageFaults", "PageFileUsage", "ParentProcessId", "PeakPageFileUsage", "PeakVirtualSize",
+                    "PeakWorkingSetSize", "Priority", "PrivatePageCount", "ProcessId", "QuotaNonPagedPoolUsage",
+                    "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage", "QuotaPeakPagedPoolUsage",
+                    "ReadOperationCount", "ReadTransferCount", "SessionId", "Status", "TerminationDate",
+                    "ThreadCount", "UserModeTime", "VirtualSize", "WindowsVersion", "WorkingSetSize",
+                    "WriteOperationCount", "WriteTransferCount")
+PROJECTED_ARGS = ["get", ",".join(sorted(PROCESS_FIELDS)), "/format:list"]
+
+
+def legacy_parse_date(value: str):
+    if not value or len(value) < 22:
+        return None
+    try:
+        moment = datetime.strptime(value[:21], "%Y%m%d%H%M%S.%f")
+        offset = int(value[21:])
+    except ValueError:
+        return None
+    return moment.replace(tzinfo=timezone(timedelta(minutes=offset))).timestamp()
+
+
+def legacy_parse(output: bytes):
+    """
+    The parser the wmic backend used before (list full, every field)
+    """
+    records = []
+    for task in output.decode("utf-8").strip().split("\r\r\n\r\r\n"):
+        if "=" not in task:
+            continue
+        process = dict(e.split("=", 1) for e in task.strip().split("\r\r\n") if "=" in e)
+        try:
+            pid, ppid = int(process.get("ProcessId")), int(process.get("ParentProcessId"))
+        except (TypeError, ValueError):
+            pid = ppid = 0
+        records.append(make_record(process.get("Name", ""), pid, ppid,
+                                   legacy_parse_date(process.get("CreationDate", "")),
+                                   process.get("ExecutablePath", "")))
+    return records
+
+
+def _process_values(pid: int, rng: random.Random):
+    name = rng.choice(("svchost.exe", "chrome.exe", "explorer.exe", "RuntimeBroker.exe", "conhost.exe",
+                       "MI3-FacialNavigation-3.1.exe"))
+    exe = f"C:\\Program Files\\Vendor {pid % 37}\\{name}"
+    created = f"2024{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}{rng.randint(0, 23):02d}0000.000000+060"
+    values = {field: str(rng.randint(0, 10 ** 9)) for field in LIST_FULL_FIELDS}
+    values.update(CommandLine=f"\"{exe}\" --type=renderer --field-trial-handle={rng.randint(0, 10 ** 6)}",
+                  CSName="DESKTOP-BENCH", Description=name, ExecutablePath=exe, Name=name,
+                  OSName="Microsoft Windows 11 Pro|C:\\WINDOWS|\\Device\\Harddisk0\\Partition3",
+                  ParentProcessId=str(rng.randint(4, 20000)), ProcessId=str(pid), Status="",
+                  InstallDate="", TerminationDate="", WindowsVersion="10.0.22631", CreationDate=created)
+    return values
+
+
+def make_fixtures(count: int, seed: int = 0):
+    """
+    ("list full" output, projected output) of count processes,
+    laid out like wmic's /format:list (CR CR LF line ends)
+    """
+    rng = random.Random(seed)
+    pids = rng.sample(range(4, 200000, 4), count)
+    full, projected = [], []
+    for pid in pids:
+        values = _process_values(pid, rng)
+        full.append("\r\r\n".join(f"{field}={values[field]}" for field in LIST_FULL_FIELDS))
+        projected.append("\r\r\n".join(f"{field}={values[field]}" for field in sorted(PROCESS_FIELDS)))
+    def layout(blocks):
+        return ("\r\r\n\r\r\n" + "\r\r\n\r\r\n\r\r\n".join(blocks) + "\r\r\n\r\r\n\r\r\n").encode("utf-8")
+    return layout(full), layout(projected)
+
+
+def record_fixtures(folder: str) -> None:
+    """
+    Saves this machine's wmic outputs (Windows)
+    """
+    os.makedirs(folder, exist_ok=True)
+    full = subprocess.check_output(["wmic", "process", "list", "full", "/format:list"])
+    projected = subprocess.check_output(["wmic", "process"] + PROJECTED_ARGS)
+    count = len(legacy_parse(full))
+    for kind, output in (("full", full), ("projected", projected)):
+        with open(os.path.join(folder, f"wmic_{count}_{kind}.txt"), "wb") as f:
+            f.write(output)
+    print(f"Recorded {count} processes to {folder}")
+
+
+def load_fixtures(folder: str):
+    """
+    {size: (full, projected)} from wmic_<n>_full.txt / wmic_<n>_projected.txt
+    """
+    fixtures = {}
+    for file_name in sorted(os.listdir(folder)):
+        if file_name.startswith("wmic_") and file_name.endswith("_full.txt"):
+            size = int(file_name.split("_")[1])
+            with open(os.path.join(folder, file_name), "rb") as f:
+                full = f.read()
+            with open(os.path.join(folder, f"wmic_{size}_projected.txt"), "rb") as f:
+                fixtures[size] = (full, f.read())
+    return fixtures
+
+
+def pipe(output: bytes):
+    """
+    Reader yielding lines like a subprocess stdout
+    """
+    return io.BufferedReader(io.BytesIO(output))
+
+
+def stream_parse(output: bytes):
+    return list(iter_wmic_records(pipe(output)))
+
+
+def name_filtered(projected: bytes, name: str) -> bytes:
+    """
+    What wmic writes for "where Name='name'": the blocks of that name only
+    """
+    blocks = projected.split(b"\r\r\n\r\r\n")
+    kept = [block for block in blocks if b"Name=" + name.encode("utf-8") + b"\r" in block + b"\r"]
+    return b"\r\r\n\r\r\n" + b"\r\r\n\r\r\n".join(kept) + b"\r\r\n\r\r\n"
+
+
+def timed(function, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench():
+    parser = argparse.ArgumentParser(description="wmic output parsing benchmark")
+    parser.add_argument("--fixtures", help="Folder of recorded wmic outputs (see --record)")
+    parser.add_argument("--record", help="Record this machine's wmic outputs to a folder (Windows)")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per measurement (best is kept)")
+    args = parser.parse_args()
+    if args.record:
+        record_fixtures(args.record)
+        return
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else {size: make_fixtures(size) for size in SIZES}
+    print(f"{'processes':>9} {'full KB':>8} {'proj KB':>8} {'old ms':>8} {'stream full ms':>15} "
+          f"{'stream proj ms':>15} {'lookup ms':>10} {'speedup':>8}")
+    for size, (full, projected) in sorted(fixtures.items()):
+        records = stream_parse(projected)
+        # same records from both outputs (list full has no CreationDate)
+        old = legacy_parse(full)
+        assert [(r["Name"], r["ProcessId"]) for r in old] == [(r["Name"], r["ProcessId"]) for r in records]
+        filtered = name_filtered(projected, MI_NAME)
+        assert len(stream_parse(filtered)) == sum(1 for r in records if r["Name"] == MI_NAME)
+        old_time = timed(lambda: legacy_parse(full), args.repeat)
+        stream_full = timed(lambda: stream_parse(full), args.repeat)
+        stream_projected = timed(lambda: stream_parse(projected), args.repeat)
+        lookup = timed(lambda: stream_parse(filtered), args.repeat)
+        print(f"{size:>9} {len(full) / 1024:>8.0f} {len(projected) / 1024:>8.0f} {old_time * 1000:>8.2f} "
+              f"{stream_full * 1000:>15.2f} {stream_projected * 1000:>15.2f} {lookup * 1000:>10.2f} "
+              f"{old_time / stream_projected:>7.1f}x")
+
+
+bench()
@@ -0,0 +1,54 @@
+'''
+Shared pytest fixtures: config.json files with every optional feature
+off (no tray, metrics, control API, status mailbox or resource
+sampling), so tests never touch the real data/config.json.
+'''
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+MINIMAL_CONFIG = {
+    "current_mode": "facenav",
+    "model": "english",
+    "config_watch_interval": 0,
+    "tray": {"backend": "null", "debounce": 0},
+    "modes": {
+        "facenav": {"mi_exe": "MI3-FacialNavigation-3.1.exe", "mi_folder": "UCL MI3 Facial Navigation",
+                    "trigger_phrases": ["motion", "face"], "start_timeout": 0.5, "stop_timeout": 0.5},
+        "multitouch": {"mi_exe": "MI3-Multitouch-3.1.exe", "mi_folder": "UCL MI3 Multitouch",
+                       "trigger_phrases": ["hand", "hands"], "start_timeout": 0.5, "stop_timeout": 0.5},
+    },
+}
+
+
+def write_config(path, **changes) -> None:
+    """
+    Writes MINIMAL_CONFIG with the top level keys in changes replaced
+    """
+    data = json.loads(json.dumps(MINIMAL_CONFIG))
+    data.update(changes)
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = str(tmp_path / "config.json")
+    write_config(path)
+    return path
+
+
+@pytest.fixture
+def make_config(config_path):
+    """
+    make_config(**changes) -> Config of MINIMAL_CONFIG with changes
+    """
+    def make(**changes) -> Config:
+        write_config(config_path, **changes)
+        return Config(config_path)
+    return make
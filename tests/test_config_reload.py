@@ -0,0 +1,131 @@
+'''
+Hot reload of config.json (Config.reload and MIMonitor._on_config_change).
+
+    python -m pytest tests/test_config_reload.py
+'''
+import json
+import time
+
+from conftest import MINIMAL_CONFIG, write_config
+from icon_manager import IconManager
+from MI_monitor import MIMonitor
+from process_source import FakeProcessSource
+
+
+def _monitor(config, icon_manager=None) -> MIMonitor:
+    return MIMonitor(audio_sources=[], icon_manager=icon_manager, process_source=FakeProcessSource(),
+                     model=object(), config=config)
+
+
+def _wait_running(icon_manager: IconManager) -> None:
+    deadline = time.monotonic() + 2.0
+    while not icon_manager.is_running() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_removed_mode_icon_is_stopped(config_path, make_config):
+    config = make_config(watched_modes=["facenav", "multitouch"])
+    monitor = _monitor(config)
+    try:
+        removed = monitor._supervisors["multitouch"].icon_manager
+        kept = monitor._supervisors["facenav"].icon_manager
+        assert removed is not kept
+        _wait_running(removed)
+        write_config(config_path, watched_modes=["facenav"])
+        assert config.reload()
+        assert "multitouch" not in monitor._supervisors
+        removed.join(2.0)
+        assert not removed.is_alive() # tray loop ended, icon gone
+        assert not removed.icon.visible
+        assert kept.is_alive()
+    finally:
+        monitor.stop()
+
+
+def test_shared_icon_is_kept_when_a_mode_is_removed(config_path, make_config):
+    config = make_config(watched_modes=["facenav", "multitouch"])
+    shared = IconManager(backend="null")
+    monitor = _monitor(config, shared)
+    try:
+        _wait_running(shared)
+        write_config(config_path, watched_modes=["facenav"])
+        assert config.reload()
+        assert "multitouch" not in monitor._supervisors
+        assert shared.is_alive()
+    finally:
+        monitor.stop()
+        shared.stop_icon()
+
+
+def test_reload_passes_old_and_new_snapshots(config_path, make_config):
+    config = make_config()
+    seen = []
+    config.add_listener(lambda old, new: seen.append((old, new)))
+    old = config.snapshot
+    write_config(config_path, model="other")
+    assert config.reload()
+    assert seen == [(old, config.snapshot)]
+    assert (old.model, config.snapshot.model) == ("english", "other")
+
+
+def test_restart_only_keys_are_reported(config_path, make_config, capsys):
+    config = make_config()
+    write_config(config_path, process_cache_ttl=1.0, model="other")
+    assert config.reload()
+    reported = [line for line in capsys.readouterr().out.splitlines() if "restart MIMonitor" in line]
+    # model is reloaded live, so not reported
+    assert reported == ["[MI_Monitor] config process_cache_ttl changed, restart MIMonitor to apply"]
+    assert config.reload() # nothing changed this time
+    assert "restart MIMonitor" not in capsys.readouterr().out
+
+
+def test_invalid_file_keeps_the_running_config(config_path, make_config):
+    config = make_config()
+    calls = []
+    config.add_listener(lambda old, new: calls.append(new))
+    snapshot = config.snapshot
+    with open(config_path, "w") as f:
+        f.write("{ not json")
+    assert not config.reload()
+    write_config(config_path, modes={}) # valid JSON, but current_mode is not a mode
+    assert not config.reload()
+    assert config.snapshot is snapshot and calls == []
+
+
+def test_runtime_mode_kept_unless_the_file_switches_modes(config_path, make_config):
+    config = make_config()
+    config.set_mode("multitouch") # e.g. by voice
+    write_config(config_path, model="other")
+    assert config.reload()
+    assert config.current_mode == "multitouch"
+    write_config(config_path, current_mode="multitouch")
+    assert config.reload()
+    write_config(config_path) # the file switches back to facenav
+    assert config.reload()
+    assert config.current_mode == "facenav"
+    config.set_mode("multitouch")
+    modes = {"facenav": MINIMAL_CONFIG["modes"]["facenav"]}
+    write_config(config_path, modes=modes) # the runtime mode was removed
+    assert config.reload()
+    assert config.current_mode == "facenav"
+
+
+def test_reload_adds_and_reconfigures_supervisors(config_path, make_config):
+    config = make_config()
+    monitor = _monitor(config)
+    try:
+        facenav = monitor._supervisors["facenav"]
+        assert monitor.supervised_modes() == ["facenav"]
+        modes = json.loads(json.dumps(MINIMAL_CONFIG["modes"]))
+        modes["facenav"]["duplicate_policy"] = "keep_oldest"
+        modes["facenav"]["trigger_phrases"] = ["motion", "eyes"]
+        write_config(config_path, modes=modes, watched_modes=["facenav", "multitouch"])
+        assert config.reload()
+        assert monitor.supervised_modes() == ["facenav", "multitouch"]
+        assert monitor._supervisors["facenav"] is facenav # kept, not rebuilt
+        facenav.submit("reconfigure").result(2.0) # runs after the reload's reconfigure
+        assert facenav.duplicate_policy == "keep_oldest"
+        actions = [match.action for match in monitor._phrase_matcher.find_all("start eyes stop hands")]
+        assert actions == [("start", "facenav"), ("stop", "multitouch")]
+    finally:
+        monitor.stop()
@@ -0,0 +1,41 @@
+'''
+The control API under the asyncio runtime: MIMonitor.start() runs on the
+runtime's event loop there, the control server must still come up.
+
+    python -m pytest tests/test_control_server_async.py
+'''
+import asyncio
+import sys
+import threading
+import time
+
+from async_runtime import AsyncRuntime
+from control_server import ControlClient
+from MI_monitor import MIMonitor
+from process_source import FakeProcessSource
+
+
+def test_control_server_starts_under_async_runtime(tmp_path, make_config):
+    address = str(tmp_path / "control.sock") if sys.platform != "win32" else r"\\.\pipe\mi_monitor_control_test"
+    config = make_config(control={"enabled": True, "address": address})
+    monitor = MIMonitor(audio_sources=[], process_source=FakeProcessSource(), model=object(), config=config)
+    runtime = AsyncRuntime(monitor, track_processes=False)
+    answers = {}
+    def client():
+        try:
+            deadline = time.monotonic() + 10.0
+            while monitor._control_server is None and time.monotonic() < deadline:
+                time.sleep(0.05)
+            with ControlClient(address, timeout=5.0) as control:
+                answers["ping"] = control.request("ping")
+                answers["status"] = control.request("status")
+        except Exception as e:
+            answers["error"] = e
+        finally:
+            runtime.stop()
+    threading.Thread(target=client, daemon=True).start()
+    asyncio.run(runtime.run())
+    assert "error" not in answers, answers.get("error")
+    assert answers["ping"] == "pong"
+    assert answers["status"]["modes"]
+    assert monitor._control_server is None # stopped with the monitor
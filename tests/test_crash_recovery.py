@@ -0,0 +1,77 @@
+'''
+Crash recovery of an MI instance the monitor did not launch (adopted):
+outside Windows its exit code is unknown, only "crash_or_unknown"
+restarts it (see restart_policy.py).
+
+    python -m pytest tests/test_crash_recovery.py
+'''
+import json
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import MINIMAL_CONFIG
+from icon_manager import IconManager
+from mode_supervisor import STOPPED, ModeSupervisor
+from process_cache import ProcessSnapshotCache
+from process_source import FakeProcessSource, make_record
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the exit code of any process is known on Windows")
+
+
+def _modes(restart_on: str):
+    modes = json.loads(json.dumps(MINIMAL_CONFIG["modes"]))
+    modes["facenav"]["crash_policy"] = {"restart_on": restart_on, "initial": 60.0}
+    return modes
+
+
+def _crash_adopted_instance(config):
+    """
+    Watches a process started outside the supervisor, kills it and
+    returns the supervisor once its exit has been handled
+    """
+    adopted = subprocess.Popen(["sleep", "60"])
+    source = FakeProcessSource([make_record(config.get_mi_exe("facenav"), adopted.pid, created=time.time())])
+    supervisor = ModeSupervisor("facenav", config, ProcessSnapshotCache(source, ttl=0),
+                                IconManager(backend="null"))
+    try:
+        supervisor.observe(source.snapshot())
+        assert supervisor.state != STOPPED
+        source.kill(adopted.pid)
+        adopted.send_signal(signal.SIGKILL)
+        adopted.wait()
+        watch_name = f"MIMonitor Exit Watch {adopted.pid}"
+        deadline = time.monotonic() + 5.0
+        while (any(t.name == watch_name for t in threading.enumerate())
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+    except BaseException:
+        supervisor.close()
+        raise
+    return supervisor
+
+
+def test_adopted_crash_is_not_restarted_with_restart_on_crash(make_config):
+    supervisor = _crash_adopted_instance(make_config(modes=_modes("crash")))
+    try:
+        assert supervisor.process_controller.exit_history[-1][1] is None # exit code unknown
+        assert supervisor.state == STOPPED
+        assert supervisor.counters["crashes"] == 0
+        assert supervisor._restart_timer is None
+    finally:
+        supervisor.close()
+
+
+def test_adopted_crash_is_restarted_with_restart_on_crash_or_unknown(make_config):
+    supervisor = _crash_adopted_instance(make_config(modes=_modes("crash_or_unknown")))
+    try:
+        assert supervisor.state == STOPPED
+        assert supervisor.counters["crashes"] == 1
+        assert supervisor._restart_timer is not None # recovery scheduled
+    finally:
+        supervisor.close()
+    assert supervisor._restart_timer is None # close() cancels it
@@ -0,0 +1,200 @@
+'''
+ModeSupervisor command queue (coalescing) and duplicate policies, on a
+fake process table and a fake ProcessController.
+
+    python -m pytest tests/test_mode_supervisor.py
+'''
+import json
+import threading
+
+import pytest
+
+from conftest import MINIMAL_CONFIG
+from icon_manager import IconManager
+from mode_supervisor import RUNNING, STOPPED, ModeSupervisor
+from process_cache import ProcessSnapshotCache
+from process_source import FakeProcessSource
+
+
+class GatedSource(FakeProcessSource):
+    """ FakeProcessSource whose lookups wait while the gate is closed """
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.waiting = threading.Event() # set when a lookup waits at the gate
+
+
+    def find(self, name):
+        if not self.gate.is_set():
+            self.waiting.set()
+            self.gate.wait(5.0)
+        return super().find(name)
+
+
+class FakeController:
+    """ launch/terminate/watch on the fake process table """
+
+    def __init__(self, source: FakeProcessSource, mi_exe: str):
+        self._source = source
+        self._mi_exe = mi_exe
+        self.stop_timeout = 0.5
+        self.exit_history = []
+        self.terminated = []
+
+
+    def launch(self) -> int:
+        return self._source.spawn(self._mi_exe)["ProcessId"]
+
+
+    def terminate(self, pids, timeout=None):
+        self.terminated.extend(pids)
+        for pid in pids:
+            self._source.kill(pid)
+        return {pid: 0 for pid in pids}
+
+
+    def watch(self, pid, on_exit, started=None) -> bool:
+        return False
+
+
+@pytest.fixture
+def supervised(make_config):
+    """
+    supervised(duplicate_policy) -> (supervisor, source), closed afterwards
+    """
+    supervisors = []
+    def make(duplicate_policy: str = "restart"):
+        modes = json.loads(json.dumps(MINIMAL_CONFIG["modes"]))
+        modes["facenav"]["duplicate_policy"] = duplicate_policy
+        config = make_config(modes=modes)
+        source = GatedSource()
+        supervisor = ModeSupervisor("facenav", config, ProcessSnapshotCache(source),
+                                    IconManager(backend="null"))
+        supervisor.process_controller = FakeController(source, supervisor.mi_exe)
+        supervisors.append(supervisor)
+        return supervisor, source
+    yield make
+    for supervisor in supervisors:
+        supervisor.close()
+        supervisor.icon_manager.stop_icon()
+
+
+def _hold(supervisor, source, command: str = "deduplicate"):
+    """
+    Submits a command that stays running until source.gate is set
+    """
+    source.gate.clear()
+    source.waiting.clear()
+    ticket = supervisor.submit(command)
+    assert source.waiting.wait(2.0)
+    return ticket
+
+
+def test_identical_commands_are_coalesced(supervised):
+    supervisor, source = supervised()
+    running = _hold(supervisor, source)
+    starts = [supervisor.submit("start") for _ in range(3)]
+    assert starts[0] is starts[1] is starts[2] and starts[0].coalesced == 2
+    stop = supervisor.submit("stop")
+    start_again = supervisor.submit("start")
+    assert stop is not starts[0] and start_again is not starts[0] # order kept: start, stop, start
+    source.gate.set()
+    for ticket in (running, starts[0], stop, start_again):
+        ticket.result(5.0)
+    assert supervisor.counters["commands"] == 4
+    assert supervisor.state == RUNNING
+    assert len(supervisor.MI_process_info()) == 1
+    assert supervisor.counters["launches"] == 2 and supervisor.counters["kills"] == 1
+
+
+def test_deduplicate_joins_any_queued_deduplicate(supervised):
+    supervisor, source = supervised()
+    running = _hold(supervisor, source, "start")
+    queued = supervisor.submit("deduplicate")
+    supervisor.submit("stop")
+    assert supervisor.submit("deduplicate") is queued # not the last queued, still merged
+    assert queued.coalesced == 1
+    source.gate.set()
+    running.result(5.0)
+    queued.result(5.0)
+
+
+def test_command_joins_the_running_one_when_nothing_is_queued(supervised):
+    supervisor, source = supervised()
+    running = _hold(supervisor, source)
+    assert supervisor.submit("deduplicate") is running
+    source.gate.set()
+    running.result(5.0)
+
+
+def test_reconfigure_never_joins_the_running_one(supervised, monkeypatch):
+    supervisor, _ = supervised()
+    config = supervisor._config
+    get_mi_exe = config.get_mi_exe
+    gate, entered = threading.Event(), threading.Event()
+    def gated_get_mi_exe(mode=None):
+        entered.set()
+        gate.wait(5.0)
+        return get_mi_exe(mode)
+    monkeypatch.setattr(config, "get_mi_exe", gated_get_mi_exe)
+    running = supervisor.submit("reconfigure")
+    assert entered.wait(2.0)
+    # the config may have changed after the running one read it
+    queued = supervisor.submit("reconfigure")
+    assert queued is not running
+    assert supervisor.submit("reconfigure") is queued # queued ones still merge
+    gate.set()
+    running.result(5.0)
+    queued.result(5.0)
+    assert supervisor.counters["commands"] == 2
+
+
+def test_unknown_command_is_refused(supervised):
+    supervisor, _ = supervised()
+    with pytest.raises(ValueError):
+        supervisor.submit("explode")
+
+
+def _duplicates(source, supervisor, count: int = 3):
+    return [source.spawn(supervisor.mi_exe)["ProcessId"] for _ in range(count)]
+
+
+def test_duplicate_policy_ignore(supervised):
+    supervisor, source = supervised("ignore")
+    _duplicates(source, supervisor)
+    supervisor.submit("deduplicate").result(5.0)
+    assert len(supervisor.MI_process_info()) == 3
+    assert supervisor.process_controller.terminated == []
+    assert supervisor.counters["duplicates_closed"] == 0
+
+
+def test_duplicate_policy_keep_oldest(supervised):
+    supervisor, source = supervised("keep_oldest")
+    pids = _duplicates(source, supervisor)
+    supervisor.submit("deduplicate").result(5.0)
+    assert [p["ProcessId"] for p in supervisor.MI_process_info()] == pids[:1]
+    assert sorted(supervisor.process_controller.terminated) == pids[1:]
+    assert supervisor.state == RUNNING
+    assert supervisor.counters["duplicates_closed"] == 2
+
+
+def test_duplicate_policy_restart(supervised):
+    supervisor, source = supervised("restart")
+    pids = _duplicates(source, supervisor)
+    supervisor.submit("deduplicate").result(5.0)
+    running = supervisor.MI_process_info()
+    assert len(running) == 1 and running[0]["ProcessId"] not in pids # a new instance
+    assert sorted(supervisor.process_controller.terminated) == pids
+    assert supervisor.state == RUNNING
+    assert supervisor.counters["duplicates_closed"] == 3
+
+
+def test_single_instance_is_left_alone(supervised):
+    supervisor, source = supervised("restart")
+    pids = _duplicates(source, supervisor, count=1)
+    supervisor.submit("deduplicate").result(5.0)
+    assert [p["ProcessId"] for p in supervisor.MI_process_info()] == pids
+    supervisor.submit("stop").result(5.0)
+    assert supervisor.state == STOPPED and supervisor.MI_process_info() == []
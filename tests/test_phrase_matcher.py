@@ -0,0 +1,55 @@
+'''
+PhraseMatcher: whole word matches, leftmost-longest overlap resolution
+and spoken order.
+
+    python -m pytest tests/test_phrase_matcher.py
+'''
+from phrase_matcher import PhraseMatch, PhraseMatcher
+
+MATCHER = PhraseMatcher({"start motion": "start", "stop motion": "stop",
+                         "start motion face": "start face", "motion face tracking": "tracking",
+                         "face": "face"})
+
+
+def _phrases(text: str):
+    return [match.phrase for match in MATCHER.find_all(text)]
+
+
+def test_matches_in_spoken_order():
+    assert _phrases("stop motion and then start motion") == ["stop motion", "start motion"]
+    assert MATCHER.find_all("please stop motion")[0] == PhraseMatch(1, 3, "stop motion", "stop")
+
+
+def test_whole_words_only():
+    assert _phrases("start motions") == []
+    assert _phrases("restart motion") == []
+    assert not MATCHER.has_match("interface")
+
+
+def test_longest_wins_at_the_same_start():
+    assert _phrases("start motion face") == ["start motion face"]
+
+
+def test_leftmost_wins_over_a_later_overlapping_phrase():
+    # "motion face tracking" starts inside "start motion face"
+    assert _phrases("start motion face tracking") == ["start motion face"]
+    assert _phrases("motion face tracking") == ["motion face tracking"]
+
+
+def test_shorter_phrase_ending_inside_a_longer_one():
+    # "face" ends where "start motion face" ends: found by the failure links, then dropped as an overlap
+    assert _phrases("start motion face face") == ["start motion face", "face"]
+
+
+def test_partial_prefix_falls_back_to_a_shorter_phrase():
+    assert _phrases("start motion stop motion") == ["start motion", "stop motion"]
+    assert _phrases("start stop motion") == ["stop motion"]
+
+
+def test_has_match_agrees_with_find_all():
+    for text in ("", "hello", "start", "start motion", "the face", "start motions face"):
+        assert MATCHER.has_match(text) == bool(MATCHER.find_all(text))
+
+
+def test_empty_phrase_is_ignored():
+    assert PhraseMatcher({"": "nothing", "motion": "m"}).find_all("motion") == [PhraseMatch(0, 1, "motion", "m")]
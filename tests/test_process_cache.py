@@ -0,0 +1,141 @@
+'''
+ProcessSnapshotCache: one scan per ttl, shared by concurrent callers
+(single-flight), and invalidate().
+
+    python -m pytest tests/test_process_cache.py
+'''
+import threading
+import time
+
+import pytest
+
+from process_cache import ProcessSnapshotCache
+from process_source import FakeProcessSource
+
+MI_EXE = "MI3-FacialNavigation-3.1.exe"
+
+
+class PolledSource(FakeProcessSource):
+    """ FakeProcessSource read by full scans, which can be held open """
+
+    event_driven = False
+    incremental = False
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.release.set()
+        self.entered = threading.Event() # set when a scan starts
+        self.fail = None # exception the next scans raise
+
+
+    def snapshot(self):
+        self.entered.set()
+        self.release.wait(5.0)
+        if self.fail is not None:
+            raise self.fail
+        return super().snapshot()
+
+
+def _hold_scan(cache, source, callers: int):
+    """
+    Starts one caller whose scan is held open, then the others;
+    returns the threads and their results
+    """
+    source.release.clear()
+    source.entered.clear()
+    results = []
+    def call():
+        try:
+            results.append(cache.snapshot())
+        except Exception as e:
+            results.append(e)
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert source.entered.wait(2.0)
+    followers = [threading.Thread(target=call) for _ in range(callers - 1)]
+    for thread in followers:
+        thread.start()
+    deadline = time.monotonic() + 2.0
+    while cache.coalesced < callers - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return [leader] + followers, results
+
+
+def test_concurrent_callers_share_one_scan():
+    source = PolledSource()
+    source.spawn(MI_EXE)
+    cache = ProcessSnapshotCache(source, ttl=10.0)
+    threads, results = _hold_scan(cache, source, callers=8)
+    source.release.set()
+    for thread in threads:
+        thread.join(2.0)
+    assert source.scans == 1
+    assert cache.misses == 1 and cache.coalesced == 7
+    assert len(results) == 8 and all(result is results[0] for result in results)
+    assert [p["Name"] for p in results[0]] == [MI_EXE]
+
+
+def test_scan_error_reaches_every_waiting_caller():
+    source = PolledSource()
+    cache = ProcessSnapshotCache(source, ttl=10.0)
+    source.fail = OSError("process table unreadable")
+    threads, results = _hold_scan(cache, source, callers=4)
+    source.release.set()
+    for thread in threads:
+        thread.join(2.0)
+    assert len(results) == 4 and all(result is source.fail for result in results)
+    source.fail = None
+    assert cache.snapshot() == [] # a failed scan is not cached
+    assert cache.misses == 2
+
+
+def test_snapshot_is_reused_for_ttl():
+    source = PolledSource()
+    cache = ProcessSnapshotCache(source, ttl=0.2)
+    first = cache.snapshot()
+    assert cache.snapshot() is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    time.sleep(0.25)
+    cache.snapshot()
+    assert cache.misses == 2
+
+
+def test_invalidate_forces_a_new_scan():
+    source = PolledSource()
+    cache = ProcessSnapshotCache(source, ttl=10.0)
+    assert cache.find(MI_EXE) == []
+    source.spawn(MI_EXE) # e.g. MIMonitor started MI
+    assert cache.find(MI_EXE) == [] # still the cached table
+    cache.invalidate()
+    assert [p["Name"] for p in cache.find(MI_EXE)] == [MI_EXE]
+
+
+def test_callers_after_invalidate_do_not_join_the_old_scan():
+    source = PolledSource()
+    cache = ProcessSnapshotCache(source, ttl=10.0)
+    threads, results = _hold_scan(cache, source, callers=1)
+    source.spawn(MI_EXE)
+    cache.invalidate() # while the first scan is still running
+    late = []
+    late_thread = threading.Thread(target=lambda: late.append(cache.snapshot()))
+    late_thread.start()
+    source.release.set()
+    for thread in threads + [late_thread]:
+        thread.join(2.0)
+    assert cache.coalesced == 0 and cache.misses == 2
+    assert [p["Name"] for p in late[0]] == [MI_EXE]
+    assert cache.snapshot() is late[0] # the stale scan was not cached
+
+
+@pytest.mark.parametrize("callers", [2, 32])
+def test_stats_count_scans(callers):
+    source = PolledSource()
+    cache = ProcessSnapshotCache(source, ttl=10.0)
+    threads, _ = _hold_scan(cache, source, callers)
+    source.release.set()
+    for thread in threads:
+        thread.join(2.0)
+    stats = cache.stats(reset=True)
+    assert (stats["scans"], stats["coalesced"]) == (1, callers - 1)
+    assert cache.stats()["scans"] == 0
@@ -0,0 +1,136 @@
+'''
+ProcessIndex: incremental refreshes from PID churn, PID reuse and the
+periodic full resync.
+
+    python -m pytest tests/test_process_index.py
+'''
+import time
+
+import pytest
+
+from process_index import ProcessIndex
+from process_source import FakeProcessSource, make_record
+
+MI_EXE = "MI3-FacialNavigation-3.1.exe"
+
+
+class CountingSource(FakeProcessSource):
+    """ FakeProcessSource that records which PIDs were read """
+
+    event_driven = False
+
+    def __init__(self, records=()):
+        super().__init__(records)
+        self.read = [] # pids of every records() call
+        self.fail = None # exception the next snapshot() raises
+        self.vanish = set() # pids that end between pids() and records()
+
+
+    def snapshot(self):
+        if self.fail is not None:
+            raise self.fail
+        return super().snapshot()
+
+
+    def records(self, pids):
+        pids = set(pids)
+        self.read.append(pids)
+        return super().records(pids - self.vanish)
+
+
+def _index(processes: int = 100, resync_interval: float = 60.0):
+    source = CountingSource([make_record(f"proc{pid}.exe", pid, created=1.0) for pid in range(1, processes + 1)])
+    index = ProcessIndex(source, resync_interval)
+    index.watch([MI_EXE])
+    index.refresh() # first refresh is a full resync
+    return source, index
+
+
+def _pids(records):
+    return sorted(record["ProcessId"] for record in records)
+
+
+def test_first_refresh_resyncs():
+    source, index = _index()
+    assert index.stats()["resyncs"] == 1
+    assert source.scans == 1 and source.read == []
+    assert len(index.snapshot()) == 100
+
+
+def test_refresh_reads_only_new_processes():
+    source, index = _index()
+    mi = source.spawn(MI_EXE)
+    other = source.spawn("notepad.exe")
+    source.kill(5)
+    index.refresh()
+    assert source.scans == 1 # no full scan
+    assert source.read == [{mi["ProcessId"], other["ProcessId"]}]
+    assert _pids(index.find(MI_EXE)) == [mi["ProcessId"]]
+    assert 5 not in _pids(index.snapshot()) and len(index.snapshot()) == 101
+    stats = index.stats()
+    assert (stats["added"], stats["removed"]) == (102, 1)
+
+
+def test_watched_processes_are_reread_and_reused_pids_noticed():
+    source, index = _index()
+    mi = source.spawn(MI_EXE)
+    index.refresh()
+    source.read.clear()
+    index.refresh()
+    assert source.read == [{mi["ProcessId"]}] # only the watched PID, unchanged
+    # MI exits and its PID goes to another program before the next refresh
+    source._table[mi["ProcessId"]] = make_record("other.exe", mi["ProcessId"], created=mi["CreationDate"] + 1)
+    index.refresh()
+    assert index.find(MI_EXE) == []
+    assert [p["Name"] for p in index.snapshot() if p["ProcessId"] == mi["ProcessId"]] == ["other.exe"]
+
+
+def test_process_ending_between_listing_and_reading_is_dropped():
+    source, index = _index()
+    mi = source.spawn(MI_EXE)
+    source.vanish.add(mi["ProcessId"])
+    index.refresh()
+    assert index.find(MI_EXE) == []
+    assert mi["ProcessId"] not in _pids(index.snapshot())
+
+
+def test_find_by_executable_file_name():
+    source, index = _index()
+    launched = source.spawn("python.exe", exe="C:\\MotionInput\\" + MI_EXE)
+    index.refresh()
+    assert _pids(index.find(MI_EXE)) == [launched["ProcessId"]]
+    assert _pids(index.find("python.exe")) == [launched["ProcessId"]] # watched from now on
+    source.kill(launched["ProcessId"])
+    index.refresh()
+    assert index.find(MI_EXE) == [] and index.find("python.exe") == []
+
+
+def test_resync_after_interval():
+    source, index = _index(resync_interval=0.05)
+    index.refresh()
+    assert source.scans == 1
+    time.sleep(0.06)
+    index.refresh()
+    assert source.scans == 2 and index.stats()["resyncs"] == 2
+
+
+def test_non_incremental_source_resyncs_every_refresh():
+    source, index = _index()
+    source.incremental = False
+    index.refresh()
+    index.refresh()
+    assert source.scans == 3 and source.read == []
+
+
+def test_failed_resync_is_retried_on_next_refresh():
+    source = CountingSource()
+    index = ProcessIndex(source, resync_interval=60.0)
+    source.fail = OSError("process table unreadable")
+    mi = source.spawn(MI_EXE)
+    with pytest.raises(OSError):
+        index.refresh()
+    assert index.find(MI_EXE) == []
+    source.fail = None
+    index.refresh() # a full resync again, not an incremental refresh of an empty table
+    assert index.stats()["resyncs"] == 1 and source.read == []
+    assert _pids(index.find(MI_EXE)) == [mi["ProcessId"]]
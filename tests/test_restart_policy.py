@@ -0,0 +1,34 @@
+'''
+Which unexpected MI exits RestartPolicy counts as crashes.
+
+    python -m pytest tests/test_restart_policy.py
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from restart_policy import RestartPolicy
+
+
+def test_unknown_exit_code_is_not_a_crash():
+    # an MI the monitor did not launch (pidfd watch) exits without a code
+    assert not RestartPolicy(restart_on="crash").is_crash(None)
+
+
+def test_unknown_exit_code_restarts_with_restart_on_any():
+    assert RestartPolicy(restart_on="any").is_crash(None)
+
+
+def test_exit_codes():
+    policy = RestartPolicy(restart_on="crash")
+    assert policy.is_crash(1)
+    assert policy.is_crash(-9)
+    assert not policy.is_crash(0)
+    assert RestartPolicy(restart_on="any").is_crash(0)
+
+
+def test_unknown_exit_code_restarts_with_restart_on_crash_or_unknown():
+    policy = RestartPolicy(restart_on="crash_or_unknown")
+    assert policy.is_crash(None)
+    assert policy.is_crash(1)
+    assert not policy.is_crash(0)
@@ -0,0 +1,102 @@
+'''
+VoiceActivityDetector: silence is dropped, speech is forwarded with its
+pre-roll and hangover, and a long silence asks for a recogniser reset.
+
+    python -m pytest tests/test_vad.py
+'''
+import numpy as np
+
+from audio_buffer import AudioRingBuffer
+from vad import VoiceActivityDetector
+
+RATE = 16000
+BLOCK = 1600 # 0.1 s
+
+
+def _silence() -> bytes:
+    return np.zeros(BLOCK, dtype=np.int16).tobytes()
+
+
+def _speech() -> bytes:
+    t = np.arange(BLOCK) / RATE
+    return (3000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16).tobytes()
+
+
+def _hiss() -> bytes:
+    # unvoiced sound ("s"): high zero crossing rate, energy under the threshold
+    return np.tile(np.array([250, -250], dtype=np.int16), BLOCK // 2).tobytes()
+
+
+def _vad(**settings) -> VoiceActivityDetector:
+    settings = dict({"hangover": 0.2, "preroll": 0.3, "reset_after": 1.0}, **settings)
+    return VoiceActivityDetector(RATE, **settings)
+
+
+def test_silence_is_dropped():
+    vad = _vad()
+    assert all(vad.process(_silence()) == [] for _ in range(10))
+    assert vad.stats() == {"forwarded": 0, "dropped": 10}
+    assert not vad.consume_reset() # no speech yet, nothing to reset
+
+
+def test_speech_is_forwarded_with_preroll():
+    vad = _vad()
+    silent = [np.full(BLOCK, i, dtype=np.int16).tobytes() for i in range(6)]
+    for block in silent:
+        vad.process(block)
+    speech = _speech()
+    blocks = vad.process(speech)
+    # the fewest most recent silent blocks covering 0.3 s, in order
+    assert [bytes(block) for block in blocks] == silent[-3:] + [speech]
+    assert vad.stats() == {"forwarded": 4, "dropped": 3}
+    assert vad.process(speech) == [speech] # pre-roll only once
+
+
+def test_no_preroll():
+    vad = _vad(preroll=0.0)
+    vad.process(_silence())
+    speech = _speech()
+    assert vad.process(speech) == [speech]
+
+
+def test_hangover_forwards_trailing_silence():
+    vad = _vad()
+    vad.process(_speech())
+    forwarded = [len(vad.process(_silence())) for _ in range(5)]
+    assert forwarded == [1, 1, 0, 0, 0] # 0.2 s of hangover
+    assert vad.stats() == {"forwarded": 3, "dropped": 3}
+
+
+def test_reset_once_after_long_silence():
+    vad = _vad(reset_after=0.95)
+    vad.process(_speech())
+    for _ in range(9):
+        vad.process(_silence())
+    assert not vad.consume_reset() # 0.9 s
+    vad.process(_silence())
+    assert vad.consume_reset() # 1.0 s
+    assert not vad.consume_reset()
+    for _ in range(20):
+        vad.process(_silence())
+    assert not vad.consume_reset() # not again before new speech
+
+
+def test_unvoiced_sound_counts_as_speech():
+    assert _vad().is_speech(np.frombuffer(_hiss(), dtype=np.int16))
+    assert not _vad().is_speech(np.frombuffer(_hiss(), dtype=np.int16) // 4)
+
+
+def test_preroll_survives_ring_buffer_slot_reuse():
+    # get() views are only valid until the next get(), the pre-roll must not change with them
+    ring = AudioRingBuffer(capacity=2, block_frames=BLOCK)
+    vad = _vad(preroll=0.1)
+    silent = np.full(BLOCK, 7, dtype=np.int16).tobytes()
+    ring.put(silent)
+    vad.process(ring.get(0))
+    speech = _speech()
+    for _ in range(3): # the row the silent block was read from is written again
+        ring.put(speech)
+        ring.get(0)
+    ring.put(speech)
+    blocks = vad.process(ring.get(0))
+    assert bytes(blocks[0]) == silent
@@ -0,0 +1,71 @@
+'''
+wait_for(): returns as soon as the condition holds, wakes up on the
+event instead of its polling interval, and gives up at the deadline.
+
+    python -m pytest tests/test_waiter.py
+'''
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+from waiter import port_ready, wait_for, window_hung, window_ready
+
+
+def test_condition_already_true():
+    calls = []
+    met, waited = wait_for(lambda: calls.append(1) or True, 5.0)
+    assert met and calls == [1] and waited < 0.1
+
+
+def test_timeout_polls_with_backoff():
+    calls = []
+    met, waited = wait_for(lambda: calls.append(1) and False, 0.5)
+    assert not met
+    assert 0.5 <= waited < 0.8
+    # 0.01, 0.02, 0.04 ... 0.25 s apart, not a busy loop
+    assert 5 <= len(calls) <= 9
+
+
+def test_event_wakes_up_before_the_polling_interval():
+    event = threading.Event()
+    ready = []
+    def process_started():
+        time.sleep(0.05)
+        ready.append(True)
+        event.set()
+    threading.Thread(target=process_started).start()
+    met, waited = wait_for(lambda: bool(ready), 5.0, event, initial=10.0, max_interval=10.0)
+    assert met and waited < 1.0
+
+
+def test_event_set_during_the_check_is_not_lost():
+    # the event is cleared before the condition is checked, so a set
+    # between the check and the wait still wakes the waiter
+    event = threading.Event()
+    calls = []
+    def condition():
+        calls.append(1)
+        if len(calls) == 1:
+            event.set() # e.g. MI started while the process table was read
+            return False
+        return True
+    met, waited = wait_for(condition, 5.0, event, initial=10.0, max_interval=10.0)
+    assert met and waited < 1.0 and len(calls) == 2
+
+
+def test_port_ready():
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+        assert port_ready(port)
+    assert not port_ready(port)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="real window checks on Windows")
+def test_window_checks_outside_windows():
+    assert window_ready(1)
+    assert window_hung(1) is None
@@ -0,0 +1,97 @@
+'''
+Author: Anelia Gaydardzhieva
+Comments:
+Wait-for-condition helpers used instead of fixed sleeps.
+
+wait_for() returns as soon as the condition holds. If an Event is given
+(set by an event driven process source on exec/exit) it wakes up on the
+event, otherwise it polls with a short exponential backoff, until the
+deadline.
+
+window_ready() and port_ready() are optional readiness checks for MI,
+on top of its process showing up. window_hung() tells whether MI's
+window stopped responding (see resource_sampler.py).
+'''
+import socket
+import sys
+import time
+from threading import Event
+from typing import Callable, Optional, Tuple
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+    _user32 = ctypes.windll.user32
+    _ENUM_WINDOWS_PROC = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+
+
+def wait_for(condition: Callable[[], bool], timeout: float, event: Optional[Event] = None,
+             initial: float = 0.01, factor: float = 2.0, max_interval: float = 0.25) -> Tuple[bool, float]:
+    """
+    Waits until condition() is True or timeout seconds passed.
+    Returns (condition met, seconds waited)
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    interval = initial
+    while True:
+        if event is not None:
+            event.clear() # anything after this point wakes us up
+        if condition():
+            return True, time.monotonic() - started
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return False, time.monotonic() - started
+        if event is not None:
+            event.wait(min(interval, left))
+        else:
+            time.sleep(min(interval, left))
+        interval = min(interval * factor, max_interval)
+
+
+def window_ready(pid: int) -> bool:
+    """
+    True if pid has a visible top level window (Windows only,
+    always True elsewhere)
+    """
+    if sys.platform != "win32":
+        return True
+    found = []
+    def on_window(hwnd, _):
+        owner = wintypes.DWORD()
+        _user32.GetWindowThreadProcessId(hwnd, ctypes.byref(owner))
+        if owner.value == pid and _user32.IsWindowVisible(hwnd):
+            found.append(hwnd)
+            return False # stop enumerating
+        return True
+    _user32.EnumWindows(_ENUM_WINDOWS_PROC(on_window), 0)
+    return bool(found)
+
+
+def window_hung(pid: int) -> Optional[bool]:
+    """
+    True if a visible window of pid is not responding (Windows only,
+    None elsewhere or if pid has no visible window)
+    """
+    if sys.platform != "win32":
+        return None
+    hung = []
+    def on_window(hwnd, _):
+        owner = wintypes.DWORD()
+        _user32.GetWindowThreadProcessId(hwnd, ctypes.byref(owner))
+        if owner.value == pid and _user32.IsWindowVisible(hwnd):
+            hung.append(bool(_user32.IsHungAppWindow(hwnd)))
+        return True
+    _user32.EnumWindows(_ENUM_WINDOWS_PROC(on_window), 0)
+    return any(hung) if hung else None
+
+
+def port_ready(port: int, host: str = "127.0.0.1") -> bool:
+    """
+    True if something accepts TCP connections on host:port
+    """
+    try:
+        with socket.create_connection((host, port), timeout=0.05):
+            return True
+    except OSError:
+        return False